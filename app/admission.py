@@ -0,0 +1,182 @@
+# app/admission.py
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute, Match, Router
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import (
+    ADMISSION_ENABLED, ADMISSION_EXPENSIVE_CONCURRENCY, ADMISSION_MAX_POOL_WAIT_MS, ADMISSION_MAX_POOL_WAITING,
+    ADMISSION_RETRY_AFTER, ADMISSION_ROUTE_CONCURRENCY, RATE_LIMIT_BURST, RATE_LIMIT_PER_SECOND
+)
+from app.db_pool import pool_pressure
+from app.metrics import Counter, Gauge
+from app.security import bearer_subject
+
+CHEAP, STANDARD, EXPENSIVE = "cheap", "standard", "expensive"
+
+# Routes holding a connection (or the threadpool) for long: streamed exports, bulk writes and
+# reads over the loan archive. They are shed first and run a bounded number at a time.
+EXPENSIVE_ROUTES = frozenset({
+    "GET /api/books/export",
+    "POST /api/books/import",
+    "GET /api/borrowings/export",
+    "POST /api/borrowings/batch",
+    "PUT /api/borrowings/return-batch",
+    "GET /api/borrowings/user/{user_id}/history",
+})
+# Catalog reads are cheap (mostly served from the response cache) and kept up the longest
+CHEAP_PREFIX = "/api/books"
+
+# Pool pressure (1.0 = at a threshold) from which requests of each priority are shed
+SHED_AT = {EXPENSIVE: 0.5, STANDARD: 1.0, CHEAP: 2.0}
+
+REQUESTS_SHED = Counter(
+    "http_requests_shed_total", "Requests refused by admission control, by route, priority and reason",
+    ["method", "route", "priority", "reason"]
+)
+REQUESTS_ADMITTED = Gauge("admission_in_flight", "Requests admitted by admission control and still executing", ["priority"])
+
+def route_priority(method: str, path: str) -> str:
+    """Shedding priority of a route template."""
+    if f"{method} {path}" in EXPENSIVE_ROUTES:
+        return EXPENSIVE
+    if method in ("GET", "HEAD") and path.startswith(CHEAP_PREFIX):
+        return CHEAP
+    return STANDARD
+
+class RateLimiter:
+    """
+    Token bucket per client: `burst` tokens, refilled at `rate` per second, one taken per
+    request. Only the `max_clients` most recently seen clients are tracked; a client
+    forgotten in between starts again from a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 100_000):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # client -> (tokens, updated)
+
+    def take(self, client: str, now: Optional[float] = None) -> float:
+        """Take a token for a request of `client`: 0 if allowed, else seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+class AdmissionMiddleware:
+    """
+    Refuse /api requests at once, instead of queueing them behind a saturated database.
+
+    Pool pressure is the highest, over this worker's pools with checkouts waiting, of the
+    queued checkouts over `max_pool_waiting` and of their recent average wait over
+    `max_pool_wait`. Requests are shed with 503 from the pressure of their route's priority
+    in SHED_AT, so expensive routes go first and catalog reads last. Expensive routes also
+    run at most `expensive_concurrency` at a time, other routes `route_concurrency` (0 = no
+    limit), and with `rate` > 0 each client is rate limited (429, see RateLimiter). Every
+    refusal carries Retry-After and is counted in http_requests_shed_total.
+
+    `router` resolves route templates before routing; health, metrics and internal routes
+    are never refused.
+    """
+
+    def __init__(
+        self, app: ASGIApp, router: Router, enabled: bool = ADMISSION_ENABLED,
+        max_pool_waiting: int = ADMISSION_MAX_POOL_WAITING, max_pool_wait: float = ADMISSION_MAX_POOL_WAIT_MS / 1000,
+        expensive_concurrency: int = ADMISSION_EXPENSIVE_CONCURRENCY, route_concurrency: int = ADMISSION_ROUTE_CONCURRENCY,
+        retry_after: int = ADMISSION_RETRY_AFTER, rate: float = RATE_LIMIT_PER_SECOND, burst: int = RATE_LIMIT_BURST,
+        pools: Callable[[], Dict[str, Tuple[float, float]]] = pool_pressure,
+    ):
+        self.app = app
+        self.router = router
+        self.enabled = enabled
+        self.max_pool_waiting = max_pool_waiting
+        self.max_pool_wait = max_pool_wait
+        self.limits = {EXPENSIVE: expensive_concurrency, STANDARD: route_concurrency, CHEAP: route_concurrency}
+        self.retry_after = retry_after
+        self.limiter = RateLimiter(rate, burst) if rate > 0 else None
+        self.pools = pools
+        self._in_flight: Dict[str, int] = {}
+
+    def pressure(self) -> float:
+        pressure = 0.0
+        for waiting, recent_wait in self.pools().values():
+            if not waiting:
+                continue
+            if self.max_pool_waiting > 0:
+                pressure = max(pressure, waiting / self.max_pool_waiting)
+            if self.max_pool_wait > 0:
+                pressure = max(pressure, recent_wait / self.max_pool_wait)
+        return pressure
+
+    def _route(self, scope: Scope) -> Optional[BaseRoute]:
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    @staticmethod
+    def _client(scope: Scope) -> str:
+        user_id = bearer_subject(dict(scope["headers"]).get(b"authorization", b"").decode("latin-1"))
+        if user_id is not None:
+            return f"user:{user_id}"
+        return f"ip:{scope['client'][0] if scope.get('client') else None}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.enabled or scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+        route = self._route(scope)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], route.path
+        priority = route_priority(method, path)
+        if self.limiter is not None:
+            wait = self.limiter.take(self._client(scope))
+            if wait:
+                await self._shed(scope, receive, send, route, priority, "rate_limited", 429, "Too many requests", wait)
+                return
+        if self.pressure() >= SHED_AT[priority]:
+            await self._shed(scope, receive, send, route, priority, "pool_saturated", 503, "Service is overloaded")
+            return
+        key = f"{method} {path}"
+        in_flight = self._in_flight.get(key, 0)
+        limit = self.limits[priority]
+        if limit > 0 and in_flight >= limit:
+            await self._shed(scope, receive, send, route, priority, "concurrency", 503, "Too many concurrent requests for this route")
+            return
+
+        # No await between the check and the increment: the event loop admits one request at a time
+        self._in_flight[key] = in_flight + 1
+        REQUESTS_ADMITTED.inc(priority=priority)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._in_flight[key] -= 1
+            REQUESTS_ADMITTED.dec(priority=priority)
+
+    async def _shed(
+        self, scope: Scope, receive: Receive, send: Send, route: BaseRoute, priority: str, reason: str,
+        status_code: int, detail: str, wait: float = 0.0,
+    ) -> None:
+        # Label the refusal with its route in the request metrics, like a routed request
+        scope["route"] = route
+        REQUESTS_SHED.inc(method=scope["method"], route=route.path, priority=priority, reason=reason)
+        retry_after = max(math.ceil(wait), self.retry_after)
+        response = JSONResponse({"detail": detail}, status_code=status_code, headers={"Retry-After": str(retry_after)})
+        await response(scope, receive, send)
@@ -0,0 +1,116 @@
+# app/api/deps.py
+import hashlib
+from typing import Any, Callable, Optional, Sequence
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.pagination import InvalidCursor, decode_cursor, next_cursor
+from app.security import InvalidToken, TokenPayload, decode_access_token
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def cursor_values(cursor: Optional[str], sort: str, keys: Sequence[str]) -> Optional[list]:
+    """
+    Decode the `cursor` query parameter of a list route ordered by the `keys` columns.
+
+    Raises:
+        HTTPException: 400 Bad Request if the cursor is malformed or belongs to another sort order
+    """
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, sort, keys)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def set_next_cursor(response: Response, rows: Sequence[Any], limit: int, sort: str, keys: Sequence[str]) -> None:
+    """Advertise the cursor of the following page in the X-Next-Cursor response header."""
+    cursor = next_cursor(rows, limit, sort, keys)
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+
+def make_etag(request: Request, *versions: int) -> str:
+    """Weak ETag of a read: the route path and query parameters at the given data versions."""
+    key = f"{request.url.path}?{sorted(request.query_params.multi_items())}@{versions}"
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 Not Modified response if the request's If-None-Match already names `etag`, else None."""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return None
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    # Clients and proxies may store the page but must revalidate it (cheaply, see not_modified)
+    response.headers["Cache-Control"] = "no-cache"
+
+def rows_response(rows: Sequence[dict], limit: int, sort: str, keys: Sequence[str], etag: Optional[str] = None) -> ORJSONResponse:
+    """
+    Encode a page of plain row dicts with orjson, with its X-Next-Cursor and ETag headers.
+
+    Returning the response directly skips FastAPI's response_model validation, so the
+    rows must already have the shape of the route's response_model (which still
+    documents the route in OpenAPI).
+    """
+    response = ORJSONResponse(rows)
+    set_next_cursor(response, rows, limit, sort, keys)
+    if etag is not None:
+        set_etag(response, etag)
+    return response
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> TokenPayload:
+    """
+    Authenticate the request from its `Authorization: Bearer` token, without touching the database.
+
+    Raises:
+        HTTPException: 401 Unauthorized if the token is missing, invalid, expired or revoked
+    """
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        return decode_access_token(credentials.credentials)
+    except InvalidToken as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def require_role(*roles: str, detail: str = "Insufficient permissions") -> Callable[..., TokenPayload]:
+    """
+    Build a dependency that admits only users whose token carries one of `roles`.
+
+    Raises:
+        HTTPException: 403 Forbidden if the token's role is not allowed
+    """
+    async def dependency(current_user: TokenPayload = Depends(get_current_user)) -> TokenPayload:
+        if current_user.role not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+        return current_user
+    return dependency
+
+def check_acting_user(acting_user_id: Optional[int], current_user: TokenPayload) -> None:
+    """
+    Reject a deprecated `current_user_id`/`admin_id` body field that disagrees with the token.
+
+    Raises:
+        HTTPException: 403 Forbidden if the body names a different user than the token
+    """
+    if acting_user_id is not None and acting_user_id != current_user.sub:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acting user does not match the authenticated user"
+        )
@@ -1,26 +1,185 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from app.database import get_db
-from app.schemas.book import Book
+from app.api.deps import cursor_values, make_etag, not_modified, require_role, rows_response, set_etag
+from app.book_import import BookImporter, InvalidImport
+from app.config import IMPORT_CHUNK_SIZE
+from app.export import accepts_gzip, export_response
+from app.database import DBSession, get_db, run_db
+from app.models.user import UserRole
+from app.replicas import get_read_db, replicas
+from app.response_cache import request_key, response_cache
+from app.schemas.book import Book, BookImportReport
 from app.crud import book as book_crud
+from app.security import TokenPayload
+from app.versioning import versions
 
 router = APIRouter()
 
-@router.get("/", response_model=List[Book])
-def read_books(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+catalog_manager = require_role(
+    UserRole.ADMIN, UserRole.LIBRARIAN, detail="Only admin and librarian users can import books"
+)
+
+IMPORT_CONTENT_TYPES = {"text/csv": "csv", "application/x-ndjson": "ndjson", "application/jsonl": "ndjson"}
+
+@router.get("/", response_model=List[Book], response_class=ORJSONResponse)
+async def read_books(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = Query("id", regex="^(id|title)$"),
+    db: DBSession = Depends(get_read_db)
+):
     """
     Retrieve a list of books with pagination support.
 
+    When more rows may follow, the response carries an `X-Next-Cursor` header; pass it
+    back as `cursor` to fetch the next page at constant cost (keyset pagination).
+
+    The `ETag` changes whenever the catalog does; send it back as `If-None-Match` to get
+    a 304 Not Modified, answered without touching the database, while nothing changed.
+    Pages are also kept in the shared response cache until the catalog changes.
+    Served from a read replica when one is configured (see app.replicas).
+
     Args:
-        skip (int, optional): Number of records to skip. Defaults to 0.
+        request (Request): The request, for its If-None-Match header.
+        skip (int, optional): Number of records to skip. Ignored when a cursor is given. Defaults to 0.
         limit (int, optional): Number of records to return. Defaults to 100.
-        db (Session, optional): Database session dependency.
+        cursor (str, optional): Opaque cursor from a previous page's X-Next-Cursor header.
+        sort (str, optional): Sort order, "id" or "title". Defaults to "id".
+        db (DBSession, optional): Database session dependency.
+
+    Raises:
+        HTTPException: 400 Bad Request if the cursor is invalid
 
     Returns:
         List[Book]: List of books.
     """
 
-    books = book_crud.get_books(db, skip=skip, limit=limit)
-    return books
\ No newline at end of file
+    after = cursor_values(cursor, sort, book_crud.BOOK_SORT_KEYS[sort])
+    # Read the version before the rows: a concurrent write then yields a newer ETag, never a stale one
+    catalog = versions.catalog
+    etag = make_etag(request, catalog)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    async def load(etag: Optional[str] = etag):
+        books = await run_db(db, book_crud.get_book_rows, skip=skip, limit=limit, after=after, sort=sort)
+        return rows_response(books, limit, sort, book_crud.BOOK_SORT_KEYS[sort], etag=etag)
+
+    if replicas.may_lag(db, catalog):
+        # The replica may not have this catalog version yet: serve the page untagged and uncached
+        return await load(etag=None)
+    return await response_cache.get_or_load(request_key(request, catalog), ("catalog",), load)
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_books(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    accept_encoding: str = Header(""),
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Stream the whole catalog as NDJSON or CSV, in id order.
+
+    Rows are read with a server-side cursor and written as they arrive, so memory use stays
+    flat whatever the catalog size. The body is gzip-compressed on the fly when the client
+    sends `Accept-Encoding: gzip`.
+
+    Args:
+        format (str, optional): "ndjson" or "csv". Defaults to "ndjson".
+        accept_encoding (str, optional): The Accept-Encoding request header.
+        db (DBSession, optional): Database session dependency.
+
+    Returns:
+        StreamingResponse: id, title, author, quantity and available_quantity of every book
+    """
+    return export_response(db, book_crud.export_books_query(), "books", format, accepts_gzip(accept_encoding))
+
+def _search_rows(db: Session, q: str, limit: int) -> List[dict]:
+    return [Book.from_orm(book).dict() for book in book_crud.search_books(db, q=q, limit=limit)]
+
+@router.get("/search", response_model=List[Book], response_class=ORJSONResponse)
+async def search_books(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Search the catalog by title and author, best matches first.
+
+    Matching is full-text and typo tolerant (PostgreSQL tsvector + pg_trgm, SQLite FTS5
+    trigram index), so misspelled or partial words still find the book. Supports
+    `If-None-Match` revalidation and the response cache like `GET /api/books/`.
+
+    Args:
+        request (Request): The request, for its If-None-Match header.
+        q (str): Search text.
+        limit (int, optional): Maximum number of books to return. Defaults to 20.
+        db (DBSession, optional): Database session dependency.
+
+    Returns:
+        List[Book]: Matching books ordered by relevance.
+    """
+    catalog = versions.catalog
+    etag = make_etag(request, catalog)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    async def load(etag: Optional[str] = etag):
+        response = ORJSONResponse(await run_db(db, _search_rows, q=q.strip(), limit=limit))
+        if etag is not None:
+            set_etag(response, etag)
+        return response
+
+    if replicas.may_lag(db, catalog):
+        return await load(etag=None)
+    return await response_cache.get_or_load(request_key(request, catalog), ("catalog",), load)
+
+
+@router.post("/import", response_model=BookImportReport)
+async def import_books(
+    request: Request,
+    format: Optional[str] = Query(None, regex="^(csv|ndjson)$"),
+    chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=1, le=50000),
+    current_user: TokenPayload = Depends(catalog_manager),
+    db: DBSession = Depends(get_db)
+):
+    """
+    Bulk import a catalog sent as the raw request body, CSV (with a header row) or NDJSON.
+
+    The body is streamed, never held in memory, and merged into books chunk by chunk:
+    rows with the title and author of an existing book add to its quantity and
+    available_quantity, other rows become new books. Each chunk is its own transaction.
+
+    Args:
+        request (Request): The upload; its Content-Type (text/csv or application/x-ndjson)
+            selects the format unless `format` is given.
+        format (str, optional): "csv" or "ndjson".
+        chunk_size (int, optional): Rows written per transaction. Defaults to IMPORT_CHUNK_SIZE.
+        current_user (TokenPayload): The authenticated admin or librarian
+
+    Raises:
+        HTTPException: 401 Unauthorized if the bearer token is missing, invalid, expired or revoked
+        HTTPException: 403 Forbidden if the current user is not an admin or librarian
+        HTTPException: 400 Bad Request if the format is unknown or the CSV header has no title column
+
+    Returns:
+        BookImportReport: Rows read, books inserted and updated, and the rejected rows with their line numbers
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        importer = BookImporter(format or IMPORT_CONTENT_TYPES.get(content_type, ""), chunk_size)
+        async for data in request.stream():
+            for chunk in importer.feed(data):
+                importer.record(await run_db(db, book_crud.upsert_books, rows=chunk))
+        for chunk in importer.close():
+            importer.record(await run_db(db, book_crud.upsert_books, rows=chunk))
+    except InvalidImport as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return importer.report
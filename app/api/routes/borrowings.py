@@ -1,142 +1,297 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from app.database import get_db
-from app.schemas.book_borrowing import BookBorrowing, BookBorrowingCreate, BookBorrowingUpdate, BookBorrowingDetail
-from app.crud import book_borrowing as borrowing_crud, book as book_crud, user as user_crud
+from app.api.deps import (
+    check_acting_user, cursor_values, make_etag, not_modified, require_role, rows_response, set_next_cursor
+)
+from app.database import DBSession, get_db, run_db
+from app.export import accepts_gzip, export_response
+from app.models.user import UserRole
+from app.replicas import get_read_db, replicas
+from app.schemas.book_borrowing import (
+    BatchResult, BookBorrowing, BookBorrowingBatchCreate, BookBorrowingCreate, BookBorrowingDetail,
+    BookBorrowingUpdate, BookReturnBatch
+)
+from app.crud import book_borrowing as borrowing_crud, user as user_crud
+from app.security import TokenPayload
+from app.versioning import versions
 
 router = APIRouter()
 
+lender = require_role(
+    UserRole.ADMIN, UserRole.LIBRARIAN, detail="Only admin and librarian users can create borrowing records"
+)
+
 @router.post("/")
-def create_book_borrowing(borrowing: BookBorrowingCreate, db: Session = Depends(get_db)):
+async def create_book_borrowing(
+    borrowing: BookBorrowingCreate,
+    current_user: TokenPayload = Depends(lender),
+    db: DBSession = Depends(get_db)
+):
     """
     Create a new borrowing record
+
+    The acting user is authorized from the bearer token. The availability decrement,
+    duplicate check and insert run in a single transaction (see borrowing_crud.borrow_book).
     
     Args:
         borrowing (BookBorrowingCreate): The borrowing record to be created
-        db (Session, optional): The database session dependency. Defaults to Depends(get_db).
+        current_user (TokenPayload): The authenticated admin or librarian
+        db (DBSession, optional): The database session dependency. Defaults to Depends(get_db).
     
     Raises:
-        HTTPException: 404 Not Found if the current user is not found
-        HTTPException: 403 Forbidden if the current user is not an admin or librarian
+        HTTPException: 401 Unauthorized if the bearer token is missing, invalid, expired or revoked
+        HTTPException: 403 Forbidden if the current user is not an admin or librarian,
+            or the deprecated current_user_id names another user
+        HTTPException: 404 Not Found if the user is not found
         HTTPException: 404 Not Found if the book is not found
         HTTPException: 400 Bad Request if the book is not available for borrowing (quantity is 0)
-        HTTPException: 404 Not Found if the user is not found
         HTTPException: 400 Bad Request if the book is already borrowed and not yet returned
+        HTTPException: 422 Unprocessable Entity if is_returned is true (loans are created unreturned)
     
     Returns:
         dict: A message indicating the successful creation of the borrowing record
     """
-    current_user = user_crud.get_user(db, user_id=borrowing.current_user_id)
-    if not current_user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Current user not found"
-        )
-    
-    # Check if the user has permission (admin or librarian)
-    if current_user.role not in ["admin", "librarian"]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only admin and librarian users can create borrowing records"
-        )
-    # Verify the book exists
-    book = book_crud.get_book(db, book_id=borrowing.book_id)
-    if not book:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Book not found"
-        )
-    
-    # Check if book is available (quantity > 0)
-    if book.available_quantity <= 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Book is not available for borrowing (quantity is 0)"
-        )
-    
-    
-    # Verify the user exists
-    user = user_crud.get_user(db, user_id=borrowing.user_id)
+    check_acting_user(borrowing.current_user_id, current_user)
+    try:
+        await run_db(db, borrowing_crud.borrow_book, borrowing=borrowing)
+    except borrowing_crud.BorrowingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    return {"message": "Borrowing record created successfully"}
+
+def _batch_result(results: List[dict]) -> dict:
+    succeeded = sum(1 for result in results if result["success"])
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+@router.post("/batch", response_model=BatchResult)
+async def create_book_borrowings_batch(
+    batch: BookBorrowingBatchCreate,
+    current_user: TokenPayload = Depends(lender),
+    db: DBSession = Depends(get_db)
+):
+    """
+    Create borrowing records for a whole stack of books in one transaction
+
+    Args:
+        batch (BookBorrowingBatchCreate): The (book_id, user_id) items to borrow
+        current_user (TokenPayload): The authenticated admin or librarian
+        db (DBSession, optional): The database session dependency.
+
+    Raises:
+        HTTPException: 401 Unauthorized if the bearer token is missing, invalid, expired or revoked
+        HTTPException: 403 Forbidden if the current user is not an admin or librarian,
+            or the deprecated current_user_id names another user
+        HTTPException: 409 Conflict if availability or active loans changed while the batch was applied
+
+    Returns:
+        BatchResult: Per-item outcome (status code, borrowing id or error detail)
+    """
+    check_acting_user(batch.current_user_id, current_user)
+    try:
+        results = await run_db(db, borrowing_crud.borrow_books, items=batch.items)
+    except borrowing_crud.BorrowingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return _batch_result(results)
+
+@router.put("/return-batch", response_model=BatchResult)
+async def return_borrowed_books_batch(batch: BookReturnBatch, db: DBSession = Depends(get_db)):
+    """
+    Mark a batch of borrowed books as returned in one transaction
+
+    Args:
+        batch (BookReturnBatch): The ids of the borrowing records to return
+        db (DBSession, optional): The database session dependency.
+
+    Raises:
+        HTTPException: 409 Conflict if a record was returned concurrently while the batch was applied
+
+    Returns:
+        BatchResult: Per-item outcome (status code, borrowing id or error detail)
+    """
+    try:
+        results = await run_db(db, borrowing_crud.return_books, borrowing_ids=batch.borrowing_ids)
+    except borrowing_crud.BorrowingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return _batch_result(results)
+
+@router.get("/", response_model=List[BookBorrowing])
+async def read_borrowings(
+    response: Response,
+    active: bool = False,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Retrieve borrowing records ordered by id
+
+    Without `active`, archived loans are listed too (see app.loan_archive).
+    When more rows may follow, the response carries an `X-Next-Cursor` header to pass back as `cursor`.
+
+    Args:
+        active (bool, optional): Only return books that are not yet returned. Defaults to False.
+        skip (int, optional): Number of records to skip. Ignored when a cursor is given. Defaults to 0.
+        limit (int, optional): Number of records to return. Defaults to 100.
+        cursor (str, optional): Opaque cursor from a previous page's X-Next-Cursor header.
+
+    Raises:
+        HTTPException: 400 Bad Request if the cursor is invalid
+
+    Returns:
+        List[BookBorrowing]: List of borrowing records
+    """
+    after = cursor_values(cursor, "id", ("id",))
+    list_borrowings = borrowing_crud.get_active_borrowings if active else borrowing_crud.get_borrowings
+    borrowings = await run_db(db, list_borrowings, skip=skip, limit=limit, after=after)
+    set_next_cursor(response, borrowings, limit, "id", ("id",))
+    return borrowings
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_borrowings(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    user_id: Optional[int] = None,
+    active: bool = False,
+    accept_encoding: str = Header(""),
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Stream borrowing history as NDJSON or CSV, in id order.
+
+    Rows are read with a server-side cursor and written as they arrive, so memory use stays
+    flat whatever the history size. The body is gzip-compressed on the fly when the client
+    sends `Accept-Encoding: gzip`.
+
+    Args:
+        format (str, optional): "ndjson" or "csv". Defaults to "ndjson".
+        user_id (int, optional): Only export this user's borrowings.
+        active (bool, optional): Only export books that are not yet returned. Defaults to False.
+        accept_encoding (str, optional): The Accept-Encoding request header.
+        db (DBSession, optional): Database session dependency.
+
+    Returns:
+        StreamingResponse: id, book_id, book_title, user_id, user_email and is_returned of every borrowing
+    """
+    query = borrowing_crud.export_borrowings_query(user_id=user_id, active=active)
+    return export_response(db, query, "borrowings", format, accepts_gzip(accept_encoding))
+
+def _user_borrowings(db: Session, user_id: int, skip: int, limit: int, after: Optional[list], history: bool = False):
+    user = user_crud.get_user(db, user_id=user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    
-    # Check if the book is already borrowed and not returned
-    active_borrowings = borrowing_crud.get_user_book_borrowings(db, book_id=borrowing.book_id, user_id=borrowing.user_id)
-    for active_borrowing in active_borrowings:
-        if not active_borrowing.is_returned:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Book is already borrowed and not yet returned"
-            )
-    
-    borrowing_crud.create_borrowing(db=db, borrowing=borrowing)
+    rows = borrowing_crud.get_user_history_rows if history else borrowing_crud.get_user_borrowing_rows
+    return rows(db, user_id=user_id, skip=skip, limit=limit, after=after)
 
-    # Reduce the book quantity
-    book.available_quantity = book.available_quantity - 1
-    db.add(book)
-    db.commit()
-    db.refresh(book)
+@router.get("/user/{user_id}", response_model=List[BookBorrowingDetail], response_class=ORJSONResponse)
+async def read_user_borrowings(
+    request: Request,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Retrieve all borrowing records for a given user
 
-    return {"message": "Borrowing record created successfully"}
+    When more rows may follow, the response carries an `X-Next-Cursor` header to pass back as `cursor`.
+    The `ETag` follows the user's loans and the catalog (the rows embed book details);
+    a matching `If-None-Match` gets a 304 without a database round trip.
 
-@router.get("/user/{user_id}", response_model=List[BookBorrowingDetail])
-def read_user_borrowings(user_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    Args:
+        request (Request): The request, for its If-None-Match header.
+        user_id (int): User id
+        skip (int, optional): Number of records to skip. Ignored when a cursor is given. Defaults to 0.
+        limit (int, optional): Number of records to return. Defaults to 100.
+        cursor (str, optional): Opaque cursor from a previous page's X-Next-Cursor header.
+
+    Raises:
+        HTTPException: 400 Bad Request if the cursor is invalid
+        HTTPException: 404 Not Found if the user is not found
+
+    Returns:
+        List[BookBorrowingDetail]: List of borrowing records
     """
-    Retrieve all borrowing records for a given user
+    after = cursor_values(cursor, "id", ("id",))
+    catalog, loans = versions.catalog, versions.user(user_id)
+    etag = make_etag(request, catalog, loans)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    if replicas.may_lag(db, catalog, loans):
+        # A replica that may not have replayed these versions yet must not vouch for them
+        etag = None
+    borrowings = await run_db(db, _user_borrowings, user_id=user_id, skip=skip, limit=limit, after=after)
+    return rows_response(borrowings, limit, "id", ("id",), etag=etag)
+
+@router.get("/user/{user_id}/history", response_model=List[BookBorrowingDetail], response_class=ORJSONResponse)
+async def read_user_borrowing_history(
+    request: Request,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Retrieve every borrowing record of a user, returned and archived ones included, in id order
+
+    Loans archived by the archival job are read from book_borrowings_archive transparently.
+    Paginates with `X-Next-Cursor` and revalidates with `ETag` like `GET /api/borrowings/user/{user_id}`.
 
     Args:
+        request (Request): The request, for its If-None-Match header.
         user_id (int): User id
-        skip (int, optional): Number of records to skip. Defaults to 0.
+        skip (int, optional): Number of records to skip. Ignored when a cursor is given. Defaults to 0.
         limit (int, optional): Number of records to return. Defaults to 100.
+        cursor (str, optional): Opaque cursor from a previous page's X-Next-Cursor header.
 
     Raises:
+        HTTPException: 400 Bad Request if the cursor is invalid
         HTTPException: 404 Not Found if the user is not found
 
     Returns:
         List[BookBorrowingDetail]: List of borrowing records
     """
-    user = user_crud.get_user(db, user_id=user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    borrowings = borrowing_crud.get_user_borrowings(db, user_id=user_id, skip=skip, limit=limit)
-    return borrowings
+    after = cursor_values(cursor, "id", ("id",))
+    catalog, loans = versions.catalog, versions.user(user_id)
+    etag = make_etag(request, catalog, loans)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    if replicas.may_lag(db, catalog, loans):
+        etag = None
+    borrowings = await run_db(db, _user_borrowings, user_id=user_id, skip=skip, limit=limit, after=after, history=True)
+    return rows_response(borrowings, limit, "id", ("id",), etag=etag)
 
 @router.put("/{borrowing_id}/return")
-def return_borrowed_book(borrowing_id: int, db: Session = Depends(get_db)):
+async def return_borrowed_book(borrowing_id: int, db: DBSession = Depends(get_db)):
     """
     Mark a borrowed book as returned.
 
     This endpoint updates the borrowing record to indicate that the book has been returned.
-    It also increases the available quantity of the book by one.
+    It also increases the available quantity of the book by one and updates the circulation
+    statistics, all in a single transaction (see borrowing_crud.return_book).
 
     Args:
         borrowing_id (int): The ID of the borrowing record to be marked as returned.
-        db (Session, optional): The database session dependency.
+        db (DBSession, optional): The database session dependency.
 
     Raises:
-        HTTPException: If the borrowing record is not found, a 404 Not Found error is raised.
+        HTTPException: 404 Not Found if the borrowing record is not found
+        HTTPException: 400 Bad Request if the book has already been returned
 
     Returns:
         dict: A message indicating the successful return of the book.
     """
-
-    db_borrowing = borrowing_crud.return_book(db, borrowing_id=borrowing_id)
-    if db_borrowing is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Borrowing record not found"
-        )
-    # Increase the book quantity
-    book = book_crud.get_book(db, book_id=db_borrowing.book_id)
-    book.available_quantity = book.available_quantity + 1
-    db.add(book)
-    db.commit()
+    try:
+        await run_db(db, borrowing_crud.return_book, borrowing_id=borrowing_id)
+    except borrowing_crud.BorrowingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     return {"message": "Book returned successfully"}
@@ -0,0 +1,45 @@
+import os
+
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.database import DBSession, get_db, run_db
+from app.lifecycle import lifecycle
+
+router = APIRouter()
+
+def _ping(db: Session) -> None:
+    db.execute(text("SELECT 1"))
+
+@router.get("/live")
+async def read_liveness():
+    """
+    Liveness probe: the worker's event loop is answering.
+
+    Returns:
+        dict: {"status": "ok"}
+    """
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def read_readiness(db: DBSession = Depends(get_db)):
+    """
+    Readiness probe: send traffic to this worker only while this answers 200.
+
+    Answers 503 until the startup hooks have run, once the worker is draining before a
+    shutdown, and while the database doesn't answer a `SELECT 1`.
+
+    Returns:
+        dict: Status, worker pid and its cold start timings in seconds (import, startup, total).
+    """
+    if not lifecycle.is_ready:
+        reason = "draining" if lifecycle.draining else "starting"
+        return JSONResponse({"status": reason}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    try:
+        await run_db(db, _ping)
+    except SQLAlchemyError:
+        return JSONResponse({"status": "database unavailable"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "ready", "pid": os.getpid(), "cold_start_seconds": lifecycle.cold_start()}
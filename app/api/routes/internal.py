@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Query
+
+from app.crud.user import user_cache
+from app.db_pool import pool_stats
+from app.idempotency import idempotency_store
+from app.replicas import replicas
+from app.response_cache import response_cache
+from app.slow_queries import slow_query_log
+
+router = APIRouter()
+
+@router.get("/db-pool")
+async def read_db_pool():
+    """
+    Report live connection pool occupancy and checkout metrics for every database engine.
+
+    Returns:
+        dict: Per pool: size, checked in/out and overflow connections, waiting checkouts,
+            checkout/failure counters and wait/hold time histograms (seconds).
+    """
+    return pool_stats()
+
+@router.get("/replicas")
+async def read_replicas():
+    """
+    Report the read replicas of this worker and whether they are in the read rotation.
+
+    Returns:
+        dict: The lag bound and check interval (seconds) and, per replica: URL without
+            password, health, last measured lag (PostgreSQL only), last error and check time.
+    """
+    return replicas.stats()
+
+@router.get("/caches")
+async def read_caches():
+    """
+    Report size and hit/miss counters of the in-process caches of this worker.
+
+    Returns:
+        dict: Per cache: current size, bounds (entries and TTL, or bytes) and hit/miss counters.
+    """
+    return {cache.name: cache.stats() for cache in (user_cache, response_cache, idempotency_store.cache)}
+
+@router.get("/slow-queries")
+async def read_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    """
+    Report the statements of this worker slower than SLOW_QUERY_MS, newest first.
+
+    Args:
+        limit (int, optional): Maximum number of entries to return. Defaults to 50.
+
+    Returns:
+        dict: The threshold (ms, 0 when the log is disabled) and the entries: normalized SQL,
+            parameter shape, duration, calling crud function and, for sampled entries, the
+            plan ("pending" until the background EXPLAIN ran).
+    """
+    return {"threshold_ms": slow_query_log.threshold_ms, "entries": slow_query_log.entries(limit)}
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.metrics import CONTENT_TYPE, render
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    """
+    Expose every in-process metric of this worker in the Prometheus text format.
+
+    Includes per-route request, SQL, pool wait and handler time histograms (labelled by
+    route template), connection pool and cache metrics.
+
+    Returns:
+        PlainTextResponse: The Prometheus exposition text.
+    """
+    return PlainTextResponse(render(), media_type=CONTENT_TYPE)
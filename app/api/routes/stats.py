@@ -0,0 +1,120 @@
+from fastapi import APIRouter, Depends, Query
+from typing import List
+
+from app.api.deps import require_role
+from app.crud import circulation
+from app.database import DBSession, run_db
+from app.models.user import UserRole
+from app.replicas import get_read_db
+from app.schemas.circulation import BookCirculation, DailyCirculation, UserCirculation, Utilization
+from app.security import TokenPayload
+
+router = APIRouter()
+
+# Every route reads the circulation rollups only (app.crud.circulation), a bounded number of
+# rows however long the loan history is
+staff = require_role(
+    UserRole.ADMIN, UserRole.LIBRARIAN, detail="Only admin and librarian users can read circulation statistics"
+)
+
+@router.get("/books/most-borrowed", response_model=List[BookCirculation])
+async def read_most_borrowed_books(
+    limit: int = Query(10, ge=1, le=100),
+    current_user: TokenPayload = Depends(staff),
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Retrieve the books borrowed most often, archived loans included
+
+    Args:
+        limit (int, optional): Number of books to return. Defaults to 10.
+        current_user (TokenPayload): The authenticated admin or librarian
+
+    Raises:
+        HTTPException: 401 Unauthorized if the bearer token is missing, invalid, expired or revoked
+        HTTPException: 403 Forbidden if the current user is not an admin or librarian
+
+    Returns:
+        List[BookCirculation]: Books with their total and current loan counts, most loans first
+    """
+    return await run_db(db, circulation.most_borrowed_books, limit=limit)
+
+@router.get("/users/top", response_model=List[UserCirculation])
+async def read_top_borrowers(
+    limit: int = Query(10, ge=1, le=100),
+    current_user: TokenPayload = Depends(staff),
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Retrieve the users who borrowed most often, archived loans included
+
+    Args:
+        limit (int, optional): Number of users to return. Defaults to 10.
+        current_user (TokenPayload): The authenticated admin or librarian
+
+    Raises:
+        HTTPException: 401 Unauthorized if the bearer token is missing, invalid, expired or revoked
+        HTTPException: 403 Forbidden if the current user is not an admin or librarian
+
+    Returns:
+        List[UserCirculation]: Users with their total and current loan counts, most loans first
+    """
+    return await run_db(db, circulation.top_borrowers, limit=limit)
+
+@router.get("/users/{user_id}", response_model=UserCirculation)
+async def read_user_circulation(
+    user_id: int,
+    current_user: TokenPayload = Depends(staff),
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Retrieve the loan counts of a user
+
+    Args:
+        user_id (int): User id
+        current_user (TokenPayload): The authenticated admin or librarian
+
+    Raises:
+        HTTPException: 401 Unauthorized if the bearer token is missing, invalid, expired or revoked
+        HTTPException: 403 Forbidden if the current user is not an admin or librarian
+
+    Returns:
+        UserCirculation: Loans the user ever took and has out now (0 for users who never borrowed)
+    """
+    return await run_db(db, circulation.user_circulation, user_id=user_id)
+
+@router.get("/utilization", response_model=Utilization)
+async def read_utilization(current_user: TokenPayload = Depends(staff), db: DBSession = Depends(get_read_db)):
+    """
+    Retrieve the share of the catalog's copies currently out on loan
+
+    Raises:
+        HTTPException: 401 Unauthorized if the bearer token is missing, invalid, expired or revoked
+        HTTPException: 403 Forbidden if the current user is not an admin or librarian
+
+    Returns:
+        Utilization: Copies in the catalog, on the shelf and on loan, and 1 - available / copies
+    """
+    return await run_db(db, circulation.utilization)
+
+@router.get("/daily", response_model=List[DailyCirculation])
+async def read_daily_circulation(
+    days: int = Query(30, ge=1, le=366),
+    current_user: TokenPayload = Depends(staff),
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    Retrieve borrows and returns per UTC day
+
+    Args:
+        days (int, optional): Number of days up to today to report. Defaults to 30.
+        current_user (TokenPayload): The authenticated admin or librarian
+
+    Raises:
+        HTTPException: 401 Unauthorized if the bearer token is missing, invalid, expired or revoked
+        HTTPException: 403 Forbidden if the current user is not an admin or librarian
+
+    Returns:
+        List[DailyCirculation]: One entry per day, oldest first, days without loans included
+    """
+    return await run_db(db, circulation.daily_circulation, days=days)
@@ -1,28 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from app.database import get_db
-from app.schemas.user import User, UserCreate, LoginRequest, UserUpdate, RoleUpdate
+from app.api.deps import check_acting_user, cursor_values, make_etag, not_modified, require_role, rows_response
+from app.database import DBSession, get_db, run_db
+from app.schemas.user import User, UserCreate, LoginRequest, LoginResponse, UserUpdate, RoleUpdate
 from app.crud import user as user_crud
 from app.models.user import UserRole
+from app.replicas import get_read_db, replicas
+from app.response_cache import request_key, response_cache
+from app.security import TokenPayload, create_access_token
+from app.versioning import versions
 
 router = APIRouter()
 
-@router.post("/register", response_model=User)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    """
-    Register a new user
-
-    Args:
-        user (UserCreate): User details
+admin_only = require_role(UserRole.ADMIN, detail="Only admin users can update user roles")
 
-    Raises:
-        HTTPException: 400 Bad Request if email is already registered or password is too short
-
-    Returns:
-        User: Newly created user
-    """
+def _register(db: Session, user: UserCreate):
     db_user = user_crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(
@@ -36,8 +31,24 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     return user_crud.create_user(db=db, user=user)
 
-@router.post("/login", response_model=User)
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+@router.post("/register", response_model=User)
+async def register(user: UserCreate, db: DBSession = Depends(get_db)):
+    """
+    Register a new user
+
+    Args:
+        user (UserCreate): User details
+
+    Raises:
+        HTTPException: 400 Bad Request if email is already registered or password is too short
+
+    Returns:
+        User: Newly created user
+    """
+    return await run_db(db, _register, user=user)
+
+@router.post("/login", response_model=LoginResponse)
+async def login(login_data: LoginRequest, db: DBSession = Depends(get_db)):
     """
     Login for an existing user
 
@@ -48,59 +59,99 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
         HTTPException: 401 Unauthorized if email or password is incorrect
 
     Returns:
-        User: User details
+        LoginResponse: User details and a bearer access token carrying the user's id and role
     """
-    user = user_crud.authenticate_user(db, email=login_data.email, password=login_data.password)
+    user = await run_db(db, user_crud.authenticate_user, email=login_data.email, password=login_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
-    return {"id": user.id,  "first_name": user.first_name, "last_name": user.last_name,"email": user.email, "role": user.role, "is_active": user.is_active}
-
-@router.get("/", response_model=List[User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    access_token = create_access_token(user.id, user.role, user.token_version)
+    return {"id": user.id,  "first_name": user.first_name, "last_name": user.last_name,"email": user.email, "role": user.role, "is_active": user.is_active,
+            "access_token": access_token, "token_type": "bearer"}
+
+@router.get("/", response_model=List[User], response_class=ORJSONResponse)
+async def read_users(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = Query("id", regex="^(id|email)$"),
+    db: DBSession = Depends(get_read_db)
+):
     """
     Retrieve all users
 
+    When more rows may follow, the response carries an `X-Next-Cursor` header to pass back as `cursor`.
+    Pages carry an `ETag` for `If-None-Match` revalidation and stay in the shared response
+    cache until a user row changes.
+
     Args:
-        skip (int, optional): Number of records to skip. Defaults to 0.
+        request (Request): The request, for its If-None-Match header.
+        skip (int, optional): Number of records to skip. Ignored when a cursor is given. Defaults to 0.
         limit (int, optional): Number of records to return. Defaults to 100.
+        cursor (str, optional): Opaque cursor from a previous page's X-Next-Cursor header.
+        sort (str, optional): Sort order, "id" or "email". Defaults to "id".
+
+    Raises:
+        HTTPException: 400 Bad Request if the cursor is invalid
 
     Returns:
         List[User]: List of users
     """
-    users = user_crud.get_users(db, skip=skip, limit=limit)
-    return users
+    after = cursor_values(cursor, sort, user_crud.USER_SORT_KEYS[sort])
+    users_version = versions.users
+    etag = make_etag(request, users_version)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    async def load(etag: Optional[str] = etag):
+        users = await run_db(db, user_crud.get_user_rows, skip=skip, limit=limit, after=after, sort=sort)
+        return rows_response(users, limit, sort, user_crud.USER_SORT_KEYS[sort], etag=etag)
+
+    if replicas.may_lag(db, users_version):
+        # The replica may not have this version of the users table yet: serve the page untagged and uncached
+        return await load(etag=None)
+    return await response_cache.get_or_load(request_key(request, users_version), ("users",), load)
+
+def _update_user_role(db: Session, user_id: int, role_update: RoleUpdate):
+    user_update = UserUpdate(role=role_update.role)
+    db_user = user_crud.update_user(db, user_id=user_id, user=user_update)
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail="User not found"
+        )
+    return db_user
 
 @router.put("/{user_id}/role", response_model=User)
-def update_user_role(user_id: int, role_update: RoleUpdate, db: Session = Depends(get_db)):
+async def update_user_role(
+    user_id: int,
+    role_update: RoleUpdate,
+    current_user: TokenPayload = Depends(admin_only),
+    db: DBSession = Depends(get_db)
+):
     """
     Update the role of a user
 
+    The admin is authorized from the bearer token. Changing the role revokes the user's
+    existing tokens, so they must log in again to act with the new role.
+
     Args:
         user_id (int): id of the user to update
-        role_update (RoleUpdate): new role and id of the admin who made the update
+        role_update (RoleUpdate): new role (admin_id is deprecated)
+        current_user (TokenPayload): The authenticated admin
 
     Raises:
-        HTTPException: 403 Forbidden if the admin is not an admin
+        HTTPException: 401 Unauthorized if the bearer token is missing, invalid, expired or revoked
+        HTTPException: 403 Forbidden if the current user is not an admin,
+            or the deprecated admin_id names another user
         HTTPException: 404 Not Found if the user is not found
 
     Returns:
         User: Updated user
     """
-    admin_id = role_update.admin_id
-    admin = user_crud.get_user(db, user_id=admin_id)
-    if admin is None or admin.role != UserRole.ADMIN:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only admin users can update user roles"
-    )
-    user_update = UserUpdate(role=role_update.role)
-    db_user = user_crud.update_user(db, user_id=user_id, user=user_update)
-    if db_user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail="User not found"
-        )
-    return db_user
\ No newline at end of file
+    check_acting_user(role_update.admin_id, current_user)
+    return await run_db(db, _update_user_role, user_id=user_id, role_update=role_update)
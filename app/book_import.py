@@ -0,0 +1,183 @@
+# app/book_import.py
+import codecs
+import csv
+import json
+from itertools import chain
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS
+from app.crud import book as book_crud
+from app.schemas.book import BookImportError, BookImportReport
+
+FORMATS = ("csv", "ndjson")
+
+class InvalidImport(ValueError):
+    """The upload as a whole cannot be imported (unknown format, unusable CSV header)."""
+
+class LineSplitter:
+    """Incrementally decode UTF-8 byte chunks (a leading BOM is dropped) into complete lines."""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._buffer = ""
+
+    def feed(self, chunk: bytes) -> List[str]:
+        self._buffer += self._decoder.decode(chunk)
+        *lines, self._buffer = self._buffer.split("\n")
+        return [line + "\n" for line in lines]
+
+    def close(self) -> List[str]:
+        rest, self._buffer = self._buffer + self._decoder.decode(b"", final=True), ""
+        return [rest] if rest else []
+
+def _clean(raw: dict) -> dict:
+    """Validate one input record into the row shape book_crud.upsert_books expects."""
+    title = str(raw.get("title") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+    author = str(raw.get("author") or "").strip() or None
+    quantity, available = raw.get("quantity"), raw.get("available_quantity")
+    try:
+        quantity = 1 if quantity in (None, "") else int(quantity)
+        available = quantity if available in (None, "") else int(available)
+    except (TypeError, ValueError):
+        raise ValueError("quantity and available_quantity must be integers")
+    if quantity < 0 or not 0 <= available <= quantity:
+        raise ValueError("quantities must satisfy 0 <= available_quantity <= quantity")
+    return {"title": title, "author": author, "quantity": quantity, "available_quantity": available}
+
+class BookRowParser:
+    """
+    Turn the lines of a CSV (with a header row) or NDJSON catalog into validated rows.
+
+    feed() yields (line number, row, error) for every complete record; exactly one of
+    row and error is set. CSV records may span lines inside quoted fields.
+    """
+
+    def __init__(self, format: str):
+        if format not in FORMATS:
+            raise InvalidImport(f"Unsupported import format {format!r}, expected one of {', '.join(FORMATS)}")
+        self.format = format
+        self._line_no = 0
+        self._header = None
+        self._record: List[str] = []
+        self._record_line = 0
+
+    def feed(self, lines: Iterable[str]) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        for line in lines:
+            self._line_no += 1
+            if self.format == "ndjson":
+                if line.strip():
+                    yield self._ndjson(line)
+                continue
+            if not self._record:
+                self._record_line = self._line_no
+            self._record.append(line)
+            # Quotes come in pairs (escaped ones are doubled), so an odd count means an open field
+            if sum(part.count('"') for part in self._record) % 2 == 0:
+                result = self._csv("".join(self._record))
+                self._record = []
+                if result is not None:
+                    yield result
+
+    def close(self) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        if self._record:
+            yield self._record_line, None, "unterminated quoted field"
+            self._record = []
+
+    def _ndjson(self, line: str):
+        try:
+            raw = json.loads(line)
+            if not isinstance(raw, dict):
+                raise ValueError("expected a JSON object")
+            return self._line_no, _clean(raw), None
+        except ValueError as e:
+            return self._line_no, None, str(e)
+
+    def _csv(self, record: str):
+        if not record.strip():
+            return None
+        values = next(csv.reader([record]))
+        if self._header is None:
+            self._header = [name.strip().lower() for name in values]
+            if "title" not in self._header:
+                raise InvalidImport("CSV header must have a title column")
+            return None
+        try:
+            return self._record_line, _clean(dict(zip(self._header, values))), None
+        except ValueError as e:
+            return self._record_line, None, str(e)
+
+class BookImporter:
+    """
+    Splits, parses and chunks an uploaded catalog, and tallies the import report.
+
+    Drivers pass each byte chunk of the input to feed() and then call close(); both
+    yield full chunks of rows, which the driver writes with book_crud.upsert_books and
+    hands the resulting counts to record().
+    """
+
+    def __init__(self, format: str, chunk_size: int = IMPORT_CHUNK_SIZE,
+                 progress: Optional[Callable[[BookImportReport], None]] = None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.report = BookImportReport()
+        self._splitter = LineSplitter()
+        self._parser = BookRowParser(format)
+        self._chunk: List[dict] = []
+
+    def feed(self, data: bytes) -> Iterator[List[dict]]:
+        return self._add(self._parser.feed(self._splitter.feed(data)))
+
+    def close(self) -> Iterator[List[dict]]:
+        yield from self._add(chain(self._parser.feed(self._splitter.close()), self._parser.close()))
+        if self._chunk:
+            chunk, self._chunk = self._chunk, []
+            yield chunk
+
+    def _add(self, parsed: Iterable[Tuple[int, Optional[dict], Optional[str]]]) -> Iterator[List[dict]]:
+        for line, row, error in parsed:
+            self.report.rows += 1
+            if error is not None:
+                self.report.failed += 1
+                if len(self.report.errors) < IMPORT_MAX_ERRORS:
+                    self.report.errors.append(BookImportError(line=line, error=error))
+                continue
+            self._chunk.append(row)
+            if len(self._chunk) >= self.chunk_size:
+                chunk, self._chunk = self._chunk, []
+                yield chunk
+
+    def record(self, counts: Tuple[int, int]) -> None:
+        """Account for one written chunk (inserted, updated) and report progress."""
+        inserted, updated = counts
+        self.report.inserted += inserted
+        self.report.updated += updated
+        if self.progress is not None:
+            self.progress(self.report)
+
+def import_books(
+    db: Session,
+    chunks: Iterable[bytes],
+    format: str,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    progress: Optional[Callable[[BookImportReport], None]] = None
+) -> BookImportReport:
+    """
+    Stream a CSV or NDJSON catalog from byte chunks into books, one transaction per chunk.
+
+    Memory use is bounded by one chunk of rows whatever the input size. Chunks already
+    written stay committed if a later one fails.
+
+    Raises:
+        InvalidImport: if the format is unknown or the CSV header has no title column
+    """
+    importer = BookImporter(format, chunk_size, progress)
+    for data in chunks:
+        for chunk in importer.feed(data):
+            importer.record(book_crud.upsert_books(db, chunk))
+    for chunk in importer.close():
+        importer.record(book_crud.upsert_books(db, chunk))
+    return importer.report
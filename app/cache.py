@@ -0,0 +1,116 @@
+# app/cache.py
+import importlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from app.config import CACHE_INVALIDATION_BACKEND
+from app.metrics import Counter
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result", ["cache", "result"])
+
+class InvalidationBackend:
+    """
+    Fans cache invalidations out to every worker process.
+
+    Implementations deliver each published key to the callbacks subscribed to the channel
+    in every process, including the publisher's own.
+    """
+
+    def publish(self, channel: str, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, callback: Callable[[Hashable], None]) -> None:
+        raise NotImplementedError
+
+    def start(self) -> None:
+        """Start receiving other processes' invalidations (called once the app is loaded)."""
+
+    def stop(self) -> None:
+        """Stop receiving, after delivering whatever this process published."""
+
+class InMemoryInvalidationBackend(InvalidationBackend):
+    """Delivers invalidations to subscribers in this process only (single worker, tests)."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Callable]] = defaultdict(list)
+
+    def publish(self, channel: str, key: Hashable) -> None:
+        for callback in list(self._subscribers[channel]):
+            callback(key)
+
+    def subscribe(self, channel: str, callback: Callable[[Hashable], None]) -> None:
+        self._subscribers[channel].append(callback)
+
+def load_invalidation_backend(path: str = CACHE_INVALIDATION_BACKEND) -> InvalidationBackend:
+    if not path:
+        return InMemoryInvalidationBackend()
+    module, _, factory = path.partition(":")
+    return getattr(importlib.import_module(module), factory)()
+
+invalidation_backend = load_invalidation_backend()
+
+_MISSING = object()
+
+class LRUTTLCache:
+    """
+    Thread-safe cache bounded by entry count (LRU eviction) and entry age (TTL).
+
+    Invalidations go through the shared backend so every worker drops the key. Each one
+    also bumps `generation`; a value read from the database before an invalidation is
+    refused by set(), so a slow reader cannot re-cache a row that was just changed.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, backend: Optional[InvalidationBackend] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.backend = backend or invalidation_backend
+        self.backend.subscribe(f"cache:{name}", self._drop)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] < time.monotonic():
+                del self._entries[key]
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc(cache=self.name, result="miss" if entry is _MISSING else "hit")
+        return default if entry is _MISSING else entry[0]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self.backend.publish(f"cache:{self.name}", key)
+
+    def _drop(self, key: Hashable) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
@@ -1,9 +1,13 @@
 import os
+import secrets
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+def env_bool(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
 # Database configuration
 DATABASE_USER = os.getenv("DATABASE_USER", "postgres")
 DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD", "postgres")
@@ -12,5 +16,124 @@ DATABASE_PORT = os.getenv("DATABASE_PORT", "5432")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "bookstore")
 
 
-# Construct the database URL
-DATABASE_URL = f"postgresql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
+# Construct the database URL (a full DATABASE_URL, e.g. sqlite:///./test.db, takes precedence)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
+
+# Native asyncio database access (asyncpg on PostgreSQL, aiosqlite on SQLite) instead of
+# sync sessions on the threadpool
+DATABASE_ASYNC = env_bool("DATABASE_ASYNC")
+
+# Read replicas (app.replicas): comma-separated SQLAlchemy URLs that read-only routes are spread
+# over, round-robin. A client's reads stay on the primary for REPLICA_MAX_LAG_SECONDS after it
+# wrote, and replicas lagging further behind (PostgreSQL) are taken out of rotation; health is
+# re-checked every REPLICA_CHECK_INTERVAL seconds
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+
+# Connection pool (per engine, per worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 keeps connections forever
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", "true")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # PostgreSQL only, 0 disables
+
+# Admission control (app.admission), per worker process. While a database pool has
+# ADMISSION_MAX_POOL_WAITING checkouts queued, or queued checkouts recently waited
+# ADMISSION_MAX_POOL_WAIT_MS on average, /api requests are answered 503 at once: expensive
+# routes (exports, imports, batches) from half those thresholds, catalog reads only from twice
+# them. Expensive routes run at most ADMISSION_EXPENSIVE_CONCURRENCY requests at a time, every
+# other route ADMISSION_ROUTE_CONCURRENCY (0 = no limit). Each client (bearer token user, else
+# IP address) may send RATE_LIMIT_PER_SECOND requests per second in bursts of up to
+# RATE_LIMIT_BURST, further requests get 429 (0 disables)
+ADMISSION_ENABLED = env_bool("ADMISSION_ENABLED", "true")
+ADMISSION_MAX_POOL_WAITING = int(os.getenv("ADMISSION_MAX_POOL_WAITING", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+ADMISSION_MAX_POOL_WAIT_MS = float(os.getenv("ADMISSION_MAX_POOL_WAIT_MS", "250"))
+ADMISSION_EXPENSIVE_CONCURRENCY = int(os.getenv("ADMISSION_EXPENSIVE_CONCURRENCY", "4"))
+ADMISSION_ROUTE_CONCURRENCY = int(os.getenv("ADMISSION_ROUTE_CONCURRENCY", "0"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))  # seconds
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+
+# In-process user identity cache (app.crud.user); USER_CACHE_SIZE=0 disables it
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # seconds
+
+# Shared cache of GET responses (app.response_cache), bounded by body bytes (0 disables it);
+# entries also expire after RESPONSE_CACHE_TTL seconds
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+
+# Slow query log (app.slow_queries): statements slower than SLOW_QUERY_MS are kept in a ring
+# buffer of SLOW_QUERY_LOG_SIZE entries, a SLOW_QUERY_EXPLAIN_SAMPLE fraction with their plan
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))  # 0 disables the log
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))
+
+# Idempotency-Key support for write requests (app.idempotency): responses are kept for
+# IDEMPOTENCY_TTL_SECONDS (the newest IDEMPOTENCY_CACHE_SIZE also in memory, up to
+# IDEMPOTENCY_MAX_BODY_BYTES each; larger request bodies are streamed, not buffered). A worker
+# executing a request renews its hold on the key, which lapses IDEMPOTENCY_LOCK_SECONDS after
+# the last renewal; duplicates wait up to IDEMPOTENCY_WAIT_SECONDS for it to finish
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", str(1024 * 1024)))
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+
+# "package.module:factory" returning an app.cache.InvalidationBackend shared by all workers
+# (e.g. app.invalidation:DatabaseInvalidationBackend, or a Redis pub/sub adapter); empty means
+# invalidations stay within this process. The database backend polls for other workers'
+# invalidations every CACHE_INVALIDATION_POLL_INTERVAL seconds and keeps them
+# CACHE_INVALIDATION_RETENTION seconds
+CACHE_INVALIDATION_BACKEND = os.getenv("CACHE_INVALIDATION_BACKEND", "")
+CACHE_INVALIDATION_POLL_INTERVAL = float(os.getenv("CACHE_INVALIDATION_POLL_INTERVAL", "1"))
+CACHE_INVALIDATION_RETENTION = float(os.getenv("CACHE_INVALIDATION_RETENTION", "300"))
+
+# Signing key for access tokens. Set it explicitly in production: the random fallback differs
+# per process, so tokens would not survive a restart or be accepted by other workers
+SECRET_KEY = os.getenv("SECRET_KEY") or secrets.token_urlsafe(32)
+TOKEN_TTL_SECONDS = int(os.getenv("TOKEN_TTL_SECONDS", "3600"))
+
+# Bulk catalog import (app.book_import): rows written per transaction, row errors reported
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+# Rows fetched per server-side cursor round trip by the streaming export routes
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Loan archive (app.loan_archive): returned loans older than ARCHIVE_AFTER_DAYS move from
+# book_borrowings to book_borrowings_archive, ARCHIVE_BATCH_SIZE rows per transaction with
+# ARCHIVE_BATCH_PAUSE seconds between batches, every ARCHIVE_INTERVAL seconds (0 disables the
+# background job; archive_loans.py runs it by hand)
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_BATCH_PAUSE = float(os.getenv("ARCHIVE_BATCH_PAUSE", "0.1"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+
+# Availability reconciliation (app.reconciliation): books whose available_quantity differs
+# from quantity minus active loans are fixed (only reported with RECONCILE_FIX=false), checked
+# RECONCILE_BATCH_SIZE books per transaction with RECONCILE_BATCH_PAUSE seconds between
+# batches, every RECONCILE_INTERVAL seconds (0 disables the background job;
+# reconcile_availability.py runs it by hand)
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "1000"))
+RECONCILE_BATCH_PAUSE = float(os.getenv("RECONCILE_BATCH_PAUSE", "0.1"))
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "86400"))
+RECONCILE_FIX = env_bool("RECONCILE_FIX", "true")
+
+# Circulation statistics (app.crud.circulation): daily counters and catalog totals are split
+# over CIRCULATION_SHARDS rows by book id, so concurrent loans of different books rarely update
+# the same row. rebuild_stats.py recomputes the rollups STATS_REBUILD_CHUNK_SIZE book or user
+# ids, or STATS_REBUILD_CHUNK_DAYS days, per transaction
+CIRCULATION_SHARDS = int(os.getenv("CIRCULATION_SHARDS", "16"))
+STATS_REBUILD_CHUNK_SIZE = int(os.getenv("STATS_REBUILD_CHUNK_SIZE", "5000"))
+STATS_REBUILD_CHUNK_DAYS = int(os.getenv("STATS_REBUILD_CHUNK_DAYS", "31"))
+
+# Production server (run.py --prod, app.server): worker processes, seconds a stopping worker
+# keeps serving while it reports not ready, then seconds it waits for in-flight requests
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "5000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+DRAIN_SECONDS = float(os.getenv("DRAIN_SECONDS", "5"))
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))
@@ -1,29 +1,171 @@
+import csv
+import io
+import re
+from sqlalchemy import Select, bindparam, case, false, func, insert, or_, select, text, update
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
+from app import versioning
+from app.crud import circulation
 from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.pagination import paginate
 from app.schemas.book import BookCreate, BookUpdate
 
+# Keyset sort orders: each ends with the unique id so the order is total
+BOOK_SORT_KEYS = {"id": ("id",), "title": ("title", "id")}
+
+# The fields of schemas.book.Book, selected as plain columns for serialized responses
+BOOK_COLUMNS = (Book.id, Book.title, Book.author, Book.quantity, Book.available_quantity)
+
 def get_book(db: Session, book_id: int) -> Optional[Book]:
     return db.query(Book).filter(Book.id == book_id).first()
 
-def get_books(db: Session, skip: int = 0, limit: int = 100) -> List[Book]:
-    return db.query(Book).offset(skip).limit(limit).all()
+def get_books(db: Session, skip: int = 0, limit: int = 100, after: Optional[list] = None, sort: str = "id") -> List[Book]:
+    columns = [getattr(Book, key) for key in BOOK_SORT_KEYS[sort]]
+    return paginate(db.query(Book), columns, after=after, skip=skip, limit=limit).all()
+
+def get_book_rows(db: Session, skip: int = 0, limit: int = 100, after: Optional[list] = None, sort: str = "id") -> List[dict]:
+    """Like get_books, but selects only BOOK_COLUMNS and returns plain dicts ready to encode."""
+    columns = [getattr(Book, key) for key in BOOK_SORT_KEYS[sort]]
+    query = paginate(db.query(*BOOK_COLUMNS), columns, after=after, skip=skip, limit=limit)
+    return [row._asdict() for row in query]
+
+# Ranked full-text match plus word-level trigram similarity for typos (GIN indexed, see models.book)
+_POSTGRES_SEARCH = text("""
+    SELECT books.* FROM books, websearch_to_tsquery('simple', :q) AS query
+    WHERE to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(author, '')) @@ query
+       OR :q <% title OR :q <% author
+    ORDER BY ts_rank(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(author, '')), query)
+           + greatest(word_similarity(:q, title), word_similarity(:q, coalesce(author, ''))) DESC,
+             books.id
+    LIMIT :limit
+""")
+
+# FTS5 trigram index: rows sharing more trigrams with the query rank higher (bm25)
+_SQLITE_SEARCH = text("""
+    SELECT books.* FROM books_fts JOIN books ON books.id = books_fts.rowid
+    WHERE books_fts MATCH :q
+    ORDER BY books_fts.rank, books.id
+    LIMIT :limit
+""")
+
+def _trigram_query(q: str) -> str:
+    """FTS5 MATCH expression OR-ing the trigrams of every query word, so misspellings still match."""
+    trigrams = []
+    for word in re.findall(r"\w+", q.lower()):
+        trigrams.extend(word[i:i + 3] for i in range(len(word) - 2))
+    return " OR ".join('"%s"' % trigram for trigram in dict.fromkeys(trigrams))
+
+def search_books(db: Session, q: str, limit: int = 20) -> List[Book]:
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return db.query(Book).from_statement(_POSTGRES_SEARCH.bindparams(q=q, limit=limit)).all()
+    if dialect == "sqlite":
+        match = _trigram_query(q)
+        if not match:
+            return []
+        return db.query(Book).from_statement(_SQLITE_SEARCH.bindparams(q=match, limit=limit)).all()
+    pattern = f"%{q}%"
+    return db.query(Book).filter(or_(Book.title.ilike(pattern), Book.author.ilike(pattern))).order_by(Book.id).limit(limit).all()
+
+def export_books_query() -> Select:
+    """Column-only select of the whole catalog in id order, for streaming exports."""
+    return select(*BOOK_COLUMNS).order_by(Book.id)
 
 def get_user_books(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[Book]:
-    return db.query(Book).filter(Book.borrower_id == user_id).offset(skip).limit(limit).all()
+    """Books the user currently has on loan."""
+    return (
+        db.query(Book)
+        .join(BookBorrowing, BookBorrowing.book_id == Book.id)
+        .filter(BookBorrowing.user_id == user_id, BookBorrowing.is_returned == False)
+        .order_by(Book.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
 
-def create_book(db: Session, book: BookCreate, borrower_id: int) -> Book:
+def create_book(db: Session, book: BookCreate) -> Book:
     db_book = Book(
         title=book.title,
-        author=book.author,
-        borrower_id=borrower_id
+        author=book.author
     )
     db.add(db_book)
     db.commit()
     db.refresh(db_book)
     return db_book
 
+def _copy_books(db: Session, rows: List[dict]) -> None:
+    """Insert rows with PostgreSQL COPY on the session's own connection and transaction."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # COPY ... CSV reads an unquoted empty field as NULL
+        writer.writerow([row["title"], row["author"] or None, row["quantity"], row["available_quantity"]])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert("COPY books (title, author, quantity, available_quantity) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+def upsert_books(db: Session, rows: List[dict]) -> Tuple[int, int]:
+    """
+    Merge a chunk of catalog rows into books and commit, keyed by (title, author).
+
+    Rows need title, author, quantity and available_quantity. Quantities of rows with
+    the same key (in the chunk or already stored) are added together. Existing books
+    are found with one title IN (...) query, then updates and inserts are each sent as a
+    single executemany (COPY for inserts on psycopg2).
+
+    Returns:
+        Tuple[int, int]: number of books inserted and updated
+    """
+    merged = {}
+    for row in rows:
+        key = (row["title"], row["author"])
+        if key in merged:
+            merged[key]["quantity"] += row["quantity"]
+            merged[key]["available_quantity"] += row["available_quantity"]
+        else:
+            merged[key] = dict(row)
+
+    existing = {
+        (title, author): book_id
+        for book_id, title, author in db.query(Book.id, Book.title, Book.author).filter(
+            Book.title.in_({title for title, _ in merged})
+        )
+    }
+    updates = [
+        {"book_id": existing[key], "add_quantity": row["quantity"], "add_available": row["available_quantity"]}
+        for key, row in merged.items() if key in existing
+    ]
+    inserts = [row for key, row in merged.items() if key not in existing]
+
+    versioning.touch(db, catalog=True)
+    changes = {row["book_id"]: (row["add_quantity"], row["add_available"]) for row in updates}
+    if updates:
+        db.connection().execute(
+            update(Book)
+            .where(Book.id == bindparam("book_id"))
+            .values(
+                quantity=Book.quantity + bindparam("add_quantity"),
+                available_quantity=Book.available_quantity + bindparam("add_available"),
+            ),
+            updates,
+        )
+    if inserts:
+        if db.get_bind().dialect.driver == "psycopg2":
+            _copy_books(db, inserts)
+        else:
+            db.connection().execute(insert(Book), inserts)
+    # Inserted books have no ids here (COPY returns none): their copies go to shard 0 of the
+    # circulation totals, which are only ever read summed over the shards
+    changes[0] = (sum(row["quantity"] for row in inserts), sum(row["available_quantity"] for row in inserts))
+    circulation.record_catalog(db, changes)
+    db.commit()
+    return len(inserts), len(updates)
+
 def update_book(db: Session, book_id: int, book: BookUpdate) -> Optional[Book]:
     db_book = get_book(db, book_id)
     if not db_book:
@@ -44,4 +186,73 @@ def delete_book(db: Session, book_id: int) -> Optional[Book]:
     
     db.delete(db_book)
     db.commit()
-    return db_book
\ No newline at end of file
+    return db_book
+
+def _availability(after: Optional[int] = None, limit: Optional[int] = None, book_ids: Optional[List[int]] = None) -> Select:
+    """
+    Stored and true availability of a chunk of books, in id order, as one aggregate query.
+
+    The true availability is quantity minus the book's active loans, and never below zero.
+    Active loans are counted for the chunk's ids only, off ix_book_borrowings_book_id.
+    """
+    books = Book.__table__
+    loans = BookBorrowing.__table__
+    chunk = select(books.c.id, books.c.quantity, books.c.available_quantity).order_by(books.c.id)
+    if after is not None:
+        chunk = chunk.where(books.c.id > after)
+    if book_ids is not None:
+        chunk = chunk.where(books.c.id.in_(book_ids))
+    chunk = chunk.limit(limit).subquery()
+    active = (
+        select(loans.c.book_id, func.count().label("loans"))
+        .where(loans.c.book_id.in_(select(chunk.c.id)), loans.c.is_returned == false())
+        .group_by(loans.c.book_id)
+        .subquery()
+    )
+    expected = func.coalesce(chunk.c.quantity, 0) - func.coalesce(active.c.loans, 0)
+    return (
+        select(chunk.c.id, chunk.c.quantity, chunk.c.available_quantity,
+               case((expected < 0, 0), else_=expected).label("expected"))
+        .outerjoin(active, active.c.book_id == chunk.c.id)
+        .order_by(chunk.c.id)
+    )
+
+def reconcile_availability(db: Session, after: Optional[int] = None, batch_size: int = 1000, fix: bool = True) -> Tuple[Optional[int], int, List[dict]]:
+    """
+    Check the available_quantity of the `batch_size` books after id `after` against their loans, and commit.
+
+    Checking takes no locks. Drifted books are then locked (in id order) and recomputed
+    before they are fixed, so a borrow or return in flight is neither lost nor counted
+    twice: borrows lock the book before adding the loan, returns change the loan before
+    locking the book. Only the drifted rows are locked, for one short transaction.
+
+    Returns:
+        Tuple[Optional[int], int, List[dict]]: the last id checked (None when there was
+            nothing after `after`), how many books were checked, and the mismatches found
+            (book_id, quantity, available_quantity, expected), fixed unless fix is False
+    """
+    rows = db.execute(_availability(after=after, limit=batch_size)).all()
+    if not rows:
+        db.rollback()
+        return None, 0, []
+    mismatches = [row for row in rows if row.available_quantity != row.expected]
+    if mismatches and fix:
+        drifted = [row.id for row in mismatches]
+        db.execute(select(Book.id).where(Book.id.in_(drifted)).order_by(Book.id).with_for_update())
+        mismatches = [row for row in db.execute(_availability(book_ids=drifted)) if row.available_quantity != row.expected]
+        if mismatches:
+            versioning.touch(db, catalog=True)
+            db.connection().execute(
+                update(Book.__table__).where(Book.__table__.c.id == bindparam("b_id")).values(available_quantity=bindparam("expected")),
+                [{"b_id": row.id, "expected": row.expected} for row in mismatches],
+            )
+            circulation.record_catalog(db, {row.id: (0, row.expected - (row.available_quantity or 0)) for row in mismatches})
+        db.commit()
+    else:
+        db.rollback()
+    report = [
+        {"book_id": row.id, "quantity": row.quantity, "available_quantity": row.available_quantity, "expected": row.expected}
+        for row in mismatches
+    ]
+    return rows[-1].id, len(rows), report
+
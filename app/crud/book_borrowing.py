@@ -1,18 +1,115 @@
 # app/crud/book_borrowing.py
-from sqlalchemy.orm import Session
+from collections import Counter
+from datetime import datetime
+from fastapi import status
+from sqlalchemy import Select, Subquery, bindparam, delete, func, insert, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Query, Session
 from typing import List, Optional
 
-from app.models.book_borrowing import BookBorrowing
-from app.schemas.book_borrowing import BookBorrowingCreate, BookBorrowingUpdate
+from app import versioning
+from app.crud import book as book_crud, circulation, user as user_crud
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing, BookBorrowingArchive
+from app.models.user import User
+from app.pagination import paginate
+from app.schemas.book_borrowing import BookBorrowingBatchItem, BookBorrowingCreate, BookBorrowingUpdate
+
+# Columns of schemas.book_borrowing.BookBorrowing, shared by book_borrowings and its archive
+LOAN_COLUMNS = ("id", "book_id", "user_id", "is_returned", "borrowed_at", "returned_at")
+
+class BorrowingError(Exception):
+    """Raised when a borrowing cannot be created; carries the HTTP status and detail to report."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
 
 def get_borrowing(db: Session, borrowing_id: int) -> Optional[BookBorrowing]:
     return db.query(BookBorrowing).filter(BookBorrowing.id == borrowing_id).first()
 
-def get_borrowings(db: Session, skip: int = 0, limit: int = 100) -> List[BookBorrowing]:
-    return db.query(BookBorrowing).offset(skip).limit(limit).all()
+def loan_history(user_id: Optional[int] = None, after: Optional[list] = None, limit: Optional[int] = None) -> Subquery:
+    """
+    Current and archived loans as one relation (UNION ALL of book_borrowings and its archive).
+
+    The user filter and, for a page, the keyset bound and row limit are applied inside both
+    branches, so each one reads at most `limit` rows off its id index however long the
+    archive grows. Order the result by id to merge the branches.
+    """
+    branches = []
+    for table in (BookBorrowing.__table__, BookBorrowingArchive.__table__):
+        branch = select(*(table.c[name] for name in LOAN_COLUMNS))
+        if user_id is not None:
+            branch = branch.where(table.c.user_id == user_id)
+        if limit is not None:
+            branch = select(paginate(branch, [table.c.id], after=after, limit=limit).subquery())
+        branches.append(branch)
+    return union_all(*branches).subquery("loan_history")
+
+def export_borrowings_query(user_id: Optional[int] = None, active: bool = False) -> Select:
+    """Column-only select of borrowing history (archived loans included) with book title and user email, in id order."""
+    loans = BookBorrowing.__table__ if active else loan_history(user_id=user_id)
+    query = (
+        select(
+            loans.c.id, loans.c.book_id, Book.title.label("book_title"), loans.c.user_id,
+            User.email.label("user_email"), loans.c.is_returned, loans.c.borrowed_at, loans.c.returned_at
+        )
+        .join(Book, Book.id == loans.c.book_id)
+        .join(User, User.id == loans.c.user_id)
+        .order_by(loans.c.id)
+    )
+    if active:
+        query = query.where(loans.c.is_returned == False)
+        if user_id is not None:
+            query = query.where(loans.c.user_id == user_id)
+    return query
+
+def get_borrowings(db: Session, skip: int = 0, limit: int = 100, after: Optional[list] = None) -> List[dict]:
+    """A page of every loan, archived ones included, as plain dicts in id order."""
+    if after is not None:
+        skip = 0  # a cursor replaces the offset, as in paginate
+    history = loan_history(after=after, limit=skip + limit)
+    query = paginate(select(history), [history.c.id], skip=skip, limit=limit)
+    return [dict(row) for row in db.execute(query).mappings()]
+
+def _detail_query(db: Session, loans) -> Query:
+    """Column-only query of `loans` (a table or loan_history) joined with the fields of BookBorrowingDetail."""
+    book_columns = [column.label(f"book_{column.key}") for column in book_crud.BOOK_COLUMNS]
+    user_columns = [column.label(f"user_{column.key}") for column in user_crud.USER_COLUMNS]
+    return (
+        db.query(*(loans.c[name] for name in LOAN_COLUMNS), *book_columns, *user_columns)
+        .outerjoin(Book, Book.id == loans.c.book_id)
+        .outerjoin(User, User.id == loans.c.user_id)
+    )
+
+def _detail_row(row) -> dict:
+    values = iter(row)
+    loan = {name: next(values) for name in LOAN_COLUMNS}
+    book = {column.key: next(values) for column in book_crud.BOOK_COLUMNS}
+    user = {column.key: next(values) for column in user_crud.USER_COLUMNS}
+    loan["book"] = book if book["id"] is not None else None
+    loan["user"] = user if user["id"] is not None else None
+    return loan
+
+def get_user_borrowing_rows(db: Session, user_id: int, skip: int = 0, limit: int = 100, after: Optional[list] = None) -> List[dict]:
+    """
+    A page of the user's active loans with their book and user embedded, as plain dicts ready to encode.
+
+    One column-only query joins in the book and user fields of schemas.book_borrowing.BookBorrowingDetail;
+    no ORM entities are built.
+    """
+    loans = BookBorrowing.__table__
+    query = _detail_query(db, loans).filter(loans.c.user_id == user_id, loans.c.is_returned == False)
+    return [_detail_row(row) for row in paginate(query, [loans.c.id], after=after, skip=skip, limit=limit)]
 
-def get_user_borrowings(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[BookBorrowing]:
-    return db.query(BookBorrowing).filter(BookBorrowing.user_id == user_id,BookBorrowing.is_returned == False).offset(skip).limit(limit).all()
+def get_user_history_rows(db: Session, user_id: int, skip: int = 0, limit: int = 100, after: Optional[list] = None) -> List[dict]:
+    """Every loan of the user, returned and archived ones included, in the shape of get_user_borrowing_rows."""
+    if after is not None:
+        skip = 0  # a cursor replaces the offset, as in paginate
+    history = loan_history(user_id=user_id, after=after, limit=skip + limit)
+    query = _detail_query(db, history)
+    return [_detail_row(row) for row in paginate(query, [history.c.id], skip=skip, limit=limit)]
 
 def get_book_borrowings(db: Session, book_id: int, skip: int = 0, limit: int = 100) -> List[BookBorrowing]:
     return db.query(BookBorrowing).filter(BookBorrowing.book_id == book_id).offset(skip).limit(limit).all()
@@ -20,8 +117,9 @@ def get_book_borrowings(db: Session, book_id: int, skip: int = 0, limit: int = 1
 def get_user_book_borrowings(db: Session, book_id: int, user_id: int,skip: int = 0, limit: int = 100) -> List[BookBorrowing]:
     return db.query(BookBorrowing).filter(BookBorrowing.book_id == book_id,BookBorrowing.user_id == user_id).offset(skip).limit(limit).all()
 
-def get_active_borrowings(db: Session, skip: int = 0, limit: int = 100) -> List[BookBorrowing]:
-    return db.query(BookBorrowing).filter(BookBorrowing.is_returned == False).offset(skip).limit(limit).all()
+def get_active_borrowings(db: Session, skip: int = 0, limit: int = 100, after: Optional[list] = None) -> List[BookBorrowing]:
+    query = db.query(BookBorrowing).filter(BookBorrowing.is_returned == False)
+    return paginate(query, [BookBorrowing.id], after=after, skip=skip, limit=limit).all()
 
 def create_borrowing(db: Session, borrowing: BookBorrowingCreate) -> BookBorrowing:
     db_borrowing = BookBorrowing(
@@ -56,16 +154,272 @@ def delete_borrowing(db: Session, borrowing_id: int) -> Optional[BookBorrowing]:
     db.commit()
     return db_borrowing
 
-def return_book(db: Session, borrowing_id: int) -> Optional[BookBorrowing]:
-    db_borrowing = get_borrowing(db, borrowing_id=borrowing_id)
-    if not db_borrowing:
-        return None
-    
-    if db_borrowing.is_returned:
-        return None
-    
+def return_book(db: Session, borrowing_id: int) -> BookBorrowing:
+    """
+    Mark a loan returned and put its copy back on the shelf in a single transaction.
+
+    The loan row is locked first, so a concurrent return of the same loan waits and then
+    finds it returned. The circulation rollups are updated in the same transaction.
+
+    Raises:
+        BorrowingError: 404 if the loan is not found,
+            400 if it was already returned (archived loans included)
+    """
+    db_borrowing = db.query(BookBorrowing).filter(BookBorrowing.id == borrowing_id).with_for_update().first()
+    if not db_borrowing or db_borrowing.is_returned:
+        archived = db_borrowing is None and db.get(BookBorrowingArchive, borrowing_id) is not None
+        db.rollback()
+        if db_borrowing is None and not archived:
+            raise BorrowingError(status.HTTP_404_NOT_FOUND, "Borrowing record not found")
+        raise BorrowingError(status.HTTP_400_BAD_REQUEST, "Book has already been returned")
+
     db_borrowing.is_returned = True
-    db.add(db_borrowing)
+    db_borrowing.returned_at = func.now()
+    db.flush()
+    _adjust_availability(db, Counter({db_borrowing.book_id: 1}))
+    circulation.record_returns(db, [(db_borrowing.book_id, db_borrowing.user_id)])
     db.commit()
     db.refresh(db_borrowing)
-    return db_borrowing
\ No newline at end of file
+    return db_borrowing
+
+def borrow_book(db: Session, borrowing: BookBorrowingCreate) -> BookBorrowing:
+    """
+    Create a borrowing record and take one copy of the book in a single transaction.
+
+    The caller is responsible for authorizing the acting user (routes do it from the
+    bearer token). The availability check and the decrement are one conditional UPDATE,
+    so concurrent borrows can never push available_quantity below zero. On the happy
+    path this costs the user lookup (none when the user is cached), the UPDATE and the
+    INSERT; a second active loan of the same book is rejected by the partial unique index
+    uq_book_borrowings_active_loan rather than by scanning the user's history. The
+    circulation rollups (app.crud.circulation) are updated in the same transaction.
+
+    Raises:
+        BorrowingError: 404 if the book or user is not found,
+            400 if no copy is available or the book is already borrowed and not yet returned
+    """
+    if borrowing.user_id not in user_crud.get_user_roles(db, [borrowing.user_id]):
+        raise BorrowingError(status.HTTP_404_NOT_FOUND, "User not found")
+
+    # Conditional decrement: also takes the row lock that serializes borrows of this book
+    taken = (
+        db.query(Book)
+        .filter(Book.id == borrowing.book_id, Book.available_quantity > 0)
+        .update({Book.available_quantity: Book.available_quantity - 1}, synchronize_session=False)
+    )
+    if not taken:
+        book_exists = db.query(Book.id).filter(Book.id == borrowing.book_id).first() is not None
+        db.rollback()
+        if not book_exists:
+            raise BorrowingError(status.HTTP_404_NOT_FOUND, "Book not found")
+        raise BorrowingError(status.HTTP_400_BAD_REQUEST, "Book is not available for borrowing (quantity is 0)")
+
+    # Always unreturned: the copy was just taken, and returns go through return_book
+    db_borrowing = BookBorrowing(
+        book_id=borrowing.book_id,
+        user_id=borrowing.user_id,
+        is_returned=False
+    )
+    db.add(db_borrowing)
+    try:
+        db.flush()
+    except IntegrityError:
+        # uq_book_borrowings_active_loan: the user already has this book; the decrement is undone too
+        db.rollback()
+        raise BorrowingError(status.HTTP_400_BAD_REQUEST, "Book is already borrowed and not yet returned")
+    circulation.record_borrows(db, [(borrowing.book_id, borrowing.user_id)])
+    db.commit()
+    return db_borrowing
+
+def _item_result(index: int, status_code: int, detail: Optional[str] = None) -> dict:
+    return {"index": index, "success": status_code == status.HTTP_200_OK, "status_code": status_code, "borrowing_id": None, "detail": detail}
+
+def _adjust_availability(db: Session, deltas: Counter) -> bool:
+    """
+    Apply per-book available_quantity deltas with one executemany UPDATE.
+
+    Decrements are guarded so availability can't go below zero. Returns False when a
+    guarded row was not updated (only detectable on drivers with sane multi-row counts).
+    """
+    books = Book.__table__
+    params = [{"b_id": book_id, "delta": delta} for book_id, delta in deltas.items() if delta]
+    if not params:
+        return True
+    versioning.touch(db, catalog=True)
+    result = db.execute(
+        update(books)
+        .where(books.c.id == bindparam("b_id"), books.c.available_quantity + bindparam("delta") >= 0)
+        .values(available_quantity=books.c.available_quantity + bindparam("delta")),
+        params
+    )
+    if db.get_bind().dialect.supports_sane_multi_rowcount:
+        return result.rowcount == len(params)
+    return True
+
+def borrow_books(db: Session, items: List[BookBorrowingBatchItem]) -> List[dict]:
+    """
+    Borrow a batch of books in one transaction and report the outcome of every item.
+
+    The caller is responsible for authorizing the acting user. Users, books and
+    existing active borrowings are each validated with a single IN (...) query, then
+    all quantity changes, inserts and circulation rollup increments are applied together.
+
+    Raises:
+        BorrowingError: 409 if availability or active loans changed underneath the batch
+            (nothing is applied)
+    """
+    user_ids = {item.user_id for item in items}
+    book_ids = {item.book_id for item in items}
+    roles = user_crud.get_user_roles(db, user_ids)
+
+    available = dict(
+        db.query(Book.id, Book.available_quantity).filter(Book.id.in_(book_ids)).with_for_update().all()
+    )
+    active = set(
+        db.query(BookBorrowing.user_id, BookBorrowing.book_id).filter(
+            BookBorrowing.is_returned == False,
+            BookBorrowing.book_id.in_(book_ids),
+            BookBorrowing.user_id.in_(user_ids)
+        ).all()
+    )
+
+    results = []
+    taken = Counter()
+    accepted = []
+    for index, item in enumerate(items):
+        key = (item.user_id, item.book_id)
+        if item.user_id not in roles:
+            results.append(_item_result(index, status.HTTP_404_NOT_FOUND, "User not found"))
+        elif item.book_id not in available:
+            results.append(_item_result(index, status.HTTP_404_NOT_FOUND, "Book not found"))
+        elif available[item.book_id] - taken[item.book_id] <= 0:
+            results.append(_item_result(index, status.HTTP_400_BAD_REQUEST, "Book is not available for borrowing (quantity is 0)"))
+        elif key in active:
+            results.append(_item_result(index, status.HTTP_400_BAD_REQUEST, "Book is already borrowed and not yet returned"))
+        else:
+            taken[item.book_id] += 1
+            active.add(key)
+            accepted.append(_item_result(index, status.HTTP_200_OK))
+            results.append(accepted[-1])
+
+    if not accepted:
+        db.rollback()
+        return results
+
+    if not _adjust_availability(db, Counter({book_id: -count for book_id, count in taken.items()})):
+        db.rollback()
+        raise BorrowingError(status.HTTP_409_CONFLICT, "Book availability changed during the batch, please retry")
+
+    try:
+        new_ids = db.scalars(
+            insert(BookBorrowing).returning(BookBorrowing.id, sort_by_parameter_order=True),
+            [{"book_id": items[r["index"]].book_id, "user_id": items[r["index"]].user_id, "is_returned": False} for r in accepted]
+        ).all()
+    except IntegrityError:
+        # A concurrent borrow created one of the loans after the active-loan check above
+        db.rollback()
+        raise BorrowingError(status.HTTP_409_CONFLICT, "A book in the batch was borrowed concurrently, please retry")
+    circulation.record_borrows(db, [(items[r["index"]].book_id, items[r["index"]].user_id) for r in accepted])
+    db.commit()
+    for result, borrowing_id in zip(accepted, new_ids):
+        result["borrowing_id"] = borrowing_id
+    return results
+
+def return_books(db: Session, borrowing_ids: List[int]) -> List[dict]:
+    """
+    Return a batch of borrowed books in one transaction and report the outcome of every item.
+
+    Availability and the circulation rollups are updated in the same transaction.
+
+    Raises:
+        BorrowingError: 409 if a loan was returned concurrently (nothing is applied)
+    """
+    loans = {}
+    borrowers = {}
+    for loan_id, book_id, user_id, is_returned in (
+        db.query(BookBorrowing.id, BookBorrowing.book_id, BookBorrowing.user_id, BookBorrowing.is_returned)
+        .filter(BookBorrowing.id.in_(set(borrowing_ids)))
+        .with_for_update()
+    ):
+        loans[loan_id] = (book_id, is_returned)
+        borrowers[loan_id] = user_id
+
+    missing = set(borrowing_ids) - loans.keys()
+    archived = set(
+        db.scalars(select(BookBorrowingArchive.id).where(BookBorrowingArchive.id.in_(missing)))
+    ) if missing else set()
+
+    results = []
+    returned = Counter()
+    accepted = []
+    for index, borrowing_id in enumerate(borrowing_ids):
+        if borrowing_id in archived:
+            results.append(_item_result(index, status.HTTP_400_BAD_REQUEST, "Book has already been returned"))
+            continue
+        if borrowing_id not in loans:
+            results.append(_item_result(index, status.HTTP_404_NOT_FOUND, "Borrowing record not found"))
+            continue
+        book_id, is_returned = loans[borrowing_id]
+        if is_returned:
+            results.append(_item_result(index, status.HTTP_400_BAD_REQUEST, "Book has already been returned"))
+            continue
+        loans[borrowing_id] = (book_id, True)
+        returned[book_id] += 1
+        accepted.append(borrowing_id)
+        results.append(_item_result(index, status.HTTP_200_OK))
+        results[-1]["borrowing_id"] = borrowing_id
+
+    if not accepted:
+        db.rollback()
+        return results
+
+    # A Core UPDATE, so only the borrowers' list versions move (see app.versioning)
+    loans_table = BookBorrowing.__table__
+    marked = db.connection().execute(
+        update(loans_table)
+        .where(loans_table.c.id.in_(accepted), loans_table.c.is_returned == False)
+        .values(is_returned=True, returned_at=func.now())
+    ).rowcount
+    versioning.touch(db, user_ids=[borrowers[loan_id] for loan_id in accepted])
+    if marked != len(accepted):
+        db.rollback()
+        raise BorrowingError(status.HTTP_409_CONFLICT, "A borrowing record changed during the batch, please retry")
+    _adjust_availability(db, returned)
+    circulation.record_returns(db, [(loans[loan_id][0], borrowers[loan_id]) for loan_id in accepted])
+    db.commit()
+    return results
+
+def archive_returned_loans(db: Session, returned_before: datetime, batch_size: int = 1000) -> int:
+    """
+    Move one batch of loans returned before `returned_before` to book_borrowings_archive and commit.
+
+    The batch is picked off ix_book_borrowings_returned_at, copied and deleted in a single
+    short transaction. Rows another archiver has locked are skipped (PostgreSQL), so concurrent
+    runs don't conflict. Loan ids are never reused (sqlite_autoincrement on SQLite), so a copy
+    colliding with an archived id is an error that rolls the batch back, never a skipped row
+    whose loan would then be deleted. History reads union both tables, so no list version moves.
+
+    Returns:
+        int: number of loans moved; fewer than batch_size once nothing older is left
+    """
+    loans = BookBorrowing.__table__
+    archive = BookBorrowingArchive.__table__
+    batch = db.scalars(
+        select(loans.c.id)
+        .where(loans.c.returned_at < returned_before)  # only returned loans have a returned_at
+        .order_by(loans.c.returned_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not batch:
+        db.rollback()
+        return 0
+    connection = db.connection()
+    connection.execute(
+        insert(archive).from_select(
+            list(LOAN_COLUMNS), select(*(loans.c[name] for name in LOAN_COLUMNS)).where(loans.c.id.in_(batch))
+        )
+    )
+    moved = connection.execute(delete(loans).where(loans.c.id.in_(batch))).rowcount
+    db.commit()
+    return moved
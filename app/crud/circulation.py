@@ -0,0 +1,332 @@
+# app/crud/circulation.py
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Date, Table, case, cast, delete, event, false, func, inspect, insert, literal, select, text, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.config import CIRCULATION_SHARDS, STATS_REBUILD_CHUNK_DAYS, STATS_REBUILD_CHUNK_SIZE
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing, BookBorrowingArchive
+from app.models.circulation import BookCirculation, CirculationTotals, DailyCirculation, UserCirculation
+from app.models.user import User
+
+# Rollup tables of loan counts, keyed by book and by user
+LOAN_ROLLUPS = {"book_id": BookCirculation.__table__, "user_id": UserCirculation.__table__}
+
+def shard(book_id: int) -> int:
+    return book_id % CIRCULATION_SHARDS
+
+def today() -> date:
+    return datetime.now(timezone.utc).date()
+
+def _add(db: Session, table: Table, keys: Sequence[str], counters: Sequence[str], deltas: Dict[tuple, Sequence[int]]) -> None:
+    """
+    Add `deltas` (key values -> counter increments) to rows of a rollup table, creating missing rows.
+
+    One executemany upsert per table, in key order, so concurrent transactions lock the rows
+    they share in the same order and can't deadlock each other.
+    """
+    params = [
+        {**dict(zip(keys, key)), **dict(zip(counters, values))}
+        for key, values in sorted(deltas.items()) if any(values)
+    ]
+    if not params:
+        return
+    connection = db.connection()
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        statement = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys), set_={name: table.c[name] + statement.excluded[name] for name in counters}
+        )
+        connection.execute(statement, params)
+        return
+    for row in params:
+        changed = connection.execute(
+            update(table)
+            .where(*(table.c[key] == row[key] for key in keys))
+            .values({name: table.c[name] + row[name] for name in counters})
+        ).rowcount
+        if not changed:
+            connection.execute(insert(table).values(row))
+
+def _record(db: Session, loans: Iterable[Tuple[int, int]], returned: bool) -> None:
+    books, users = defaultdict(lambda: [0, 0]), defaultdict(lambda: [0, 0])
+    days, totals = defaultdict(lambda: [0, 0]), defaultdict(lambda: [0, 0])
+    day = today()
+    for book_id, user_id in loans:
+        for counts in (books[(book_id,)], users[(user_id,)]):
+            counts[0] += 0 if returned else 1
+            counts[1] += -1 if returned else 1
+        days[(day, shard(book_id))][1 if returned else 0] += 1
+        totals[(shard(book_id),)][1] += 1 if returned else -1
+    # Same table order in every transaction (see _add)
+    _add(db, BookCirculation.__table__, ["book_id"], ["loans", "active_loans"], books)
+    _add(db, UserCirculation.__table__, ["user_id"], ["loans", "active_loans"], users)
+    _add(db, DailyCirculation.__table__, ["day", "shard"], ["borrows", "returns"], days)
+    _add(db, CirculationTotals.__table__, ["shard"], ["copies", "available"], totals)
+
+def record_borrows(db: Session, loans: Iterable[Tuple[int, int]]) -> None:
+    """
+    Count new loans, given as (book_id, user_id), in the rollups, in the session's transaction.
+
+    Each loan took a copy of its book.
+    """
+    _record(db, loans, returned=False)
+
+def record_returns(db: Session, loans: Iterable[Tuple[int, int]]) -> None:
+    """Count returned loans, given as (book_id, user_id), in the rollups, in the session's transaction."""
+    _record(db, loans, returned=True)
+
+def record_catalog(db: Session, deltas: Dict[int, Tuple[int, int]]) -> None:
+    """Add per-book (quantity, available_quantity) changes of the catalog to the totals."""
+    totals = defaultdict(lambda: [0, 0])
+    for book_id, (copies, available) in deltas.items():
+        totals[(shard(book_id),)][0] += copies
+        totals[(shard(book_id),)][1] += available
+    _add(db, CirculationTotals.__table__, ["shard"], ["copies", "available"], totals)
+
+def _loaded(obj, name: str) -> int:
+    value = inspect(obj).attrs[name].loaded_value
+    return value if isinstance(value, int) else 0
+
+def _change(obj, name: str) -> int:
+    history = inspect(obj).attrs[name].history
+    if not (history.added and history.deleted):
+        return 0  # unchanged, or set without its old value loaded: left to rebuild_stats.py
+    return (history.added[0] or 0) - (history.deleted[0] or 0)
+
+@event.listens_for(Session, "after_flush")
+def _track_catalog(session: Session, flush_context) -> None:
+    # Books written through the ORM; crud code changing quantities with Core statements
+    # calls record_catalog or record_borrows/record_returns itself
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Book):
+            deltas[obj.id] = (obj.quantity or 0, obj.available_quantity or 0)
+    for obj in session.dirty:
+        if isinstance(obj, Book):
+            deltas[obj.id] = (_change(obj, "quantity"), _change(obj, "available_quantity"))
+    for obj in session.deleted:
+        if isinstance(obj, Book):
+            deltas[obj.id] = (-_loaded(obj, "quantity"), -_loaded(obj, "available_quantity"))
+    if deltas:
+        record_catalog(session, deltas)
+
+def most_borrowed_books(db: Session, limit: int = 10) -> List[dict]:
+    """The `limit` books with the most loans, off ix_book_circulation_loans."""
+    query = (
+        select(BookCirculation.book_id, Book.title, Book.author, BookCirculation.loans, BookCirculation.active_loans)
+        .outerjoin(Book, Book.id == BookCirculation.book_id)
+        .order_by(BookCirculation.loans.desc(), BookCirculation.book_id.desc())
+        .limit(limit)
+    )
+    return [dict(row) for row in db.execute(query).mappings()]
+
+def top_borrowers(db: Session, limit: int = 10) -> List[dict]:
+    """The `limit` users with the most loans, off ix_user_circulation_loans."""
+    query = (
+        select(UserCirculation.user_id, User.email, UserCirculation.loans, UserCirculation.active_loans)
+        .outerjoin(User, User.id == UserCirculation.user_id)
+        .order_by(UserCirculation.loans.desc(), UserCirculation.user_id.desc())
+        .limit(limit)
+    )
+    return [dict(row) for row in db.execute(query).mappings()]
+
+def user_circulation(db: Session, user_id: int) -> dict:
+    row = db.get(UserCirculation, user_id)
+    return {
+        "user_id": user_id,
+        "loans": row.loans if row is not None else 0,
+        "active_loans": row.active_loans if row is not None else 0,
+    }
+
+def utilization(db: Session) -> dict:
+    """Share of the catalog's copies out on loan, from the CIRCULATION_SHARDS totals rows."""
+    copies, available = db.execute(
+        select(func.coalesce(func.sum(CirculationTotals.copies), 0), func.coalesce(func.sum(CirculationTotals.available), 0))
+    ).one()
+    return {
+        "copies": copies,
+        "available": available,
+        "on_loan": copies - available,
+        "utilization": 1 - available / copies if copies else 0.0,
+    }
+
+def daily_circulation(db: Session, days: int = 30) -> List[dict]:
+    """Borrows and returns of each of the last `days` UTC days, oldest first, days without loans included."""
+    last = today()
+    first = last - timedelta(days=days - 1)
+    counts = dict(
+        (day, (borrows, returns)) for day, borrows, returns in db.execute(
+            select(DailyCirculation.day, func.sum(DailyCirculation.borrows), func.sum(DailyCirculation.returns))
+            .where(DailyCirculation.day.between(first, last))
+            .group_by(DailyCirculation.day)
+        )
+    )
+    rows = []
+    for offset in range(days):
+        day = first + timedelta(days=offset)
+        borrows, returns = counts.get(day, (0, 0))
+        rows.append({"day": day, "borrows": borrows, "returns": returns})
+    return rows
+
+# Rebuilding. Each chunk is recomputed in its own transaction, which first locks the rollup
+# table against writes: a borrow or return that committed before the lock is in the fresh
+# counts, one still in flight adds its increments after the chunk was rewritten.
+
+def _lock(db: Session, table: Table) -> None:
+    """Block rollup writes until the transaction ends; on SQLite, the DELETE that follows takes the database write lock."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text(f"LOCK TABLE {table.name} IN SHARE ROW EXCLUSIVE MODE"))
+
+def _bounds(db: Session, columns: Iterable) -> Tuple[Optional[object], Optional[object]]:
+    """Smallest and largest value over several (indexed) columns, or (None, None) if all are empty."""
+    values = []
+    for column in columns:
+        values.extend(value for value in db.execute(select(func.min(column), func.max(column))).one() if value is not None)
+    return (min(values), max(values)) if values else (None, None)
+
+def loan_key_range(db: Session, key: str) -> Tuple[Optional[int], Optional[int]]:
+    """Range of book or user ids (`key`) over the loan history and its rollup table."""
+    tables = (BookBorrowing.__table__, BookBorrowingArchive.__table__, LOAN_ROLLUPS[key])
+    return _bounds(db, [table.c[key] for table in tables])
+
+def rebuild_loan_counts(db: Session, key: str, first: int, last: int) -> int:
+    """
+    Recompute the book_circulation (key "book_id") or user_circulation ("user_id") rows of ids
+    first..last from the loan history and commit.
+
+    Returns:
+        int: number of rollup rows written
+    """
+    rollup = LOAN_ROLLUPS[key]
+    _lock(db, rollup)
+    db.execute(delete(rollup).where(rollup.c[key].between(first, last)))
+    loans = union_all(*(
+        select(table.c[key], table.c.is_returned).where(table.c[key].between(first, last))
+        for table in (BookBorrowing.__table__, BookBorrowingArchive.__table__)
+    )).subquery()
+    written = db.execute(
+        insert(rollup).from_select(
+            [key, "loans", "active_loans"],
+            select(loans.c[key], func.count(), func.sum(case((loans.c.is_returned == false(), 1), else_=0)))
+            .group_by(loans.c[key])
+        )
+    ).rowcount
+    db.commit()
+    return written
+
+def _utc_day(db: Session, column):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return cast(func.timezone("UTC", column), Date)
+    if dialect == "sqlite":
+        return func.date(column)  # stored as UTC text
+    return cast(column, Date)
+
+def day_range(db: Session) -> Tuple[Optional[date], Optional[date]]:
+    """Range of UTC days with a borrow or return in the loan history or a row in daily_circulation."""
+    columns = [table.c[name] for table in (BookBorrowing.__table__, BookBorrowingArchive.__table__)
+               for name in ("borrowed_at", "returned_at")]
+    first, last = _bounds(db, columns)
+    days = [value.date() if isinstance(value, datetime) else value for value in (first, last) if value is not None]
+    days.extend(value for value in db.execute(select(func.min(DailyCirculation.day), func.max(DailyCirculation.day))).one()
+                if value is not None)
+    return (min(days), max(days)) if days else (None, None)
+
+def rebuild_daily(db: Session, first: date, last: date) -> int:
+    """
+    Recompute the daily_circulation rows of UTC days first..last from the loan history and commit.
+
+    Loans migrated without a borrowed_at only count on the day they were returned.
+
+    Returns:
+        int: number of rollup rows written
+    """
+    rollup = DailyCirculation.__table__
+    _lock(db, rollup)
+    db.execute(delete(rollup).where(rollup.c.day.between(first, last)))
+    start = datetime.combine(first, time(), timezone.utc)
+    end = datetime.combine(last + timedelta(days=1), time(), timezone.utc)
+    events = []
+    for table in (BookBorrowing.__table__, BookBorrowingArchive.__table__):
+        for column, borrows in ((table.c.borrowed_at, 1), (table.c.returned_at, 0)):
+            events.append(
+                select(
+                    _utc_day(db, column).label("day"),
+                    (func.coalesce(table.c.book_id, 0) % CIRCULATION_SHARDS).label("shard"),
+                    literal(borrows).label("borrows"),
+                    literal(1 - borrows).label("returns"),
+                ).where(column >= start, column < end)
+            )
+    events = union_all(*events).subquery()
+    written = db.execute(
+        insert(rollup).from_select(
+            ["day", "shard", "borrows", "returns"],
+            select(events.c.day, events.c.shard, func.sum(events.c.borrows), func.sum(events.c.returns))
+            .group_by(events.c.day, events.c.shard)
+        )
+    ).rowcount
+    db.commit()
+    return written
+
+def rebuild_totals(db: Session) -> int:
+    """Recompute circulation_totals from the catalog, one pass over books, and commit."""
+    rollup = CirculationTotals.__table__
+    books = Book.__table__
+    _lock(db, rollup)
+    db.execute(delete(rollup))
+    written = db.execute(
+        insert(rollup).from_select(
+            ["shard", "copies", "available"],
+            select(
+                books.c.id % CIRCULATION_SHARDS,
+                func.coalesce(func.sum(books.c.quantity), 0),
+                func.coalesce(func.sum(books.c.available_quantity), 0),
+            ).group_by(books.c.id % CIRCULATION_SHARDS)
+        )
+    ).rowcount
+    db.commit()
+    return written
+
+def rebuild(db: Session, chunk_size: int = STATS_REBUILD_CHUNK_SIZE, chunk_days: int = STATS_REBUILD_CHUNK_DAYS,
+            progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+    """
+    Recompute every circulation rollup from the loan history and the catalog, chunk by chunk.
+
+    Each chunk (`chunk_size` book or user ids, `chunk_days` days) is its own short transaction,
+    so borrows and returns only ever wait for one chunk. progress(table, rows) is called after
+    each chunk with the rows written to that table so far.
+
+    Returns:
+        Dict[str, int]: rollup rows written per table
+    """
+    written = {}
+
+    def chunk(table: str, rows: int) -> None:
+        written[table] = written.get(table, 0) + rows
+        if progress is not None:
+            progress(table, written[table])
+
+    for key, rollup in LOAN_ROLLUPS.items():
+        first, last = loan_key_range(db, key)
+        db.rollback()
+        chunk(rollup.name, 0)
+        if first is not None:
+            for start in range(first, last + 1, chunk_size):
+                chunk(rollup.name, rebuild_loan_counts(db, key, start, min(start + chunk_size - 1, last)))
+
+    first, last = day_range(db)
+    db.rollback()
+    chunk(DailyCirculation.__tablename__, 0)
+    while first is not None and first <= last:
+        end = min(first + timedelta(days=chunk_days - 1), last)
+        chunk(DailyCirculation.__tablename__, rebuild_daily(db, first, end))
+        first = end + timedelta(days=1)
+
+    chunk(CirculationTotals.__tablename__, rebuild_totals(db))
+    return written
@@ -1,17 +1,83 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.orm import Query, Session, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from typing import Dict, Iterable, List, Optional
 
+from app.cache import LRUTTLCache
+from app.config import USER_CACHE_SIZE, USER_CACHE_TTL
 from app.models.user import User, UserRole
+from app.pagination import paginate
 from app.schemas.user import UserCreate, UserUpdate
+from app.security import token_versions
+
+# Keyset sort orders: each ends with the unique id so the order is total
+USER_SORT_KEYS = {"id": ("id",), "email": ("email", "id")}
+
+# The fields of schemas.user.User (never the password), selected as plain columns for serialized responses
+USER_COLUMNS = (User.id, User.email, User.first_name, User.last_name, User.role, User.is_active)
+
+# Column values of recently read users, keyed by ("id", id) and ("email", email)
+user_cache = LRUTTLCache("users", maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def _remember(user: User, generation: int) -> None:
+    values = {attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs}
+    user_cache.set(("id", user.id), values, generation=generation)
+    user_cache.set(("email", user.email), values, generation=generation)
+
+def _from_cache(db: Session, values: dict) -> User:
+    """Attach a cached user to the session without emitting SQL."""
+    existing = db.identity_map.get(identity_key(User, values["id"]))
+    if existing is not None:
+        return existing
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+def _cached_user(db: Session, key: tuple, query: Query) -> Optional[User]:
+    values = user_cache.get(key)
+    if values is not None:
+        return _from_cache(db, values)
+    generation = user_cache.generation
+    user = query.first()
+    if user is not None:
+        _remember(user, generation)
+    return user
+
+def invalidate_user(user_id: int, *emails: str) -> None:
+    user_cache.invalidate(("id", user_id))
+    for email in emails:
+        user_cache.invalidate(("email", email))
 
 def get_user(db: Session, user_id: int) -> Optional[User]:
-    return db.query(User).filter(User.id == user_id).first()
+    return _cached_user(db, ("id", user_id), db.query(User).filter(User.id == user_id))
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
-    return db.query(User).filter(User.email == email).first()
+    return _cached_user(db, ("email", email), db.query(User).filter(User.email == email))
+
+def get_user_roles(db: Session, user_ids: Iterable[int]) -> Dict[int, str]:
+    """Roles of the given users (missing ids are left out), querying only the uncached ones."""
+    roles, missing = {}, []
+    for user_id in set(user_ids):
+        values = user_cache.get(("id", user_id))
+        if values is None:
+            missing.append(user_id)
+        else:
+            roles[user_id] = values["role"]
+    if missing:
+        generation = user_cache.generation
+        for user in db.query(User).filter(User.id.in_(missing)):
+            _remember(user, generation)
+            roles[user.id] = user.role
+    return roles
 
-def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
-    return db.query(User).offset(skip).limit(limit).all()
+def get_users(db: Session, skip: int = 0, limit: int = 100, after: Optional[list] = None, sort: str = "id") -> List[User]:
+    columns = [getattr(User, key) for key in USER_SORT_KEYS[sort]]
+    return paginate(db.query(User), columns, after=after, skip=skip, limit=limit).all()
+
+def get_user_rows(db: Session, skip: int = 0, limit: int = 100, after: Optional[list] = None, sort: str = "id") -> List[dict]:
+    """Like get_users, but selects only USER_COLUMNS and returns plain dicts ready to encode."""
+    columns = [getattr(User, key) for key in USER_SORT_KEYS[sort]]
+    query = paginate(db.query(*USER_COLUMNS), columns, after=after, skip=skip, limit=limit)
+    return [row._asdict() for row in query]
 
 def get_customers(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
     return db.query(User).filter(User.role == UserRole.CUSTOMER).offset(skip).limit(limit).all()
@@ -30,18 +96,30 @@ def create_user(db: Session, user: UserCreate) -> User:
     return db_user
 
 def update_user(db: Session, user_id: int, user: UserUpdate) -> Optional[User]:
-    db_user = get_user(db, user_id)
+    # Read the row itself rather than the cache: the update must start from current values
+    db_user = db.query(User).filter(User.id == user_id).first()
     if not db_user:
         return None
+    old_email, old_role = db_user.email, db_user.role
     
     for key, value in user.dict(exclude_unset=True).items():
         setattr(db_user, key, value)
+    role_changed = db_user.role != old_role
+    if role_changed:
+        db_user.token_version = User.token_version + 1
     
     db.add(db_user)
     db.commit()
+    invalidate_user(user_id, old_email, db_user.email)
     db.refresh(db_user)
+    if role_changed:
+        token_versions.bump(user_id, db_user.token_version)
     return db_user
 
+def load_token_versions(db: Session) -> None:
+    """Seed the in-memory token version registry with every user whose tokens were ever revoked."""
+    token_versions.load(db.query(User.id, User.token_version).filter(User.token_version > 0))
+
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     user = get_user_by_email(db, email)
     if not user:
@@ -1,22 +1,115 @@
+import os
+from typing import Union
+
+from fastapi import Request
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+from starlette.concurrency import run_in_threadpool
+
+from app.config import (
+    DATABASE_ASYNC, DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE,
+    DB_POOL_TIMEOUT, DB_STATEMENT_TIMEOUT_MS
+)
+from app.db_pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument
+from app.security import bearer_subject
+from app.slow_queries import watch
+
+# Async drivers used for each backend when DATABASE_ASYNC is enabled
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
 
-from app.config import DATABASE_URL
+def to_async_url(url: str) -> URL:
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
 
-engine = create_engine(DATABASE_URL)
+def engine_options(url: URL, pool_name: str, asyncio: bool = False) -> dict:
+    """create_engine/create_async_engine keyword arguments from the pool settings in app.config."""
+    backend = url.get_backend_name()
+    connect_args = {}
+    if backend == "sqlite":
+        # SQLite connections are shared with the threadpool that runs sync routes
+        connect_args["check_same_thread"] = False
+    if backend == "postgresql" and DB_STATEMENT_TIMEOUT_MS:
+        if asyncio:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    options = {"connect_args": connect_args}
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite lives in a single shared connection; keep SQLAlchemy's default pool
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if asyncio else InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_logging_name=pool_name,
+    )
+    return options
+
+engine = create_engine(DATABASE_URL, **engine_options(make_url(DATABASE_URL), "primary"))
+instrument(engine, "primary")
+watch(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Objects outlive the greenlet that loaded them, so they must not expire on commit
+async_engine = None
+if DATABASE_ASYNC:
+    async_engine = create_async_engine(to_async_url(DATABASE_URL), **engine_options(to_async_url(DATABASE_URL), "primary_async", asyncio=True))
+    instrument(async_engine.sync_engine, "primary_async")
+    # Logged statements use the async driver's paramstyle ($1 on asyncpg), so they are explained
+    # through the same driver, on connections opened by the EXPLAIN thread
+    watch(async_engine.sync_engine, explain_engine=create_async_engine(to_async_url(DATABASE_URL), poolclass=NullPool))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if DATABASE_ASYNC else None
+
+def _dispose_pools_in_child() -> None:
+    # A forked child (e.g. gunicorn --preload) must not share its parent's pooled connections:
+    # drop the inherited pools without closing the parent's sockets; children connect lazily
+    engine.dispose(close=False)
+    if async_engine is not None:
+        async_engine.sync_engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_dispose_pools_in_child)
+
 Base = declarative_base()
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
+DBSession = Union[Session, AsyncSession]
+
+def get_sync_db(request: Request):
+    db = SessionLocal(info={"client": bearer_subject(request.headers.get("authorization"))})
     try:
         yield db
     finally:
         db.close()
 
+async def get_async_db(request: Request):
+    async with AsyncSessionLocal(info={"client": bearer_subject(request.headers.get("authorization"))}) as db:
+        yield db
+
+# Dependency to get DB session: an AsyncSession when DATABASE_ASYNC is set, otherwise a Session.
+# The session remembers the authenticated user ("client"), so its commits count as that user's
+# writes (app.versioning) and pin the user's next reads to the primary (app.replicas)
+get_db = get_async_db if DATABASE_ASYNC else get_sync_db
+
+async def run_db(db: DBSession, fn, *args, **kwargs):
+    """
+    Await a sync crud function against either kind of session.
+
+    With an AsyncSession the function runs through AsyncSession.run_sync, so its queries go
+    over the async driver on the event loop; with a plain Session it runs on the threadpool.
+    Routes make a single run_db call per request, so a sync Session never holds a pooled
+    connection while it waits for another threadpool slot.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
 # Function to create all tables
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
@@ -0,0 +1,105 @@
+# app/db_pool.py
+import time
+from typing import Dict, Tuple
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.instrumentation import record_pool_wait
+from app.metrics import Counter, Gauge, Histogram
+
+POOL_WAIT_SECONDS = Histogram("db_pool_wait_seconds", "Time spent waiting to check a connection out of the pool", ["pool"])
+POOL_HOLD_SECONDS = Histogram("db_pool_hold_seconds", "Time a connection stayed checked out", ["pool"])
+POOL_WAITING = Gauge("db_pool_waiting", "Checkouts currently waiting for a connection", ["pool"])
+POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool", ["pool"])
+POOL_CHECKOUT_FAILURES = Counter("db_pool_checkout_failures_total", "Checkouts that timed out or failed to connect", ["pool"])
+POOL_CONNECTIONS_OPENED = Counter("db_pool_connections_opened_total", "New DBAPI connections opened", ["pool"])
+POOL_INVALIDATIONS = Counter("db_pool_invalidations_total", "Connections invalidated (e.g. failed pre-ping)", ["pool"])
+
+# Instrumented engines by pool name; engine.pool is read live because dispose() recreates it
+ENGINES: Dict[str, Engine] = {}
+
+# Moving average of checkout waits by pool name, each new wait weighing RECENT_WAIT_WEIGHT
+RECENT_WAIT_WEIGHT = 0.2
+_recent_waits: Dict[str, float] = {}
+
+class InstrumentedPoolMixin:
+    """Times every checkout, including the wait for a free slot in the queue."""
+
+    def _do_get(self):
+        name = self.logging_name or "default"
+        POOL_WAITING.inc(pool=name)
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except (exc.TimeoutError, exc.DBAPIError):
+            POOL_CHECKOUT_FAILURES.inc(pool=name)
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            POOL_WAITING.dec(pool=name)
+            POOL_WAIT_SECONDS.observe(waited, pool=name)
+            recent = _recent_waits.get(name, 0.0)
+            _recent_waits[name] = recent + (waited - recent) * RECENT_WAIT_WEIGHT
+            record_pool_wait(waited)
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def instrument(engine: Engine, name: str) -> None:
+    """Feed the pool metrics of `engine` from SQLAlchemy pool events under the given name."""
+    ENGINES[name] = engine
+
+    def on_connect(dbapi_connection, connection_record):
+        POOL_CONNECTIONS_OPENED.inc(pool=name)
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.inc(pool=name)
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            POOL_HOLD_SECONDS.observe(time.perf_counter() - checked_out_at, pool=name)
+
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        POOL_INVALIDATIONS.inc(pool=name)
+
+    event.listen(engine, "connect", on_connect)
+    event.listen(engine, "checkout", on_checkout)
+    event.listen(engine, "checkin", on_checkin)
+    event.listen(engine, "invalidate", on_invalidate)
+
+def pool_stats() -> Dict[str, dict]:
+    """Live occupancy and cumulative counters for every instrumented engine's pool."""
+    stats = {}
+    for name, engine in ENGINES.items():
+        pool = engine.pool
+        stats[name] = {"status": pool.status()}
+        if isinstance(pool, QueuePool):
+            stats[name].update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+                timeout=pool.timeout(),
+            )
+        stats[name].update(
+            waiting=POOL_WAITING.value(pool=name),
+            recent_wait_seconds=_recent_waits.get(name, 0.0),
+            checkouts=POOL_CHECKOUTS.value(pool=name),
+            checkout_failures=POOL_CHECKOUT_FAILURES.value(pool=name),
+            connections_opened=POOL_CONNECTIONS_OPENED.value(pool=name),
+            invalidations=POOL_INVALIDATIONS.value(pool=name),
+            wait_seconds=POOL_WAIT_SECONDS.snapshot(pool=name),
+            hold_seconds=POOL_HOLD_SECONDS.snapshot(pool=name),
+        )
+    return stats
+
+def pool_pressure() -> Dict[str, Tuple[float, float]]:
+    """Checkouts waiting for a connection now and the recent average checkout wait (seconds), by pool."""
+    return {name: (POOL_WAITING.value(pool=name), _recent_waits.get(name, 0.0)) for name in ENGINES}
@@ -0,0 +1,105 @@
+# app/export.py
+import csv
+import io
+import json
+import zlib
+from datetime import date
+from typing import AsyncIterator, Iterator, Sequence, Union
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import EXPORT_BATCH_SIZE
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def _json_default(value):
+    # Loan timestamps, in the ISO 8601 form the JSON API uses
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class ExportEncoder:
+    """Serialize batches of result rows to NDJSON or CSV, gzip-compressing on the fly if asked."""
+
+    def __init__(self, columns: Sequence[str], format: str, compress: bool = False):
+        self.columns = list(columns)
+        self.format = format
+        # wbits=31 writes a gzip header and trailer rather than a bare zlib stream
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def _out(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) if self._compressor else data
+
+    def header(self) -> bytes:
+        if self.format != "csv":
+            return b""
+        return self._out((",".join(self.columns) + "\r\n").encode())
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        if self.format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            text = buffer.getvalue()
+        else:
+            columns = self.columns
+            text = "".join(json.dumps(dict(zip(columns, row)), separators=(",", ":"), default=_json_default) + "\n" for row in rows)
+        return self._out(text.encode())
+
+    def finish(self) -> bytes:
+        return self._compressor.flush() if self._compressor else b""
+
+def iter_export(db: Session, statement: Select, encoder: ExportEncoder, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Stream a column select from a sync session, `batch_size` rows per server-side cursor fetch."""
+    result = db.execute(statement.execution_options(yield_per=batch_size))
+    header = encoder.header()
+    if header:
+        yield header
+    for rows in result.partitions():
+        data = encoder.encode(rows)
+        if data:
+            yield data
+    data = encoder.finish()
+    if data:
+        yield data
+
+async def aiter_export(db: AsyncSession, statement: Select, encoder: ExportEncoder, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Stream a column select from an AsyncSession, `batch_size` rows per server-side cursor fetch."""
+    result = await db.stream(statement.execution_options(yield_per=batch_size))
+    header = encoder.header()
+    if header:
+        yield header
+    async for rows in result.partitions():
+        data = encoder.encode(rows)
+        if data:
+            yield data
+    data = encoder.finish()
+    if data:
+        yield data
+
+def export_response(db: Union[Session, AsyncSession], statement: Select, name: str, format: str, compress: bool) -> StreamingResponse:
+    """
+    Build the streaming response of an export route.
+
+    Rows are encoded batch by batch as the client reads them, so memory use does not grow
+    with the table. A sync session is iterated on the threadpool by StreamingResponse.
+    """
+    encoder = ExportEncoder(statement.selected_columns.keys(), format, compress)
+    if isinstance(db, AsyncSession):
+        body = aiter_export(db, statement, encoder)
+    else:
+        body = iter_export(db, statement, encoder)
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{format}"', "Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format], headers=headers)
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip (and does not refuse it with q=0)."""
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        if coding.strip() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
@@ -0,0 +1,397 @@
+# app/idempotency.py
+import asyncio
+import hashlib
+import json
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.cache import LRUTTLCache
+from app.config import (
+    IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_LOCK_SECONDS, IDEMPOTENCY_MAX_BODY_BYTES, IDEMPOTENCY_TTL_SECONDS,
+    IDEMPOTENCY_WAIT_SECONDS
+)
+from app.database import SessionLocal
+from app.metrics import Counter
+from app.models.idempotency import IdempotencyKey
+from app.security import bearer_subject
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENT_REQUESTS = Counter("idempotent_requests_total", "Write requests carrying an Idempotency-Key, by outcome", ["outcome"])
+
+# Responses not kept: the request may succeed when retried with the same key
+# (server errors, concurrency conflicts, load shedding)
+_RETRYABLE = (409, 429)
+# Rebuilt on replay
+_DROPPED_HEADERS = (b"content-length", b"server-timing", b"date")
+
+CLAIMED, DONE, BUSY = "claimed", "done", "busy"
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status_code: int
+    headers: Tuple[Tuple[str, str], ...]
+    body: bytes
+
+    def messages(self) -> Tuple[Message, Message]:
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in self.headers]
+        headers += [(b"content-length", str(len(self.body)).encode()), (REPLAYED_HEADER.lower().encode(), b"true")]
+        return (
+            {"type": "http.response.start", "status": self.status_code, "headers": headers},
+            {"type": "http.response.body", "body": self.body},
+        )
+
+class IdempotencyStore:
+    """
+    Responses of write requests by idempotency key: the idempotency_keys table, fronted by
+    an in-memory LRU+TTL cache of the responses this worker stored or replayed.
+
+    A key is claimed by inserting its row before the request executes, so exactly one worker
+    executes it; others see it as busy until the response is stored (complete) or the claim
+    is given up (release). The claiming worker renews its claim while the request executes
+    (renew); a claim not renewed for `lock_seconds` was abandoned by a worker that died
+    mid-request and may be taken over. Rows expire after `ttl` seconds.
+    """
+
+    def __init__(
+        self, session_factory: Callable[[], Session] = SessionLocal, ttl: float = IDEMPOTENCY_TTL_SECONDS,
+        lock_seconds: float = IDEMPOTENCY_LOCK_SECONDS, cache_size: int = IDEMPOTENCY_CACHE_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+        self.cache = LRUTTLCache("idempotency", cache_size, ttl)
+        self._purged = 0.0
+        self._held: Dict[str, float] = {}  # key -> created_at of each claim this worker holds
+
+    @staticmethod
+    def key(client: Optional[int], idempotency_key: str) -> str:
+        """Storage key: keys are scoped to the authenticated user (or to anonymous clients)."""
+        return hashlib.sha256(f"{client}:{idempotency_key}".encode()).hexdigest()
+
+    def _stored(self, row) -> StoredResponse:
+        headers = tuple((name, value) for name, value in json.loads(row.headers or "[]"))
+        return StoredResponse(row.fingerprint, row.status_code, headers, row.body or b"")
+
+    def claim(self, key: str, fingerprint: str) -> Tuple[str, Optional[str], Optional[StoredResponse]]:
+        """
+        Claim `key` for executing a request.
+
+        Returns:
+            Tuple[str, Optional[str], Optional[StoredResponse]]: CLAIMED; DONE with the stored
+                response; or BUSY with the fingerprint of the request executing elsewhere
+        """
+        table = IdempotencyKey.__table__
+        now = time.time()
+        values = {
+            "fingerprint": fingerprint, "created_at": now, "locked_until": now + self.lock_seconds,
+            "expires_at": now + self.ttl, "status_code": None, "headers": None, "body": None,
+        }
+        with self.session_factory() as db:
+            try:
+                db.execute(insert(table).values(key=key, **values))
+                db.commit()
+                self._held[key] = now
+                return CLAIMED, None, None
+            except IntegrityError:
+                db.rollback()
+            row = db.execute(select(table).where(table.c.key == key)).one_or_none()
+            if row is not None and row.expires_at > now:
+                if row.status_code is not None:
+                    return DONE, None, self._stored(row)
+                if row.locked_until > now:
+                    return BUSY, row.fingerprint, None
+            # Expired, or abandoned mid-request: take it over, unless another worker just did
+            taken = db.execute(
+                update(table)
+                .where(table.c.key == key, or_(
+                    table.c.expires_at <= now, and_(table.c.status_code.is_(None), table.c.locked_until <= now)
+                ))
+                .values(**values)
+            ).rowcount
+            db.commit()
+            if not taken:
+                return BUSY, None, None
+            self._held[key] = now
+            return CLAIMED, None, None
+
+    def renew(self, key: str) -> bool:
+        """Extend this worker's claim on `key` by `lock_seconds`; False if it no longer holds it."""
+        claimed_at = self._held.get(key)
+        if claimed_at is None:
+            return False
+        table = IdempotencyKey.__table__
+        with self.session_factory() as db:
+            # created_at tells this claim from a later one on the same key, should it have been taken over
+            renewed = db.execute(
+                update(table)
+                .where(table.c.key == key, table.c.status_code.is_(None), table.c.created_at == claimed_at)
+                .values(locked_until=time.time() + self.lock_seconds)
+            ).rowcount
+            db.commit()
+        return bool(renewed)
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        self._held.pop(key, None)
+        table = IdempotencyKey.__table__
+        with self.session_factory() as db:
+            db.execute(
+                update(table).where(table.c.key == key).values(
+                    status_code=response.status_code, headers=json.dumps(response.headers), body=response.body,
+                    locked_until=None,
+                )
+            )
+            db.commit()
+        self.cache.set(key, response)
+
+    def release(self, key: str) -> None:
+        """Give up a claim without storing a response, so the next request with the key executes."""
+        self._held.pop(key, None)
+        table = IdempotencyKey.__table__
+        with self.session_factory() as db:
+            db.execute(delete(table).where(table.c.key == key, table.c.status_code.is_(None)))
+            db.commit()
+
+    def purge(self, batch_size: int = 1000) -> int:
+        """Delete up to batch_size expired keys; returns how many were deleted."""
+        table = IdempotencyKey.__table__
+        self._purged = time.monotonic()
+        with self.session_factory() as db:
+            expired = select(table.c.key).where(table.c.expires_at < time.time()).limit(batch_size)
+            deleted = db.execute(delete(table).where(table.c.key.in_(expired.scalar_subquery()))).rowcount
+            db.commit()
+        return deleted
+
+    def purge_due(self) -> bool:
+        return time.monotonic() - self._purged > min(self.ttl, 60)
+
+idempotency_store = IdempotencyStore()
+
+class _RequestBody:
+    """
+    The body of a request with an Idempotency-Key, hashed as it is received.
+
+    read_ahead() receives up to `limit` bytes before the route runs: a body within it is then
+    complete and its fingerprint known. A larger one streams on to the route after the part
+    read ahead, so only that part is ever held in memory.
+    """
+
+    def __init__(self, scope: Scope, receive: Receive, limit: int):
+        self._receive = receive
+        self.limit = limit
+        self._hash = hashlib.sha256(
+            b"\n".join([scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), b""])
+        )
+        self._ahead: List[Message] = []
+        self.complete = False
+        self.disconnected = False
+
+    async def _next(self) -> Message:
+        message = await self._receive()
+        if message["type"] == "http.request":
+            self._hash.update(message.get("body", b""))
+            self.complete = not message.get("more_body", False)
+        else:
+            self.disconnected = True
+        return message
+
+    async def read_ahead(self) -> None:
+        size = 0
+        while not (self.complete or self.disconnected) and size <= self.limit:
+            self._ahead.append(await self._next())
+            size += len(self._ahead[-1].get("body", b""))
+
+    def partial_fingerprint(self) -> str:
+        """Hash of the method, path, query and the body received so far."""
+        return self._hash.hexdigest()
+
+    async def fingerprint(self) -> Optional[str]:
+        """
+        Hash of the method, path, query and whole body, receiving (and dropping) the part the
+        route did not read; None if the client went away first.
+        """
+        while not (self.complete or self.disconnected):
+            await self._next()
+        return None if self.disconnected else self._hash.hexdigest()
+
+    async def receive(self) -> Message:
+        if self._ahead:
+            return self._ahead.pop(0)
+        return await self._next()
+
+def _error(status_code: int, detail: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+
+class IdempotencyMiddleware:
+    """
+    Make write requests sent with an `Idempotency-Key` header safe to retry.
+
+    The first request with a key executes and its response is stored (see IdempotencyStore);
+    a retry with the same key gets that response back, marked `Idempotent-Replayed: true`,
+    without executing the route again. A duplicate arriving while the first is still
+    executing waits for it: on the first one's future in the same worker, by polling the
+    store across workers, for up to `wait_seconds` before answering 409. Reusing a key for a
+    different request (method, path, query or body) is rejected with 422. Bodies up to
+    `max_body_bytes` are read before the key is claimed; larger ones (the streaming catalog
+    import) are claimed by the hash of that first part and hashed in full as they stream to
+    the route, so they are never held in memory (see _RequestBody).
+
+    Server errors, 409 and 429 responses and failed requests are not kept, so their retries
+    execute again. Requests without the header are untouched.
+    """
+
+    def __init__(
+        self, app: ASGIApp, store: Optional[IdempotencyStore] = None, wait_seconds: float = IDEMPOTENCY_WAIT_SECONDS,
+        max_body_bytes: int = IDEMPOTENCY_MAX_BODY_BYTES, poll_interval: float = 0.05,
+    ):
+        self.app = app
+        self.store = store or idempotency_store
+        self.wait_seconds = wait_seconds
+        self.max_body_bytes = max_body_bytes
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER.encode())
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = idempotency_key.decode("latin-1").strip()
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _error(400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")(scope, receive, send)
+            return
+
+        body = _RequestBody(scope, receive, self.max_body_bytes)
+        await body.read_ahead()
+        if body.disconnected:
+            await self.app(scope, body.receive, send)
+            return
+        authorization = headers.get(b"authorization")
+        key = self.store.key(bearer_subject(authorization.decode("latin-1") if authorization else None), idempotency_key)
+        # Of the whole request, unless its body is larger than max_body_bytes: then of the part
+        # read ahead, and retries are matched against the whole request once it is received
+        fingerprint = body.partial_fingerprint()
+
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            stored = self.store.cache.get(key)
+            if stored is not None:
+                await self._replay(stored, body, scope, receive, send)
+                return
+            pending = self._inflight.get(key)
+            if pending is not None:
+                # A duplicate in this worker: wait for the first one, then look again
+                IDEMPOTENT_REQUESTS.inc(outcome="waited")
+                try:
+                    await asyncio.wait_for(asyncio.shield(pending), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    await self._busy(scope, receive, send)
+                    return
+                continue
+
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = future
+            try:
+                state, other, stored = await run_in_threadpool(self.store.claim, key, fingerprint)
+                if state == CLAIMED:
+                    await self._execute(key, body, scope, send)
+                    return
+            finally:
+                del self._inflight[key]
+                future.set_result(None)
+            if state == DONE:
+                self.store.cache.set(key, stored)
+                await self._replay(stored, body, scope, receive, send)
+                return
+            # Executing in another worker
+            if other is not None and other != fingerprint:
+                await self._mismatch(scope, receive, send)
+                return
+            if time.monotonic() >= deadline:
+                await self._busy(scope, receive, send)
+                return
+            IDEMPOTENT_REQUESTS.inc(outcome="waited")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _renew(self, key: str) -> None:
+        """Keep the claim on `key` while its request executes."""
+        while True:
+            await asyncio.sleep(self.store.lock_seconds / 3)
+            if not await run_in_threadpool(self.store.renew, key):
+                IDEMPOTENT_REQUESTS.inc(outcome="lock_lost")
+                return
+
+    async def _execute(self, key: str, body: _RequestBody, scope: Scope, send: Send) -> None:
+        IDEMPOTENT_REQUESTS.inc(outcome="executed")
+        start: Optional[Message] = None
+        chunks = []
+        size = 0
+
+        async def capture(message: Message) -> None:
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if size <= self.max_body_bytes:
+                    chunks.append(message.get("body", b""))
+            await send(message)
+
+        renewing = asyncio.ensure_future(self._renew(key))
+        try:
+            await self.app(scope, body.receive, capture)
+            # The part of the body the route did not read still counts towards the fingerprint
+            fingerprint = await body.fingerprint()
+        except BaseException:
+            await run_in_threadpool(self.store.release, key)
+            raise
+        finally:
+            renewing.cancel()
+        if (
+            fingerprint is None or start is None or start["status"] >= 500 or start["status"] in _RETRYABLE
+            or size > self.max_body_bytes
+        ):
+            await run_in_threadpool(self.store.release, key)
+        else:
+            headers = tuple(
+                (name.decode("latin-1"), value.decode("latin-1"))
+                for name, value in start.get("headers", []) if name.lower() not in _DROPPED_HEADERS
+            )
+            await run_in_threadpool(self.store.complete, key, StoredResponse(fingerprint, start["status"], headers, b"".join(chunks)))
+        if self.store.purge_due():
+            await run_in_threadpool(self.store.purge)
+
+    async def _replay(self, stored: StoredResponse, body: _RequestBody, scope: Scope, receive: Receive, send: Send) -> None:
+        fingerprint = await body.fingerprint()
+        if fingerprint is None:
+            return
+        if stored.fingerprint != fingerprint:
+            await self._mismatch(scope, receive, send)
+            return
+        IDEMPOTENT_REQUESTS.inc(outcome="replayed")
+        for message in stored.messages():
+            await send(message)
+
+    @staticmethod
+    async def _mismatch(scope: Scope, receive: Receive, send: Send) -> None:
+        IDEMPOTENT_REQUESTS.inc(outcome="mismatch")
+        await _error(422, "Idempotency-Key was already used for a different request")(scope, receive, send)
+
+    @staticmethod
+    async def _busy(scope: Scope, receive: Receive, send: Send) -> None:
+        IDEMPOTENT_REQUESTS.inc(outcome="busy")
+        await _error(409, "A request with this Idempotency-Key is still being processed", {"Retry-After": "1"})(scope, receive, send)
@@ -0,0 +1,126 @@
+# app/instrumentation.py
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import Counter, Histogram
+
+LABELS = ["method", "route"]
+REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status", ["method", "route", "status"])
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time from request to last response byte", LABELS)
+REQUEST_HANDLER_SECONDS = Histogram(
+    "http_request_handler_seconds", "Request time outside SQL execution and pool waits (routing, validation, serialization)", LABELS
+)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent executing SQL statements per request", LABELS)
+REQUEST_POOL_WAIT_SECONDS = Histogram("http_request_pool_wait_seconds", "Time spent waiting for pooled connections per request", LABELS)
+REQUEST_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements executed per request", LABELS, buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+)
+
+# Requests that matched no route share one label instead of one series per raw path
+UNMATCHED_ROUTE = "unmatched"
+
+class RequestTimings:
+    """Database work attributed to the current request."""
+
+    __slots__ = ("statements", "db_seconds", "pool_wait_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value; durations in milliseconds."""
+        handler = max(total - self.db_seconds - self.pool_wait_seconds, 0.0)
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} queries", '
+            f"pool;dur={self.pool_wait_seconds * 1000:.2f}, app;dur={handler * 1000:.2f}, total;dur={total * 1000:.2f}"
+        )
+
+# Set by TimingMiddleware for the duration of a request. The object is shared, not copied,
+# with the threadpool and greenlet contexts the request's queries run in, so they add to it.
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+def record_pool_wait(seconds: float) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.pool_wait_seconds += seconds
+
+def _record_statement(conn) -> None:
+    started = conn.info.get("query_start")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    timings = _current.get()
+    if timings is not None:
+        timings.statements += 1
+        timings.db_seconds += elapsed
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record_statement(conn)
+
+@event.listens_for(Engine, "handle_error")
+def _failed_cursor_execute(context):
+    if context.connection is not None:
+        _record_statement(context.connection)
+
+def route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+class TimingMiddleware:
+    """
+    Attribute SQL statements, SQL time and pool waits to each HTTP request.
+
+    Adds a Server-Timing header to the response (work done before the response starts)
+    and feeds the per-route histograms above, labelled by route template rather than raw
+    path so that /api/borrowings/user/1 and /user/2 share a series. Streamed bodies count
+    in the histograms, not in the header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", timings.server_timing(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            total = time.perf_counter() - start
+            labels = {"method": scope["method"], "route": route_template(scope)}
+            REQUESTS.inc(status=status, **labels)
+            REQUEST_SECONDS.observe(total, **labels)
+            REQUEST_HANDLER_SECONDS.observe(max(total - timings.db_seconds - timings.pool_wait_seconds, 0.0), **labels)
+            REQUEST_DB_SECONDS.observe(timings.db_seconds, **labels)
+            REQUEST_POOL_WAIT_SECONDS.observe(timings.pool_wait_seconds, **labels)
+            REQUEST_STATEMENTS.observe(timings.statements, **labels)
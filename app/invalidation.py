@@ -0,0 +1,179 @@
+# app/invalidation.py
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy import Table, delete, func, insert, or_, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+# Loaded by app.cache while it is still importing: only its backend classes exist yet, and
+# app.database (which imports app.cache) is imported lazily below
+from app.cache import InMemoryInvalidationBackend, InvalidationBackend
+from app.config import CACHE_INVALIDATION_POLL_INTERVAL, CACHE_INVALIDATION_RETENTION
+from app.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATIONS = Counter(
+    "cache_invalidations_total", "Invalidations written to or read from cache_invalidations, by outcome", ["outcome"]
+)
+
+# Ids skipped over by a poll belong to inserts not committed yet (PostgreSQL sequences hand ids
+# out before commit) or rolled back; they are looked for again for this long
+GAP_SECONDS = 10.0
+MAX_GAPS = 1000
+
+def _decode(value: Any) -> Hashable:
+    """JSON value back to the published key: lists were tuples."""
+    return tuple(_decode(item) for item in value) if isinstance(value, list) else value
+
+class DatabaseInvalidationBackend(InvalidationBackend):
+    """
+    Fans invalidations out to every worker through the cache_invalidations table.
+
+    publish() applies the key in this process at once and queues a row for the background
+    thread, which writes it and polls for rows other processes wrote, every `poll_interval`
+    seconds or as soon as something is published. Rows older than `retention` seconds are
+    purged. Works on any database the app runs on; select it with
+    CACHE_INVALIDATION_BACKEND=app.invalidation:DatabaseInvalidationBackend (run.py --prod
+    does with more than one worker).
+
+    Before start() (scripts, tests) rows are written synchronously and nothing is read.
+    """
+
+    def __init__(
+        self, engine: Optional[Engine] = None, poll_interval: float = CACHE_INVALIDATION_POLL_INTERVAL,
+        retention: float = CACHE_INVALIDATION_RETENTION,
+    ):
+        self._engine = engine
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = uuid.uuid4().hex
+        self._local = InMemoryInvalidationBackend()
+        self._last_id: Optional[int] = None
+        self._gaps: Dict[int, float] = {}  # id -> when it was first found missing
+        self._outbox: "queue.Queue[dict]" = queue.Queue()
+        self._purged = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            from app.database import engine
+            self._engine = engine
+        return self._engine
+
+    @property
+    def table(self) -> Table:
+        from app.models.invalidation import CacheInvalidation
+        return CacheInvalidation.__table__
+
+    def subscribe(self, channel: str, callback: Callable[[Hashable], None]) -> None:
+        self._local.subscribe(channel, callback)
+
+    def publish(self, channel: str, key: Hashable) -> None:
+        self._local.publish(channel, key)
+        row = {"channel": channel, "key": json.dumps(key), "origin": self.origin, "created_at": time.time()}
+        if self._worker is not None and self._worker.is_alive():
+            self._outbox.put(row)
+            self._wake.set()
+        else:
+            self._write([row])
+
+    def _write(self, rows: List[dict]) -> None:
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(self.table), rows)
+        except SQLAlchemyError:
+            # The other workers' caches still expire by TTL
+            CACHE_INVALIDATIONS.inc(len(rows), outcome="failed")
+            logger.exception("Could not publish %d cache invalidations", len(rows))
+        else:
+            CACHE_INVALIDATIONS.inc(len(rows), outcome="published")
+
+    def flush(self) -> None:
+        """Write the queued rows."""
+        rows = []
+        while True:
+            try:
+                rows.append(self._outbox.get_nowait())
+            except queue.Empty:
+                break
+        if rows:
+            self._write(rows)
+
+    def poll(self, batch_size: int = 1000) -> int:
+        """Apply the invalidations other processes wrote since the last poll; returns how many."""
+        table = self.table
+        with self.engine.connect() as connection:
+            if self._last_id is None:
+                # The first poll only finds where the table ends: earlier rows predate this process
+                self._last_id = connection.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
+                return 0
+            condition = table.c.id > self._last_id
+            if self._gaps:
+                condition = or_(condition, table.c.id.in_(list(self._gaps)))
+            rows = connection.execute(
+                select(table.c.id, table.c.channel, table.c.key, table.c.origin)
+                .where(condition).order_by(table.c.id).limit(batch_size)
+            ).all()
+        now = time.monotonic()
+        applied = 0
+        for row in rows:
+            if self._gaps.pop(row.id, None) is None:
+                for missing in range(self._last_id + 1, row.id)[-MAX_GAPS:]:
+                    self._gaps[missing] = now
+                self._last_id = max(self._last_id, row.id)
+            if row.origin != self.origin:
+                self._local.publish(row.channel, _decode(json.loads(row.key)))
+                applied += 1
+        for missing in [missing for missing, seen in self._gaps.items() if now - seen > GAP_SECONDS]:
+            del self._gaps[missing]
+        CACHE_INVALIDATIONS.inc(applied, outcome="applied")
+        return applied
+
+    def purge(self) -> int:
+        """Delete rows older than the retention period; returns how many."""
+        table = self.table
+        with self.engine.begin() as connection:
+            return connection.execute(delete(table).where(table.c.created_at < time.time() - self.retention)).rowcount
+
+    def start(self) -> None:
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stop.clear()
+            try:
+                self.poll()
+            except SQLAlchemyError:
+                logger.exception("Could not read cache_invalidations; retrying in the background")
+            self._worker = threading.Thread(target=self._run_forever, name="cache-invalidations", daemon=True)
+            self._worker.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join()
+        self.flush()
+
+    def _run_forever(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            self.flush()
+            try:
+                self.poll()
+                if time.monotonic() - self._purged >= self.retention / 2:
+                    self._purged = time.monotonic()
+                    self.purge()
+            except SQLAlchemyError:
+                logger.exception("Polling cache_invalidations failed")
@@ -0,0 +1,53 @@
+# app/lifecycle.py
+import logging
+import os
+import time
+from typing import Optional
+
+from app.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+COLD_START_SECONDS = Gauge("app_cold_start_seconds", "Time this worker took to become ready, by phase", ["phase"])
+
+class Lifecycle:
+    """
+    Readiness of this worker process and how long it took to get there.
+
+    The clock starts when this module is first imported, which main.py does before
+    anything else: `imported` marks the app object being built, `ready` the end of the
+    startup hooks. `draining` is set on the first shutdown signal so load balancers stop
+    sending traffic while in-flight requests finish (see app.server).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imported: Optional[float] = None
+        self.ready: Optional[float] = None
+        self.draining = False
+
+    def mark_imported(self) -> None:
+        self.imported = time.perf_counter()
+
+    def mark_ready(self) -> None:
+        self.ready = time.perf_counter()
+        cold_start = self.cold_start()
+        for phase, seconds in cold_start.items():
+            COLD_START_SECONDS.set(seconds, phase=phase)
+        logger.info(
+            "worker %d ready in %.3fs (import %.3fs, startup %.3fs)",
+            os.getpid(), cold_start["total"], cold_start["import"], cold_start["startup"],
+        )
+
+    @property
+    def is_ready(self) -> bool:
+        return self.ready is not None and not self.draining
+
+    def cold_start(self) -> dict:
+        """Seconds spent importing the app, in startup hooks and in total (empty until ready)."""
+        if self.ready is None:
+            return {}
+        imported = self.imported or self.started
+        return {"import": imported - self.started, "startup": self.ready - imported, "total": self.ready - self.started}
+
+lifecycle = Lifecycle()
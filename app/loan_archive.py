@@ -0,0 +1,84 @@
+# app/loan_archive.py
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_PAUSE, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL
+from app.crud import book_borrowing as borrowing_crud
+from app.database import SessionLocal
+from app.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+LOANS_ARCHIVED = Counter("loans_archived_total", "Returned loans moved to book_borrowings_archive")
+ARCHIVE_RUN_SECONDS = Histogram("loan_archive_run_seconds", "Duration of loan archival runs")
+
+class LoanArchiver:
+    """
+    Keep book_borrowings sized to current loans by moving old returned loans to the archive.
+
+    A run moves every loan returned more than `after_days` ago, `batch_size` rows per short
+    transaction (see borrowing_crud.archive_returned_loans) with `pause` seconds between
+    batches, so it never holds locks or a connection for long. start() repeats runs every
+    `interval` seconds in a background thread; every worker may run one, concurrent runs
+    skip each other's rows.
+    """
+
+    def __init__(
+        self, session_factory: Callable[[], Session] = SessionLocal, after_days: float = ARCHIVE_AFTER_DAYS,
+        batch_size: int = ARCHIVE_BATCH_SIZE, pause: float = ARCHIVE_BATCH_PAUSE, interval: float = ARCHIVE_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def run(self, max_batches: Optional[int] = None, progress: Optional[Callable[[int], None]] = None) -> int:
+        """Archive loans returned before now minus after_days; returns how many were moved."""
+        returned_before = datetime.now(timezone.utc) - timedelta(days=self.after_days)
+        started = time.perf_counter()
+        total = batches = 0
+        with self.session_factory() as db:
+            while max_batches is None or batches < max_batches:
+                moved = borrowing_crud.archive_returned_loans(db, returned_before, self.batch_size)
+                batches += 1
+                total += moved
+                LOANS_ARCHIVED.inc(moved)
+                if progress is not None:
+                    progress(total)
+                if moved < self.batch_size or self._stop.wait(self.pause):
+                    break
+        ARCHIVE_RUN_SECONDS.observe(time.perf_counter() - started)
+        if total:
+            logger.info("Archived %d returned loans in %.1fs", total, time.perf_counter() - started)
+        return total
+
+    def _run_forever(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run()
+            except Exception:
+                logger.exception("Loan archival failed")
+
+    def start(self) -> None:
+        """Run every interval seconds in a background thread (not at all when interval is 0)."""
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run_forever, name="loan-archive", daemon=True)
+                self._worker.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+loan_archiver = LoanArchiver()
@@ -0,0 +1,132 @@
+# app/migrations.py
+from typing import Optional
+
+from sqlalchemy import false, func, inspect, select, text, true, update
+from sqlalchemy.engine import Connection
+
+from app.database import engine
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing, BookBorrowingArchive
+
+# Schema changes to tables that create_all() leaves alone once they exist. Every step
+# checks the live schema first, so running them again is a no-op.
+
+def _columns(connection: Connection, table: str) -> Optional[set]:
+    """Column names of `table`, or None if the table does not exist yet."""
+    inspector = inspect(connection)
+    if not inspector.has_table(table):
+        return None
+    return {column["name"] for column in inspector.get_columns(table)}
+
+def add_user_token_version(connection: Connection) -> None:
+    columns = _columns(connection, "users")
+    if columns is not None and "token_version" not in columns:
+        connection.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+
+def add_loan_timestamps(connection: Connection) -> None:
+    """
+    Add borrowed_at/returned_at to an existing book_borrowings table.
+
+    When loans were taken isn't known, so borrowed_at stays NULL for them; loans already
+    returned count as returned now, so the archival job moves them once they reach the age.
+    """
+    columns = _columns(connection, "book_borrowings")
+    if columns is None:
+        return
+    loans = BookBorrowing.__table__
+    for name in ("borrowed_at", "returned_at"):
+        if name not in columns:
+            column_type = loans.c[name].type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE book_borrowings ADD COLUMN {name} {column_type}"))
+    if "returned_at" not in columns:
+        connection.execute(
+            update(loans).where(loans.c.is_returned == true(), loans.c.returned_at.is_(None)).values(returned_at=func.now())
+        )
+
+def _close_duplicate_active_loans(connection: Connection) -> None:
+    """Keep the oldest active loan per (user, book), mark the rest returned and give their copies back."""
+    loans = BookBorrowing.__table__
+    duplicates = connection.execute(
+        select(loans.c.user_id, loans.c.book_id, func.min(loans.c.id), func.count())
+        .where(loans.c.is_returned == false())
+        .group_by(loans.c.user_id, loans.c.book_id)
+        .having(func.count() > 1)
+    ).all()
+    for user_id, book_id, keep_id, count in duplicates:
+        connection.execute(
+            update(loans)
+            .where(loans.c.user_id == user_id, loans.c.book_id == book_id,
+                   loans.c.is_returned == false(), loans.c.id != keep_id)
+            .values(is_returned=True, returned_at=func.now())
+        )
+        connection.execute(
+            update(Book.__table__)
+            .where(Book.__table__.c.id == book_id)
+            .values(available_quantity=Book.__table__.c.available_quantity + (count - 1))
+        )
+
+def add_active_loan_indexes(connection: Connection) -> None:
+    """Enforce one active loan per (user, book) on an existing book_borrowings table."""
+    inspector = inspect(connection)
+    if not inspector.has_table("book_borrowings"):
+        return
+    existing = {index["name"] for index in inspector.get_indexes("book_borrowings")}
+    if "uq_book_borrowings_active_loan" not in existing:
+        _close_duplicate_active_loans(connection)
+    for index in BookBorrowing.__table__.indexes:
+        if index.name not in existing:
+            index.create(connection)
+
+def add_archive_indexes(connection: Connection) -> None:
+    """Create the book_borrowings_archive indexes added after the table."""
+    inspector = inspect(connection)
+    if not inspector.has_table("book_borrowings_archive"):
+        return
+    existing = {index["name"] for index in inspector.get_indexes("book_borrowings_archive")}
+    for index in BookBorrowingArchive.__table__.indexes:
+        if index.name not in existing:
+            index.create(connection)
+
+def add_loan_id_autoincrement(connection: Connection) -> None:
+    """
+    Rebuild an SQLite book_borrowings table created without AUTOINCREMENT.
+
+    SQLite can't alter a primary key, so the rows are copied into a new table. Its id
+    sequence starts past every id already used, archived loans included, so no archived
+    id is handed out again.
+    """
+    if connection.dialect.name != "sqlite" or _columns(connection, "book_borrowings") is None:
+        return
+    sql = connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'book_borrowings'")
+    ).scalar()
+    if "AUTOINCREMENT" in sql.upper():
+        return
+    loans = BookBorrowing.__table__
+    existing = {index["name"] for index in inspect(connection).get_indexes("book_borrowings")}
+    connection.execute(text("ALTER TABLE book_borrowings RENAME TO book_borrowings_old"))
+    for name in existing:
+        connection.execute(text(f'DROP INDEX "{name}"'))
+    loans.create(connection)
+    columns = ", ".join(_columns(connection, "book_borrowings_old") & set(loans.c.keys()))
+    connection.execute(text(f"INSERT INTO book_borrowings ({columns}) SELECT {columns} FROM book_borrowings_old"))
+    connection.execute(text("DROP TABLE book_borrowings_old"))
+    last = [connection.execute(select(func.max(table.c.id))).scalar() for table in (loans, BookBorrowingArchive.__table__)
+            if _columns(connection, table.name) is not None]
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'book_borrowings'"))
+    connection.execute(
+        text("INSERT INTO sqlite_sequence (name, seq) VALUES ('book_borrowings', :seq)"),
+        {"seq": max((value or 0 for value in last), default=0)},
+    )
+
+# add_active_loan_indexes creates every missing book_borrowings index, so it runs after the
+# steps adding the columns they cover; the rebuild copies the migrated columns
+MIGRATIONS = [
+    add_user_token_version, add_loan_timestamps, add_active_loan_indexes, add_archive_indexes, add_loan_id_autoincrement
+]
+
+def run_migrations(bind=engine) -> None:
+    """Apply every migration step; tables that do not exist yet are left to create_all()."""
+    with bind.begin() as connection:
+        for step in MIGRATIONS:
+            step(connection)
@@ -1,3 +1,6 @@
 from app.models.user import User, UserRole
 from app.models.book import Book
-from app.models.book_borrowing import BookBorrowing
\ No newline at end of file
+from app.models.book_borrowing import BookBorrowing, BookBorrowingArchive
+from app.models.circulation import BookCirculation, CirculationTotals, DailyCirculation, UserCirculation
+from app.models.idempotency import IdempotencyKey
+from app.models.invalidation import CacheInvalidation
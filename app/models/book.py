@@ -1,5 +1,5 @@
 # app/models/book.py
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, DDL, Integer, String, event
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -14,4 +14,40 @@ class Book(Base):
     available_quantity = Column(Integer, default=1)  # Available for borrowing
     
     # Relationship with borrowings
-    borrowings = relationship("BookBorrowing", back_populates="book")
\ No newline at end of file
+    borrowings = relationship("BookBorrowing", back_populates="book")
+
+# Search indexes used by crud.book.search_books. PostgreSQL keeps the expression and
+# trigram GIN indexes up to date itself; on SQLite an external-content FTS5 table with
+# the trigram tokenizer is kept in sync with books by triggers.
+SEARCH_INDEX_SQL = {
+    "postgresql": [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_books_search_document ON books USING gin "
+        "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(author, '')))",
+        "CREATE INDEX IF NOT EXISTS ix_books_title_trgm ON books USING gin (title gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_books_author_trgm ON books USING gin (author gin_trgm_ops)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5"
+        "(title, author, content='books', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN "
+        "INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author); END",
+        "CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN "
+        "INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author); END",
+        "CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN "
+        "INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author); "
+        "INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author); END",
+    ],
+}
+
+for dialect, statements in SEARCH_INDEX_SQL.items():
+    for statement in statements:
+        event.listen(Book.__table__, "after_create", DDL(statement).execute_if(dialect=dialect))
+event.listen(Book.__table__, "before_drop", DDL("DROP TABLE IF EXISTS books_fts").execute_if(dialect="sqlite"))
+
+def create_search_index(connection) -> None:
+    """Install the search index on an existing books table and (re)build it from the current rows."""
+    for statement in SEARCH_INDEX_SQL.get(connection.dialect.name, []):
+        connection.exec_driver_sql(statement)
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
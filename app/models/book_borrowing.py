@@ -1,5 +1,5 @@
 # app/models/book_borrowing.py
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Boolean, Index, false
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -12,7 +12,56 @@ class BookBorrowing(Base):
     book_id = Column(Integer, ForeignKey("books.id"), index=True)
     user_id = Column(Integer, ForeignKey("users.id"), index=True)
     is_returned = Column(Boolean, default=False)
+    # Database clock; also a client-side default, because migrated tables have no server default
+    borrowed_at = Column(DateTime(timezone=True), default=func.now(), server_default=func.now())
+    returned_at = Column(DateTime(timezone=True))
     
     # Relationships
     book = relationship("Book", back_populates="borrowings")
-    user = relationship("User", back_populates="borrowings")
\ No newline at end of file
+    user = relationship("User", back_populates="borrowings")
+
+    __table_args__ = (
+        # At most one active loan per (user, book): a partial unique index, so returned
+        # loans don't count. crud.book_borrowing.borrow_book relies on it instead of a scan.
+        Index(
+            "uq_book_borrowings_active_loan", "user_id", "book_id", unique=True,
+            postgresql_where=is_returned == false(), sqlite_where=is_returned == false()
+        ),
+        # get_user_borrowing_rows (user_id + is_returned, keyset on id) and get_active_borrowings
+        Index("ix_book_borrowings_user_id_is_returned", "user_id", "is_returned", "id"),
+        Index("ix_book_borrowings_is_returned", "is_returned", "id"),
+        Index("ix_book_borrowings_borrowed_at", "borrowed_at"),
+        # Returned loans by age, for the archival job (app.loan_archive); active loans aren't indexed
+        Index(
+            "ix_book_borrowings_returned_at", "returned_at",
+            postgresql_where=returned_at.isnot(None), sqlite_where=returned_at.isnot(None)
+        ),
+        # Archived loans keep their ids, so ids must never be handed out again; without
+        # AUTOINCREMENT SQLite reuses the highest id once its row is archived
+        {"sqlite_autoincrement": True},
+    )
+
+class BookBorrowingArchive(Base):
+    """
+    Returned loans moved out of book_borrowings by app.loan_archive, keeping their ids.
+
+    book_borrowings then only holds current and recently returned loans; history queries
+    read both tables (crud.book_borrowing.loan_history).
+    """
+    __tablename__ = "book_borrowings_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    book_id = Column(Integer, ForeignKey("books.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    is_returned = Column(Boolean, nullable=False, default=True)
+    borrowed_at = Column(DateTime(timezone=True))
+    returned_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), default=func.now(), server_default=func.now())
+
+    __table_args__ = (
+        # A user's history in id order
+        Index("ix_book_borrowings_archive_user_id", "user_id", "id"),
+        # Loans by day, for rebuilding the daily circulation rollup (app.crud.circulation)
+        Index("ix_book_borrowings_archive_borrowed_at", "borrowed_at"),
+        Index("ix_book_borrowings_archive_returned_at", "returned_at"),
+    )
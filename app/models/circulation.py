@@ -0,0 +1,55 @@
+# app/models/circulation.py
+from sqlalchemy import Column, Date, Index, Integer
+
+from app.database import Base
+
+# Circulation rollups: counters kept up to date in the transaction of every borrow and return
+# (app.crud.circulation), so the statistics routes never aggregate book_borrowings.
+# rebuild_stats.py recomputes them from the loan history.
+
+class BookCirculation(Base):
+    """Loans of a book ever taken (archived ones included) and currently out."""
+    __tablename__ = "book_circulation"
+
+    book_id = Column(Integer, primary_key=True, autoincrement=False)
+    loans = Column(Integer, nullable=False, default=0)
+    active_loans = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Most borrowed books: a backward scan of the first `limit` entries
+        Index("ix_book_circulation_loans", "loans", "book_id"),
+    )
+
+class UserCirculation(Base):
+    """Loans a user ever took (archived ones included) and currently has out."""
+    __tablename__ = "user_circulation"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    loans = Column(Integer, nullable=False, default=0)
+    active_loans = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_user_circulation_loans", "loans", "user_id"),
+    )
+
+class DailyCirculation(Base):
+    """
+    Borrows and returns per UTC day, split over CIRCULATION_SHARDS rows by book id.
+
+    Every loan of the day would otherwise update the same row; with shards, only loans of
+    books in the same shard wait for each other. Reads add the shards of a day up.
+    """
+    __tablename__ = "daily_circulation"
+
+    day = Column(Date, primary_key=True)
+    shard = Column(Integer, primary_key=True, autoincrement=False)
+    borrows = Column(Integer, nullable=False, default=0)
+    returns = Column(Integer, nullable=False, default=0)
+
+class CirculationTotals(Base):
+    """Copies in the catalog and copies on the shelf, split over CIRCULATION_SHARDS rows by book id."""
+    __tablename__ = "circulation_totals"
+
+    shard = Column(Integer, primary_key=True, autoincrement=False)
+    copies = Column(Integer, nullable=False, default=0)
+    available = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,28 @@
+# app/models/idempotency.py
+from sqlalchemy import Column, Float, Index, Integer, LargeBinary, String, Text
+
+from app.database import Base
+
+class IdempotencyKey(Base):
+    """
+    A write request made with an Idempotency-Key header, and its response once it completed.
+
+    While status_code is NULL the request is still executing in some worker, which holds the
+    key until locked_until. Times are Unix timestamps, compared the same way on every backend.
+    See app.idempotency.
+    """
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(64), primary_key=True)  # hash of the client and its key
+    fingerprint = Column(String(64), nullable=False)  # hash of method, path, query and body
+    status_code = Column(Integer)
+    headers = Column(Text)  # JSON list of [name, value]
+    body = Column(LargeBinary)
+    created_at = Column(Float, nullable=False)
+    locked_until = Column(Float)
+    expires_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # Purging expired keys
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
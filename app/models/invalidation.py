@@ -0,0 +1,27 @@
+# app/models/invalidation.py
+from sqlalchemy import Column, Float, Index, Integer, String, Text
+
+from app.database import Base
+
+class CacheInvalidation(Base):
+    """
+    A cache invalidation published by one worker, for the others to apply.
+
+    Workers poll the table for ids they haven't seen (app.invalidation); rows are only
+    needed until every worker has read them and are purged after a retention period.
+    Times are Unix timestamps.
+    """
+    __tablename__ = "cache_invalidations"
+
+    id = Column(Integer, primary_key=True)
+    channel = Column(String(64), nullable=False)
+    key = Column(Text, nullable=False)  # JSON; tuples are stored as lists
+    origin = Column(String(32), nullable=False)  # publishing process, which applied it already
+    created_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # Purging old rows
+        Index("ix_cache_invalidations_created_at", "created_at"),
+        # Ids only grow, so a poller never mistakes a reused id for one it has seen
+        {"sqlite_autoincrement": True},
+    )
@@ -19,6 +19,8 @@ class User(Base):
     password = Column(String) 
     role = Column(String, default=UserRole.CUSTOMER)
     is_active = Column(Boolean, default=True)
+    # Bumped whenever the user's role changes; access tokens issued before the bump are rejected
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationship with books
     borrowings = relationship("BookBorrowing", back_populates="user")
\ No newline at end of file
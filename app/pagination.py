@@ -0,0 +1,64 @@
+# app/pagination.py
+import base64
+import binascii
+import json
+from typing import Any, List, Mapping, Optional, Sequence
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor is malformed or was issued for another sort order."""
+
+def encode_cursor(sort: str, values: Sequence[Any]) -> str:
+    """Pack the sort order and the sort-key values of the last row into an opaque token."""
+    raw = json.dumps([sort, *values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _scalar(value: Any) -> bool:
+    return value is None or (isinstance(value, (int, str)) and not isinstance(value, bool))
+
+def decode_cursor(cursor: str, sort: str, keys: Sequence[str]) -> List[Any]:
+    """
+    Unpack a token produced by encode_cursor, checking it belongs to the given sort order
+    and holds one scalar (int, str or null) value per sort key.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(data, list) or len(data) != len(keys) + 1 or data[0] != sort:
+        raise InvalidCursor("Cursor does not match the requested sort order")
+    if not all(_scalar(value) for value in data[1:]):
+        raise InvalidCursor("Malformed cursor")
+    return data[1:]
+
+def paginate(query: Query, columns: Sequence, after: Optional[Sequence[Any]] = None, skip: int = 0, limit: int = 100) -> Query:
+    """
+    Order a query by the given columns and select one page of it.
+
+    With a cursor (`after`) the page starts right after that key using an index-friendly
+    (c1, c2, ...) > (v1, v2, ...) comparison, so the cost does not grow with page depth.
+    Without one, the legacy skip/limit offset is applied.
+    """
+    query = query.order_by(*columns)
+    if after is not None:
+        if len(after) != len(columns):
+            raise InvalidCursor("Cursor does not match the requested sort order")
+        # Row-value comparison expanded into OR/AND terms, which every backend can index
+        query = query.filter(or_(*(
+            and_(*(columns[j] == after[j] for j in range(i)), columns[i] > after[i])
+            for i in range(len(columns))
+        )))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def next_cursor(rows: Sequence[Any], limit: int, sort: str, keys: Sequence[str]) -> Optional[str]:
+    """Cursor for the page after `rows`, or None when this page was the last (short) one."""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    if isinstance(last, Mapping):
+        return encode_cursor(sort, [last[key] for key in keys])
+    return encode_cursor(sort, [getattr(last, key) for key in keys])
@@ -0,0 +1,102 @@
+# app/reconciliation.py
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import RECONCILE_BATCH_PAUSE, RECONCILE_BATCH_SIZE, RECONCILE_FIX, RECONCILE_INTERVAL
+from app.crud import book as book_crud
+from app.database import SessionLocal
+from app.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+BOOKS_CHECKED = Counter("availability_books_checked_total", "Books whose available_quantity was checked against their loans")
+AVAILABILITY_MISMATCHES = Counter(
+    "availability_mismatches_total", "Books found with available_quantity != quantity - active loans, by outcome", ["outcome"]
+)
+RECONCILE_RUN_SECONDS = Histogram("availability_reconcile_run_seconds", "Duration of availability reconciliation runs")
+
+class AvailabilityReconciler:
+    """
+    Find and fix books whose available_quantity drifted from quantity minus active loans.
+
+    A run walks the whole catalog in id order, `batch_size` books per short transaction
+    (see book_crud.reconcile_availability) with `pause` seconds between batches. Drifted
+    books are fixed, or only logged and counted when `fix` is False. start() repeats runs
+    every `interval` seconds in a background thread.
+    """
+
+    def __init__(
+        self, session_factory: Callable[[], Session] = SessionLocal, batch_size: int = RECONCILE_BATCH_SIZE,
+        pause: float = RECONCILE_BATCH_PAUSE, interval: float = RECONCILE_INTERVAL, fix: bool = RECONCILE_FIX,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.fix = fix
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def run(self, progress: Optional[Callable[[int, list], None]] = None) -> dict:
+        """
+        Check every book once.
+
+        progress(checked, mismatches) is called after each batch with the running number of
+        books checked and that batch's mismatches.
+
+        Returns:
+            dict: books checked, mismatches found and mismatches fixed
+        """
+        started = time.perf_counter()
+        report = {"checked": 0, "mismatched": 0, "fixed": 0}
+        after = None
+        with self.session_factory() as db:
+            while True:
+                after, checked, mismatches = book_crud.reconcile_availability(db, after, self.batch_size, fix=self.fix)
+                report["checked"] += checked
+                report["mismatched"] += len(mismatches)
+                BOOKS_CHECKED.inc(checked)
+                for mismatch in mismatches:
+                    logger.warning(
+                        "Book %(book_id)s: available_quantity %(available_quantity)s, expected %(expected)s "
+                        "(quantity %(quantity)s minus active loans)", mismatch
+                    )
+                if mismatches:
+                    AVAILABILITY_MISMATCHES.inc(len(mismatches), outcome="fixed" if self.fix else "reported")
+                if self.fix:
+                    report["fixed"] += len(mismatches)
+                if progress is not None:
+                    progress(report["checked"], mismatches)
+                if checked < self.batch_size or self._stop.wait(self.pause):
+                    break
+        RECONCILE_RUN_SECONDS.observe(time.perf_counter() - started)
+        if report["mismatched"]:
+            logger.info("Availability reconciliation: %(checked)d books checked, %(mismatched)d drifted, %(fixed)d fixed", report)
+        return report
+
+    def _run_forever(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run()
+            except Exception:
+                logger.exception("Availability reconciliation failed")
+
+    def start(self) -> None:
+        """Run every interval seconds in a background thread (not at all when interval is 0)."""
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run_forever, name="availability-reconcile", daemon=True)
+                self._worker.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+reconciler = AvailabilityReconciler()
@@ -0,0 +1,241 @@
+# app/replicas.py
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import List, Optional, Sequence
+
+from fastapi import Depends
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.config import DATABASE_ASYNC, DATABASE_REPLICA_URLS, REPLICA_CHECK_INTERVAL, REPLICA_MAX_LAG_SECONDS
+from app.database import DBSession, engine_options, get_db, to_async_url
+from app.db_pool import instrument
+from app.metrics import Counter, Gauge
+from app.slow_queries import watch
+from app.versioning import versions
+
+logger = logging.getLogger(__name__)
+
+READ_SESSIONS = Counter(
+    "db_read_sessions_total", "Sessions opened for read-only routes, by database and why it was chosen", ["target", "reason"]
+)
+REPLICA_HEALTHY = Gauge("db_replica_healthy", "1 while the replica is in the read rotation", ["replica"])
+REPLICA_LAG_SECONDS = Gauge("db_replica_lag_seconds", "Replication lag measured by the last health check", ["replica"])
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it received
+# (pg_last_xact_replay_timestamp alone would grow while the primary is idle)
+POSTGRESQL_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+def replication_lag(conn: Connection) -> Optional[float]:
+    """Replication lag in seconds where the backend reports it (PostgreSQL standbys), else None."""
+    if conn.dialect.name != "postgresql":
+        conn.execute(text("SELECT 1"))
+        return None
+    lag = conn.execute(POSTGRESQL_LAG).scalar()
+    return None if lag is None else float(lag)
+
+class Replica:
+    """A read replica: its engine and session factory, and whether it is in the read rotation."""
+
+    def __init__(self, name: str, url: str, asyncio: bool = False):
+        self.name = name
+        self.url = make_url(url)
+        self.async_engine = None
+        if asyncio:
+            self.async_engine = create_async_engine(to_async_url(url), **engine_options(to_async_url(url), name, asyncio=True))
+            self.engine = self.async_engine.sync_engine
+            self.sessions = async_sessionmaker(self.async_engine, autoflush=False, expire_on_commit=False, info={"replica": name})
+        else:
+            self.engine = create_engine(url, **engine_options(self.url, name))
+            self.sessions = sessionmaker(bind=self.engine, autoflush=False, info={"replica": name})
+        # Health checks connect on their own, so an exhausted pool never reads as a dead replica
+        self.probe = create_engine(url, poolclass=NullPool)
+        instrument(self.engine, name)
+        # EXPLAINs need the driver that logged the statement (see app.slow_queries.watch)
+        watch(self.engine, explain_engine=create_async_engine(to_async_url(url), poolclass=NullPool) if asyncio else self.probe)
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url.render_as_string(hide_password=True),
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "error": self.error,
+            "checked_at": self.checked_at,
+        }
+
+class ReplicaSet:
+    """
+    Read replicas that read-only routes are spread over, round-robin among the healthy ones.
+
+    A replica leaves the rotation when a connection to it fails (checked out by a request or
+    by the periodic health check) or, on PostgreSQL, when it lags more than `max_lag` seconds
+    behind; the health check puts it back once it answers again. With no healthy replica,
+    reads fall back to the primary.
+
+    Reads right after a write stay on the primary: a client whose last commit, or whose loans
+    last changed, less than `max_lag` seconds ago gets a primary session, so it always sees
+    its own writes. Everyone else may read a replica that has not caught up yet; see may_lag.
+    """
+
+    def __init__(self, urls: Sequence[str], max_lag: float, check_interval: float, asyncio: bool = False):
+        self.replicas: List[Replica] = [Replica(f"replica{i}", url, asyncio) for i, url in enumerate(urls, 1)]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checker: Optional[threading.Thread] = None
+        for replica in self.replicas:
+            REPLICA_HEALTHY.set(1, replica=replica.name)
+            event.listen(replica.engine, "handle_error", self._on_error(replica))
+
+    def _on_error(self, replica: Replica):
+        def on_error(context) -> None:
+            # Connection failures only: a failed statement says nothing about the replica
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(replica, context.original_exception)
+        return on_error
+
+    def _recent(self, version: int) -> bool:
+        return time.time_ns() - version < self.max_lag * 1e9
+
+    def choose(self, client: Optional[int]) -> Optional[Replica]:
+        """The replica to serve a read of `client` (an authenticated user id) from, or None for the primary."""
+        if not self.replicas:
+            return None
+        if client is not None and self._recent(max(versions.writer(client), versions.user(client))):
+            READ_SESSIONS.inc(target="primary", reason="recent_write")
+            return None
+        with self._lock:
+            start = next(self._next)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if replica.healthy:
+                READ_SESSIONS.inc(target=replica.name, reason="round_robin")
+                return replica
+        READ_SESSIONS.inc(target="primary", reason="no_healthy_replica")
+        return None
+
+    def may_lag(self, db: DBSession, *data_versions: int) -> bool:
+        """
+        Whether `db` reads a replica that may not have replayed data at these versions yet.
+
+        Routes then serve the rows but neither cache them nor tag them with an ETag, which
+        would pin a stale page to a current version.
+        """
+        return "replica" in db.info and any(self._recent(version) for version in data_versions)
+
+    def mark_down(self, replica: Replica, reason) -> None:
+        if replica.healthy:
+            logger.warning("Read replica %s out of rotation: %s", replica.name, reason)
+        replica.healthy = False
+        replica.error = str(reason)
+        REPLICA_HEALTHY.set(0, replica=replica.name)
+
+    def check(self) -> None:
+        """Probe every replica once: reachable and, where measurable, not lagging more than max_lag."""
+        for replica in self.replicas:
+            try:
+                with replica.probe.connect() as conn:
+                    lag = replication_lag(conn)
+            except SQLAlchemyError as e:
+                self.mark_down(replica, e)
+                continue
+            finally:
+                replica.checked_at = time.time()
+            replica.lag = lag
+            if lag is not None:
+                REPLICA_LAG_SECONDS.set(lag, replica=replica.name)
+            if lag is not None and lag > self.max_lag:
+                self.mark_down(replica, f"lagging {lag:.1f}s behind the primary")
+            else:
+                if not replica.healthy:
+                    logger.info("Read replica %s back in rotation", replica.name)
+                replica.healthy, replica.error = True, None
+                REPLICA_HEALTHY.set(1, replica=replica.name)
+
+    def _check_forever(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Read replica health check failed")
+
+    def start(self) -> None:
+        """Check the replicas now and then every check_interval seconds, in a background thread."""
+        if not self.replicas:
+            return
+        self.check()
+        with self._lock:
+            if self._checker is None or not self._checker.is_alive():
+                self._stop.clear()
+                self._checker = threading.Thread(target=self._check_forever, name="replica-health", daemon=True)
+                self._checker.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def aclose(self) -> None:
+        """Stop the health checks and close every pooled replica connection."""
+        self.stop()
+        for replica in self.replicas:
+            if replica.async_engine is not None:
+                # Async connections must be closed on the event loop that opened them
+                await replica.async_engine.dispose()
+            else:
+                replica.engine.dispose()
+            replica.probe.dispose()
+
+    def dispose(self, close: bool = True) -> None:
+        for replica in self.replicas:
+            replica.engine.dispose(close=close)
+            replica.probe.dispose(close=close)
+
+    def stats(self) -> dict:
+        return {
+            "max_lag_seconds": self.max_lag,
+            "check_interval": self.check_interval,
+            "replicas": {replica.name: replica.stats() for replica in self.replicas},
+        }
+
+replicas = ReplicaSet(DATABASE_REPLICA_URLS, REPLICA_MAX_LAG_SECONDS, REPLICA_CHECK_INTERVAL, asyncio=DATABASE_ASYNC)
+
+# Forked children connect to the replicas afresh, like the primary (see app.database)
+os.register_at_fork(after_in_child=lambda: replicas.dispose(close=False))
+
+def get_sync_read_db(primary: DBSession = Depends(get_db)):
+    replica = replicas.choose(primary.info.get("client"))
+    if replica is None:
+        yield primary
+        return
+    db = replica.sessions()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(primary: DBSession = Depends(get_db)):
+    replica = replicas.choose(primary.info.get("client"))
+    if replica is None:
+        yield primary
+        return
+    async with replica.sessions() as db:
+        yield db
+
+# Dependency of read-only routes: a session on a replica chosen by ReplicaSet.choose, or the
+# request's primary session (get_db, so overriding get_db also covers these routes)
+get_read_db = get_async_read_db if DATABASE_ASYNC else get_sync_read_db
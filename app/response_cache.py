@@ -0,0 +1,154 @@
+# app/response_cache.py
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+
+from app.cache import CACHE_REQUESTS, InvalidationBackend, invalidation_backend
+from app.config import RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL
+
+# Headers worth replaying; Content-Length and Content-Type are rebuilt by Response
+_REPLAYED_HEADERS = ("etag", "cache-control", "x-next-cursor")
+
+class CachedResponse(NamedTuple):
+    status_code: int
+    body: bytes
+    media_type: Optional[str]
+    headers: Tuple[Tuple[str, str], ...]
+    tags: Tuple[str, ...]
+    expires_at: float = float("inf")  # time.monotonic()
+
+    def to_response(self) -> Response:
+        return Response(self.body, status_code=self.status_code, headers=dict(self.headers), media_type=self.media_type)
+
+def request_key(request: Request, *versions: int) -> Hashable:
+    """Cache key of a read: the route path, its sorted query parameters and the data versions it reflects."""
+    return request.url.path, tuple(sorted(request.query_params.multi_items())), versions
+
+class ResponseCache:
+    """
+    Bytes-bounded LRU cache of encoded GET responses, shared by every client of this worker.
+
+    Entries are tagged with the data they were built from ("catalog", "users"); a version
+    bump of that data (app.versioning) drops them, in every worker through the shared
+    invalidation backend. Keys also carry the versions read before the query, so an entry
+    can never outlive its data even before the drop arrives. Concurrent misses for one key
+    wait for a single load instead of each querying the database (single flight).
+
+    Entries also expire `ttl` seconds after they were built, which bounds how long a worker
+    serves a page whose invalidation never reached it.
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl: float = RESPONSE_CACHE_TTL, backend: Optional[InvalidationBackend] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.backend = backend or invalidation_backend
+        self.backend.subscribe("versions", lambda item: self.invalidate_tag(item[0]))
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at < time.monotonic():
+                self._pop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, entry: CachedResponse, generations: Optional[Dict[str, int]] = None) -> None:
+        size = len(entry.body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # Refuse a response built before one of its tags was invalidated
+            if generations is not None and any(self._generations.get(tag, 0) != gen for tag, gen in generations.items()):
+                return
+            self._pop(key)
+            self._entries[key] = entry
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry.body)
+
+    def invalidate_tag(self, tag: str) -> None:
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in [key for key, entry in self._entries.items() if tag in entry.tags]:
+                self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for tag in self._generations:
+                self._generations[tag] += 1
+            self._entries.clear()
+            self.bytes = 0
+
+    async def get_or_load(self, key: Hashable, tags: Sequence[str], load: Callable[[], Awaitable[Response]]) -> Response:
+        """
+        Serve `key` from the cache, or build it with `load()` and cache it if it is a 200.
+
+        A miss while another request is loading the same key awaits that load.
+        """
+        if self.max_bytes <= 0:
+            return await load()
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache=self.name, result="hit")
+            return entry.to_response()
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            CACHE_REQUESTS.inc(cache=self.name, result="coalesced")
+            return (await asyncio.shield(pending)).to_response()
+
+        self.misses += 1
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        with self._lock:
+            generations = {tag: self._generations.get(tag, 0) for tag in tags}
+        try:
+            response = await load()
+            entry = CachedResponse(
+                response.status_code,
+                response.body,
+                response.media_type,
+                tuple((name, value) for name, value in response.headers.items() if name in _REPLAYED_HEADERS),
+                tuple(tags),
+                time.monotonic() + self.ttl,
+            )
+            if response.status_code == 200:
+                self.set(key, entry, generations)
+            future.set_result(entry)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved: no "never retrieved" warning when nobody waited
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes, "ttl": self.ttl,
+            "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+        }
+
+response_cache = ResponseCache("responses", RESPONSE_CACHE_MAX_BYTES)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
 
@@ -19,4 +19,14 @@ class Book(BookBase):
     available_quantity: int
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+class BookImportError(BaseModel):
+    line: int
+    error: str
+
+class BookImportReport(BaseModel):
+    rows: int = 0  # data rows read, valid or not
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[BookImportError] = []  # the first IMPORT_MAX_ERRORS failures
@@ -1,6 +1,7 @@
 # app/schemas/book_borrowing.py
-from typing import Optional
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, validator
 from app.schemas.book import Book
 from app.schemas.user import User
 
@@ -10,17 +11,51 @@ class BookBorrowingBase(BaseModel):
     is_returned: bool = False
 
 class BookBorrowingCreate(BookBorrowingBase):
-    current_user_id: int
+    # Deprecated: the acting user comes from the bearer token; if sent, it must match it
+    current_user_id: Optional[int] = None
+
+    @validator('is_returned')
+    def must_not_be_returned(cls, v):
+        # A new loan takes a copy of the book; it is returned through PUT /{id}/return
+        if v:
+            raise ValueError('A new borrowing cannot already be returned')
+        return v
 
 class BookBorrowingUpdate(BaseModel):
     is_returned: Optional[bool] = None
 
 class BookBorrowing(BookBorrowingBase):
     id: int
+    borrowed_at: Optional[datetime] = None  # None for loans that predate the column
+    returned_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
 
 class BookBorrowingDetail(BookBorrowing):
     book: Optional[Book] = None
-    user: Optional[User] = None
\ No newline at end of file
+    user: Optional[User] = None
+
+class BookBorrowingBatchItem(BaseModel):
+    book_id: int
+    user_id: int
+
+class BookBorrowingBatchCreate(BaseModel):
+    # Deprecated: the acting user comes from the bearer token; if sent, it must match it
+    current_user_id: Optional[int] = None
+    items: List[BookBorrowingBatchItem]
+
+class BookReturnBatch(BaseModel):
+    borrowing_ids: List[int]
+
+class BatchItemResult(BaseModel):
+    index: int
+    success: bool
+    status_code: int
+    borrowing_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class BatchResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
@@ -0,0 +1,28 @@
+# app/schemas/circulation.py
+from datetime import date
+from typing import Optional
+from pydantic import BaseModel
+
+class BookCirculation(BaseModel):
+    book_id: int
+    title: Optional[str] = None  # None once the book left the catalog
+    author: Optional[str] = None
+    loans: int
+    active_loans: int
+
+class UserCirculation(BaseModel):
+    user_id: int
+    email: Optional[str] = None
+    loans: int
+    active_loans: int
+
+class Utilization(BaseModel):
+    copies: int
+    available: int
+    on_loan: int
+    utilization: float  # 1 - available / copies
+
+class DailyCirculation(BaseModel):
+    day: date
+    borrows: int
+    returns: int
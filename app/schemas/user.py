@@ -36,10 +36,15 @@ class User(UserBase):
     class Config:
         orm_mode = True
 
+class LoginResponse(User):
+    access_token: str
+    token_type: str = "bearer"
+
 class LoginRequest(BaseModel):
     email: str
     password: str
 
 class RoleUpdate(BaseModel):
     role: UserRole
-    admin_id: int
\ No newline at end of file
+    # Deprecated: the admin comes from the bearer token; if sent, it must match it
+    admin_id: Optional[int] = None
\ No newline at end of file
@@ -0,0 +1,112 @@
+# app/security.py
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+
+from app.cache import InvalidationBackend, invalidation_backend
+from app.config import SECRET_KEY, TOKEN_TTL_SECONDS
+
+_HEADER = {"alg": "HS256", "typ": "JWT"}
+
+class InvalidToken(Exception):
+    """The token is malformed, badly signed, expired or revoked."""
+
+class TokenPayload(BaseModel):
+    sub: int  # user id
+    role: str
+    ver: int  # users.token_version when the token was issued
+    exp: int  # unix time
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(signing_input: str) -> str:
+    return _b64encode(hmac.new(SECRET_KEY.encode(), signing_input.encode("ascii"), hashlib.sha256).digest())
+
+def _segment(data: dict) -> str:
+    return _b64encode(json.dumps(data, separators=(",", ":")).encode())
+
+def create_access_token(user_id: int, role: str, version: int, ttl: int = TOKEN_TTL_SECONDS) -> str:
+    """Issue an HS256 JWT for the user, valid for `ttl` seconds."""
+    payload = {"sub": user_id, "role": role, "ver": version, "exp": int(time.time()) + ttl}
+    signing_input = f"{_segment(_HEADER)}.{_segment(payload)}"
+    return f"{signing_input}.{_sign(signing_input)}"
+
+def decode_access_token(token: str) -> TokenPayload:
+    """
+    Verify a token issued by create_access_token. This is pure CPU work, no database access.
+
+    Raises:
+        InvalidToken: if the token is malformed, its signature does not match, it has expired
+            or it predates the user's current token version
+    """
+    try:
+        header, payload, signature = token.split(".")
+    except ValueError:
+        raise InvalidToken("Malformed token")
+    if not hmac.compare_digest(signature, _sign(f"{header}.{payload}")):
+        raise InvalidToken("Invalid token signature")
+    try:
+        data = TokenPayload(**json.loads(_b64decode(payload)))
+    except (ValueError, TypeError, ValidationError):
+        raise InvalidToken("Malformed token")
+    if data.exp < time.time():
+        raise InvalidToken("Token has expired")
+    if data.ver < token_versions.current(data.sub):
+        raise InvalidToken("Token has been revoked")
+    return data
+
+def bearer_subject(authorization: Optional[str]) -> Optional[int]:
+    """User id of a valid `Authorization: Bearer` header value, or None."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return decode_access_token(token.strip()).sub
+    except InvalidToken:
+        return None
+
+class TokenVersions:
+    """
+    Current token version of every user whose version was ever bumped, kept in memory.
+
+    Bumps are published through the cache invalidation backend so every worker rejects
+    stale tokens at once; workers seed the registry from the database at startup.
+    """
+
+    def __init__(self, backend: InvalidationBackend = invalidation_backend):
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.backend = backend
+        self.backend.subscribe("tokens", self._apply)
+
+    def current(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    def bump(self, user_id: int, version: int) -> None:
+        self.backend.publish("tokens", (user_id, version))
+
+    def load(self, versions: Iterable[Tuple[int, int]]) -> None:
+        for item in versions:
+            self._apply(item)
+
+    def _apply(self, item: Tuple[int, int]) -> None:
+        user_id, version = item
+        with self._lock:
+            if version > self._versions.get(user_id, 0):
+                self._versions[user_id] = version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+
+token_versions = TokenVersions()
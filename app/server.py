@@ -0,0 +1,69 @@
+# app/server.py
+import logging
+import os
+import signal
+import threading
+from types import FrameType
+from typing import Optional
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from app.lifecycle import lifecycle
+
+logger = logging.getLogger(__name__)
+
+# Invalidation backend of multi-worker mode when CACHE_INVALIDATION_BACKEND is not set
+SHARED_INVALIDATION_BACKEND = "app.invalidation:DatabaseInvalidationBackend"
+
+class DrainingServer(uvicorn.Server):
+    """
+    uvicorn server that drains before it stops.
+
+    The first SIGTERM/SIGINT only marks the worker as draining, which turns the readiness
+    probe into a 503 while requests are still served, and stops the server `drain_seconds`
+    later. uvicorn then closes the listening socket and waits up to
+    `timeout_graceful_shutdown` for in-flight requests. A second signal stops it at once.
+    """
+
+    def __init__(self, config: uvicorn.Config, drain_seconds: float = 0):
+        super().__init__(config)
+        self.drain_seconds = drain_seconds
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if lifecycle.draining or self.drain_seconds <= 0:
+            super().handle_exit(sig, frame)
+            return
+        lifecycle.draining = True
+        logger.info("Received %s, draining for %.1fs", signal.Signals(sig).name, self.drain_seconds)
+        timer = threading.Timer(self.drain_seconds, super().handle_exit, (sig, frame))
+        timer.daemon = True
+        timer.start()
+
+def serve(app: str, host: str, port: int, workers: int, drain_seconds: float, graceful_timeout: float) -> None:
+    """
+    Run `app` (an import string) in `workers` worker processes without reload.
+
+    Workers are spawned, not forked, so each imports the app and creates its engines and
+    pools itself; nothing runs DDL on import (see create_tables.py). Spawned workers read
+    their settings from the environment, so with more than one worker SECRET_KEY must be
+    set (each would sign tokens with its own random key) and caches are invalidated across
+    workers through the database unless CACHE_INVALIDATION_BACKEND names another backend.
+    """
+    if workers > 1:
+        if not os.getenv("SECRET_KEY"):
+            raise SystemExit(
+                "SECRET_KEY must be set to run more than one worker: tokens signed by one worker would be rejected by the others"
+            )
+        if not os.getenv("CACHE_INVALIDATION_BACKEND"):
+            os.environ["CACHE_INVALIDATION_BACKEND"] = SHARED_INVALIDATION_BACKEND
+            logger.info("Invalidating caches across workers with %s", SHARED_INVALIDATION_BACKEND)
+    config = uvicorn.Config(
+        app, host=host, port=port, workers=workers, timeout_graceful_shutdown=graceful_timeout,
+        proxy_headers=True,
+    )
+    server = DrainingServer(config, drain_seconds)
+    if config.workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
@@ -0,0 +1,216 @@
+# app/slow_queries.py
+import asyncio
+import itertools
+import logging
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import SLOW_QUERY_EXPLAIN_SAMPLE, SLOW_QUERY_LOG_SIZE, SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+# Execution option; False keeps a connection's statements (the EXPLAINs themselves) out of the log
+LOG_OPTION = "slow_query_log"
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+# Modules whose frames are plumbing, never the caller worth reporting
+_INTERNAL_MODULES = ("app.slow_queries", "app.instrumentation", "app.db_pool", "app.database")
+
+def normalize_sql(statement: str) -> str:
+    """Statement with literals and placeholders as `?`, IN lists collapsed and whitespace squeezed."""
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _IN_LIST.sub("(?, ...)", statement)
+    return _SPACE.sub(" ", statement).strip()
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> Any:
+    """Names (or positions) and types of the bound parameters, never their values."""
+    if executemany and isinstance(parameters, (list, tuple)) and parameters:
+        return {"rows": len(parameters), "each": parameter_shape(parameters[0])}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+def calling_function() -> Optional[str]:
+    """The innermost app.crud function on the stack, else the innermost other app function."""
+    fallback = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if frame.f_code.co_name.startswith("<"):
+            # Comprehensions and generator expressions (own frames before Python 3.12): report their function
+            frame = frame.f_back
+            continue
+        if module.startswith("app.crud."):
+            return f"{module}.{frame.f_code.co_name}"
+        if fallback is None and (module.startswith("app.") or module == "main") and module not in _INTERNAL_MODULES:
+            fallback = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return fallback
+
+class SlowQueryLog:
+    """
+    Ring buffer of statements slower than `threshold_ms` (0 disables the log).
+
+    Entries keep the normalized SQL, the shape of its parameters and the crud function that
+    ran it. An `explain_sample` fraction of them also get the statement's plan, captured by a
+    background thread on a connection of its own so the request never waits for it; each
+    distinct statement is explained at most once per `explain_interval` seconds.
+    """
+
+    def __init__(self, threshold_ms: float, size: int, explain_sample: float, explain_interval: float = 60.0):
+        self.threshold_ms = threshold_ms
+        self.explain_sample = explain_sample
+        self.explain_interval = explain_interval
+        self._entries: deque = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._explained: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._explains: "queue.Queue" = queue.Queue(maxsize=100)
+        self._worker: Optional[threading.Thread] = None
+
+    def record(self, explain_engine: Union[Engine, AsyncEngine], statement: str, parameters: Any, executemany: bool, seconds: float) -> None:
+        sql = normalize_sql(statement)
+        entry = {
+            "id": next(self._ids),
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(seconds * 1000, 3),
+            "sql": sql,
+            "parameters": parameter_shape(parameters, executemany),
+            "caller": calling_function(),
+            "dialect": explain_engine.dialect.name,
+            "plan": None,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            now = time.monotonic()
+            explain = (
+                random.random() < self.explain_sample
+                and now - self._explained.get(sql, -self.explain_interval) >= self.explain_interval
+            )
+            if explain:
+                self._explained[sql] = now
+        logger.warning("slow query %.1f ms in %s: %s", entry["duration_ms"], entry["caller"], sql)
+        if explain:
+            first = parameters[0] if executemany and parameters else parameters
+            try:
+                self._explains.put_nowait((entry, explain_engine, statement, first))
+                entry["plan"] = "pending"
+            except queue.Full:
+                pass
+            self._start_worker()
+
+    def _start_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._explain_forever, name="slow-query-explain", daemon=True)
+                self._worker.start()
+
+    def _explain_forever(self) -> None:
+        while True:
+            entry, explain_engine, statement, parameters = self._explains.get()
+            try:
+                entry["plan"] = explain(explain_engine, statement, parameters)
+            except Exception as e:
+                entry["plan"] = f"EXPLAIN failed: {e.__class__.__name__}: {e}"
+            finally:
+                self._explains.task_done()
+
+    def wait_for_explains(self) -> None:
+        """Block until every queued EXPLAIN has run."""
+        self._explains.join()
+
+    def entries(self, limit: Optional[int] = None) -> List[dict]:
+        """Logged statements, newest first."""
+        with self._lock:
+            entries = list(reversed(self._entries))
+        return entries[:limit] if limit else entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._explained.clear()
+
+def explain(engine: Union[Engine, AsyncEngine], statement: str, parameters: Any) -> str:
+    """
+    The plan of `statement`: EXPLAIN QUERY PLAN on SQLite, EXPLAIN ANALYZE on PostgreSQL.
+
+    PostgreSQL only ANALYZEs plain SELECTs, since ANALYZE executes the statement; anything
+    else gets an estimated plan. Everything runs in a transaction that is rolled back.
+
+    An AsyncEngine runs it on an event loop of its own (the caller must not be on one), so a
+    statement logged by an async driver is explained with that driver's paramstyle.
+    """
+    if isinstance(engine, AsyncEngine):
+        return asyncio.run(_explain_async(engine, statement, parameters))
+    with engine.connect() as connection:
+        return _explain(connection, statement, parameters)
+
+async def _explain_async(engine: AsyncEngine, statement: str, parameters: Any) -> str:
+    async with engine.connect() as connection:
+        return await connection.run_sync(_explain, statement, parameters)
+
+def _explain(connection: Connection, statement: str, parameters: Any) -> str:
+    dialect = connection.dialect.name
+    words = statement.lstrip().split(None, 1)
+    analyze = bool(words) and words[0].upper() == "SELECT" and "FOR UPDATE" not in statement.upper()
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+    else:
+        prefix = "EXPLAIN "
+    connection = connection.execution_options(**{LOG_OPTION: False})
+    transaction = connection.begin()
+    try:
+        rows = connection.exec_driver_sql(prefix + statement, parameters).all()
+    finally:
+        transaction.rollback()
+    # SQLite rows are (id, parent, notused, detail); PostgreSQL returns one text line per row
+    return "\n".join(str(row[-1]) for row in rows)
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_LOG_SIZE, SLOW_QUERY_EXPLAIN_SAMPLE)
+
+def watch(engine: Engine, explain_engine: Optional[Union[Engine, AsyncEngine]] = None, log: SlowQueryLog = slow_query_log) -> None:
+    """
+    Time the statements of `engine` into the slow query log.
+
+    `explain_engine` runs the EXPLAINs when `engine` can't be used from the background thread
+    (the sync side of an async engine). It must point at the same database through the same
+    driver, since logged statements are re-executed as is: for an async engine, pass an
+    AsyncEngine with a NullPool (its connections live on the EXPLAIN thread's event loop).
+    """
+    explain_engine = explain_engine or engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start(conn, cursor, statement, parameters, context, executemany):
+        if log.threshold_ms > 0:
+            conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def finish(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("slow_query_start")
+        if not started:
+            return
+        seconds = time.perf_counter() - started.pop()
+        if seconds * 1000 >= log.threshold_ms and conn.get_execution_options().get(LOG_OPTION, True):
+            log.record(explain_engine, statement, parameters, executemany, seconds)
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        if context.connection is not None and context.connection.info.get("slow_query_start"):
+            context.connection.info["slow_query_start"].pop()
@@ -0,0 +1,138 @@
+# app/versioning.py
+import threading
+import time
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from app.cache import InvalidationBackend, invalidation_backend
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User
+
+_PENDING = "pending_versions"
+_ALL_USERS = "*"
+_WRITER = "writer"
+
+class VersionRegistry:
+    """
+    Monotonic versions of the catalog, the users table and each user's borrowings, kept in memory.
+
+    Read routes build ETags from these versions, so a conditional request can be answered
+    304 without touching the database. Versions are bumped after a commit that wrote to the
+    corresponding tables, and bumps are published through the cache invalidation backend
+    so every worker moves forward. New versions come from the clock, so a restarted worker
+    never reissues a version (and ETag) that clients saw before the restart.
+
+    Being clock readings, versions also tell how long ago something changed. `writer(user_id)`
+    is the version of the last commit made by requests authenticated as that user, which
+    read routing uses to keep a client's reads on the primary right after it wrote (see
+    app.replicas).
+    """
+
+    def __init__(self, backend: InvalidationBackend = invalidation_backend):
+        self._last = time.time_ns()
+        self.catalog = self._last
+        self.users = self._last  # any user row
+        self.all_users = self._last  # floor of every user's version
+        self._users = {}
+        self._writers = {}
+        self._lock = threading.Lock()
+        self.backend = backend
+        self.backend.subscribe("versions", self._apply)
+
+    def user(self, user_id: int) -> int:
+        return max(self.all_users, self._users.get(user_id, 0))
+
+    def writer(self, user_id: int) -> int:
+        return self._writers.get(user_id, 0)
+
+    def bump(
+        self, catalog: bool = False, user_ids: Iterable = (), all_users: bool = False, users: bool = False,
+        writer: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            self._last = version = max(time.time_ns(), self._last + 1)
+        if catalog:
+            self.backend.publish("versions", ("catalog", version))
+        if users:
+            self.backend.publish("versions", ("users", version))
+        if all_users:
+            self.backend.publish("versions", (_ALL_USERS, version))
+        for user_id in set(user_ids):
+            self.backend.publish("versions", (user_id, version))
+        if writer is not None:
+            self.backend.publish("versions", ((_WRITER, writer), version))
+
+    def _apply(self, item) -> None:
+        key, version = item
+        with self._lock:
+            self._last = max(self._last, version)
+            if key == "catalog":
+                self.catalog = max(self.catalog, version)
+            elif key == "users":
+                self.users = max(self.users, version)
+            elif key == _ALL_USERS:
+                self.all_users = max(self.all_users, version)
+            elif isinstance(key, tuple):
+                self._writers[key[1]] = max(self._writers.get(key[1], 0), version)
+            else:
+                self._users[key] = max(self._users.get(key, 0), version)
+
+versions = VersionRegistry()
+
+def touch(db: Session, catalog: bool = False, user_ids: Iterable = (), users: bool = False) -> None:
+    """
+    Record that the session's transaction changed the catalog, these users' loans and/or user rows.
+
+    The listeners below do this for ORM flushes and ORM-enabled statements; crud code that
+    writes through db.connection() directly calls it itself. Versions move on commit.
+    """
+    pending = db.info.setdefault(_PENDING, {"catalog": False, "users": False, "user_ids": set()})
+    pending["catalog"] |= catalog
+    pending["users"] |= users
+    pending["user_ids"].update(user_ids)
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session: Session, flush_context) -> None:
+    changed = [*session.new, *session.dirty, *session.deleted]
+    touch(
+        session,
+        catalog=any(isinstance(obj, Book) for obj in changed),
+        users=any(isinstance(obj, User) for obj in changed),
+        user_ids=[obj.user_id for obj in changed if isinstance(obj, BookBorrowing)]
+        + [obj.id for obj in changed if isinstance(obj, User) and obj.id is not None],
+    )
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement(state: ORMExecuteState) -> None:
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    mapper = state.bind_mapper
+    entity = mapper.class_ if mapper is not None else None
+    if entity is Book:
+        touch(state.session, catalog=True)
+    elif entity is User:
+        touch(state.session, users=True)
+    elif entity is BookBorrowing:
+        params = state.parameters if isinstance(state.parameters, list) else [state.parameters or {}]
+        user_ids = [p.get("user_id") for p in params]
+        # Bulk updates by id don't say whose loans they changed; invalidate every user's list
+        touch(state.session, user_ids=user_ids if None not in user_ids else [_ALL_USERS])
+
+@event.listens_for(Session, "after_commit")
+def _publish(session: Session) -> None:
+    pending: Optional[dict] = session.info.pop(_PENDING, None)
+    if pending and (pending["catalog"] or pending["users"] or pending["user_ids"]):
+        user_ids = pending["user_ids"]
+        all_users = _ALL_USERS in user_ids
+        user_ids.discard(_ALL_USERS)
+        versions.bump(
+            catalog=pending["catalog"], user_ids=user_ids, all_users=all_users, users=pending["users"],
+            writer=session.info.get("client"),
+        )
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session: Session) -> None:
+    session.info.pop(_PENDING, None)
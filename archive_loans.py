@@ -0,0 +1,25 @@
+import argparse
+import time
+
+from app.config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_PAUSE, ARCHIVE_BATCH_SIZE
+from app.loan_archive import LoanArchiver
+
+def main():
+    parser = argparse.ArgumentParser(description="Move loans returned long ago to the book_borrowings_archive table")
+    parser.add_argument("--after-days", type=float, default=ARCHIVE_AFTER_DAYS, help="archive loans returned more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="loans moved per transaction")
+    parser.add_argument("--pause", type=float, default=ARCHIVE_BATCH_PAUSE, help="seconds to wait between batches")
+    parser.add_argument("--max-batches", type=int, help="stop after this many batches")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def progress(total):
+        print(f"{total} loans archived ({total / (time.perf_counter() - started):.0f} rows/s)", flush=True)
+
+    archiver = LoanArchiver(after_days=args.after_days, batch_size=args.batch_size, pause=args.pause)
+    total = archiver.run(max_batches=args.max_batches, progress=progress)
+    print(f"Archived {total} loans in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/async_load.py
+"""
+Compare request throughput of the sync (threadpool) and async (AsyncSession) database paths.
+
+Seeds a throwaway database, then serves main.app in-process once per mode (each in its own
+interpreter, since DATABASE_ASYNC is read at import) and drives it with `--clients`
+concurrent clients through httpx's ASGI transport.
+
+    python -m benchmarks.async_load --clients 500 --requests 10000
+
+Set DATABASE_URL to a PostgreSQL database to measure against a networked server, where
+threads blocked on I/O make the difference much larger than on a local SQLite file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+def seed(database_url: str, books: int) -> None:
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import insert
+
+    from app.database import Base, engine
+    from app.models import Book, BookBorrowing, User
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"email": "reader@example.com", "first_name": "R", "last_name": "R", "password": "x"}])
+        conn.execute(insert(Book), [
+            {"title": f"Title {i}", "author": f"Author {i % 50}", "quantity": 2, "available_quantity": 1}
+            for i in range(books)
+        ])
+        conn.execute(insert(BookBorrowing), [{"book_id": i + 1, "user_id": 1} for i in range(min(books, 20))])
+    engine.dispose()
+
+
+async def drive(clients: int, requests: int) -> dict:
+    import httpx
+
+    from app.database import async_engine
+    from main import app
+
+    paths = ["/api/books/?limit=20", "/api/borrowings/user/1?limit=20", "/api/users/?limit=20"]
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def client(http):
+        for i in remaining:
+            start = time.perf_counter()
+            response = await http.get(paths[i % len(paths)])
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+    if async_engine is not None:
+        await async_engine.dispose()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--worker", choices=["sync", "async"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(drive(args.clients, args.requests))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = os.environ.get("DATABASE_URL") or f"sqlite:///{tmp}/load.db"
+        seed(database_url, args.books)
+        print(f"{'mode':>6} {'clients':>8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+        for mode in args.modes:
+            env = dict(os.environ, DATABASE_URL=database_url, DATABASE_ASYNC=str(mode == "async").lower())
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.async_load", "--worker", mode,
+                 "--clients", str(args.clients), "--requests", str(args.requests)],
+                cwd=ROOT, env=env, check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:>6} {args.clients:>8} {result['rps']:>10.0f} {result['p50_ms']:>10.1f} {result['p99_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/cold_start.py
+"""
+Measure how long the production server takes to become ready, and to drain and stop.
+
+Creates the schema once (create_tables.py), then `--runs` times starts `run.py --prod`
+with `--workers` worker processes, polls GET /health/ready until it answers 200 and
+sends SIGTERM. Reports the wall time to the first ready answer, the cold start each
+worker reported (import and startup hooks, from /health/ready and app_cold_start_seconds)
+and the time from SIGTERM to exit, which includes DRAIN_SECONDS.
+
+    python -m benchmarks.cold_start --workers 4 --runs 5
+
+Runs against a throwaway SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port: int, timeout: float) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health/ready", timeout=1) as response:
+                return json.load(response)
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.01)
+    raise TimeoutError(f"server not ready after {timeout}s")
+
+
+def boot(env: dict, workers: int, timeout: float) -> dict:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "run.py", "--prod", "--workers", str(workers), "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready = wait_ready(port, timeout)
+        to_ready = time.perf_counter() - started
+        stopping = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=timeout)
+        return {"to_ready": to_ready, "worker": ready["cold_start_seconds"], "shutdown": time.perf_counter() - stopping}
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--drain-seconds", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DRAIN_SECONDS=str(args.drain_seconds), WEB_CONCURRENCY=str(args.workers))
+        env.setdefault("DATABASE_URL", f"sqlite:///{tmp}/cold_start.db")
+        subprocess.run([sys.executable, "create_tables.py"], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+        runs = [boot(env, args.workers, args.timeout) for _ in range(args.runs)]
+
+    def median(values):
+        return statistics.median(values) * 1000
+
+    print(f"{args.workers} workers, {args.runs} runs, median milliseconds")
+    print(f"{'first ready':>12} {'worker import':>14} {'worker startup':>15} {'worker total':>13} {'SIGTERM to exit':>16}")
+    print(f"{median([r['to_ready'] for r in runs]):>12.0f} {median([r['worker']['import'] for r in runs]):>14.0f} "
+          f"{median([r['worker']['startup'] for r in runs]):>15.0f} {median([r['worker']['total'] for r in runs]):>13.0f} "
+          f"{median([r['shutdown'] for r in runs]):>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
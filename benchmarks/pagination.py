@@ -0,0 +1,75 @@
+# benchmarks/pagination.py
+"""
+Compare offset and keyset (cursor) pagination cost at increasing page depth.
+
+Seeds a throwaway SQLite database with `--rows` borrowing records and times fetching
+page 1 and page N with both strategies through app.crud.book_borrowing.get_borrowings.
+
+    python -m benchmarks.pagination --rows 1000000 --page-size 100 --pages 1 100 1000 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import book_borrowing as borrowing_crud
+from app.database import Base
+from app.models import Book, BookBorrowing, User
+
+
+def seed(engine, rows: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"email": "reader@example.com", "first_name": "R", "last_name": "R", "password": "x"}])
+        conn.execute(insert(Book), [{"title": "Book", "author": "A", "quantity": rows, "available_quantity": 0}])
+        chunk = 50_000
+        for start in range(0, rows, chunk):
+            conn.execute(insert(BookBorrowing), [
+                {"book_id": 1, "user_id": 1, "is_returned": True} for _ in range(min(chunk, rows - start))
+            ])
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/pagination.db")
+        print(f"Seeding {args.rows:,} borrowing records...")
+        seed(engine, args.rows)
+        db = sessionmaker(bind=engine)()
+
+        print(f"{'page':>8} {'offset ms':>12} {'keyset ms':>12}")
+        for page in args.pages:
+            skip = (page - 1) * args.page_size
+            # The cursor of page N is the id of the last row on page N-1 (ids are dense here)
+            after = [skip] if page > 1 else None
+            offset_ms = timed(lambda: borrowing_crud.get_borrowings(db, skip=skip, limit=args.page_size), args.repeat)
+            keyset_ms = timed(lambda: borrowing_crud.get_borrowings(db, limit=args.page_size, after=after), args.repeat)
+            print(f"{page:>8} {offset_ms:>12.2f} {keyset_ms:>12.2f}")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# benchmarks/routes.py
+"""
+Load and latency benchmark of every API route, with regression checks against a baseline.
+
+Seeds a database with `--users`, `--books` and `--borrowings` (active loans), then serves
+main.app in-process through httpx's ASGI transport and drives each route in turn with
+`--requests` requests from `--concurrency` concurrent clients. Write routes get unique
+rows on every request (new emails, new (user, book) loans, loans not yet returned, ...).
+Reports throughput and p50/p95/p99 latency per route.
+
+    python -m benchmarks.routes --save-baseline         # record benchmarks/baseline.json
+    python -m benchmarks.routes --threshold 0.2         # exit 1 if a route got >20% worse
+
+Runs against a throwaway SQLite file by default. `--database-url` points it at another
+database, e.g. a local PostgreSQL; its tables are DROPPED and re-seeded, so use a scratch
+database. DATABASE_ASYNC=true measures the AsyncSession path. Repeated reads are served
+by the response cache; `--no-response-cache` measures the database path instead.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+PASSWORD = "password123"
+ADMIN_ID, LIBRARIAN_ID, FIRST_CUSTOMER = 1, 2, 3
+BATCH_SIZE = 5
+PAGE = 20
+
+
+class Context:
+    """Seed sizes, auth headers and the counters scenarios draw unique rows from."""
+
+    def __init__(self, users: int, books: int, borrowings: int, headers: Dict[str, dict]):
+        self.users = users
+        self.books = books
+        self.customers = users - FIRST_CUSTOMER + 1
+        self.headers = headers
+        self.loans = iter(range(1, borrowings + 1))  # seeded active loans, returned in id order
+        self.pairs = itertools.count(borrowings)  # seeded loans use the (user, book) pairs before this one
+        self.role_changes = itertools.count(FIRST_CUSTOMER)
+
+    def pair(self, index: int) -> tuple:
+        """The index-th (customer, book) pair; distinct for every index below customers * books."""
+        return FIRST_CUSTOMER + index % self.customers, 1 + (index // self.customers) % self.books
+
+    def new_loan(self) -> dict:
+        user_id, book_id = self.pair(next(self.pairs))
+        return {"user_id": user_id, "book_id": book_id}
+
+    def customer(self, i: int) -> int:
+        return FIRST_CUSTOMER + i % self.customers
+
+
+def _import_body(i: int) -> bytes:
+    rows = (json.dumps({"title": f"Imported {i}-{k}", "author": "Bench", "quantity": 1}) for k in range(50))
+    return "\n".join(rows).encode()
+
+
+# "METHOD path" of every API route -> request arguments for its i-th request, in run order
+SCENARIOS: Dict[str, Callable[[Context, int], dict]] = {
+    "GET /api/books/": lambda ctx, i: {"url": "/api/books/", "params": {"limit": PAGE, "skip": i % 10 * PAGE}},
+    "GET /api/books/search": lambda ctx, i: {"url": "/api/books/search", "params": {"q": f"Book {i * 7919 % ctx.books:06d}"}},
+    "GET /api/books/export": lambda ctx, i: {"url": "/api/books/export"},
+    "GET /api/users/": lambda ctx, i: {"url": "/api/users/", "params": {"limit": PAGE, "skip": i % 10 * PAGE}},
+    "GET /api/borrowings/": lambda ctx, i: {"url": "/api/borrowings/", "params": {"limit": PAGE, "skip": i % 10 * PAGE, "active": i % 2 == 0}},
+    "GET /api/borrowings/user/{user_id}": lambda ctx, i: {"url": f"/api/borrowings/user/{ctx.customer(i)}", "params": {"limit": PAGE}},
+    "GET /api/borrowings/user/{user_id}/history": lambda ctx, i: {"url": f"/api/borrowings/user/{ctx.customer(i)}/history",
+                                                         "params": {"limit": PAGE}},
+    "GET /api/borrowings/export": lambda ctx, i: {"url": "/api/borrowings/export", "params": {"user_id": ctx.customer(i)}},
+    "POST /api/users/register": lambda ctx, i: {"url": "/api/users/register", "json": {
+        "email": f"new{i}@example.com", "first_name": "New", "last_name": f"Reader {i}", "password": PASSWORD}},
+    "POST /api/users/login": lambda ctx, i: {"url": "/api/users/login", "json": {
+        "email": f"reader{ctx.customer(i)}@example.com", "password": PASSWORD}},
+    "PUT /api/users/{user_id}/role": lambda ctx, i: {"url": f"/api/users/{next(ctx.role_changes)}/role",
+                                                     "json": {"role": "librarian"}, "headers": ctx.headers["admin"]},
+    "POST /api/books/import": lambda ctx, i: {"url": "/api/books/import", "content": _import_body(i),
+                                              "headers": {**ctx.headers["librarian"], "Content-Type": "application/x-ndjson"}},
+    "POST /api/borrowings/": lambda ctx, i: {"url": "/api/borrowings/", "json": ctx.new_loan(), "headers": ctx.headers["librarian"]},
+    "POST /api/borrowings/batch": lambda ctx, i: {"url": "/api/borrowings/batch", "headers": ctx.headers["librarian"],
+                                                  "json": {"items": [ctx.new_loan() for _ in range(BATCH_SIZE)]}},
+    "PUT /api/borrowings/{borrowing_id}/return": lambda ctx, i: {"url": f"/api/borrowings/{next(ctx.loans)}/return"},
+    "PUT /api/borrowings/return-batch": lambda ctx, i: {"url": "/api/borrowings/return-batch",
+                                                        "json": {"borrowing_ids": list(itertools.islice(ctx.loans, BATCH_SIZE))}},
+    "GET /api/stats/books/most-borrowed": lambda ctx, i: {"url": "/api/stats/books/most-borrowed", "headers": ctx.headers["librarian"]},
+    "GET /api/stats/users/top": lambda ctx, i: {"url": "/api/stats/users/top", "headers": ctx.headers["librarian"]},
+    "GET /api/stats/users/{user_id}": lambda ctx, i: {"url": f"/api/stats/users/{ctx.customer(i)}", "headers": ctx.headers["librarian"]},
+    "GET /api/stats/utilization": lambda ctx, i: {"url": "/api/stats/utilization", "headers": ctx.headers["librarian"]},
+    "GET /api/stats/daily": lambda ctx, i: {"url": "/api/stats/daily", "headers": ctx.headers["librarian"]},
+    "GET /internal/db-pool": lambda ctx, i: {"url": "/internal/db-pool"},
+    "GET /internal/caches": lambda ctx, i: {"url": "/internal/caches"},
+    "GET /internal/replicas": lambda ctx, i: {"url": "/internal/replicas"},
+    "GET /internal/slow-queries": lambda ctx, i: {"url": "/internal/slow-queries"},
+    "GET /metrics": lambda ctx, i: {"url": "/metrics"},
+    "GET /health/live": lambda ctx, i: {"url": "/health/live"},
+    "GET /health/ready": lambda ctx, i: {"url": "/health/ready"},
+}
+
+
+def api_routes(app) -> List[str]:
+    """'METHOD path' of every documented route of the app (the framework's docs routes excluded)."""
+    from fastapi.routing import APIRoute
+
+    return [f"{method} {route.path}" for route in app.routes if isinstance(route, APIRoute) for method in sorted(route.methods)]
+
+
+def seed_database(users: int, books: int, borrowings: int) -> None:
+    from sqlalchemy import insert
+
+    from app.crud import circulation
+    from app.database import Base, SessionLocal, engine
+    from app.migrations import run_migrations
+    from app.models import Book, BookBorrowing, User
+
+    context = Context(users, books, borrowings, {})
+    loans = [context.pair(i) for i in range(borrowings)]
+    on_loan = Counter(book_id for _, book_id in loans)
+    quantity = users + borrowings  # enough copies that no borrow in the run fails for lack of stock
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"email": f"reader{i}@example.com", "first_name": "Avid", "last_name": f"Reader {i}", "password": PASSWORD,
+             "role": {ADMIN_ID: "admin", LIBRARIAN_ID: "librarian"}.get(i, "customer")}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(insert(Book), [
+            {"title": f"Book {i:06d}", "author": f"Author {i % 100}", "quantity": quantity,
+             "available_quantity": quantity - on_loan[i + 1]}
+            for i in range(books)
+        ])
+        if loans:
+            conn.execute(insert(BookBorrowing), [{"user_id": user_id, "book_id": book_id} for user_id, book_id in loans])
+    with SessionLocal() as db:
+        circulation.rebuild(db)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+async def drive(http, method: str, scenario: Callable[[Context, int], dict], ctx: Context,
+                requests: int, concurrency: int, warmup: int) -> dict:
+    latencies: List[float] = []
+    errors: List[str] = []
+    warming = iter(range(warmup))
+    remaining = iter(range(warmup, warmup + requests))
+
+    async def client():
+        for i in warming:
+            await http.request(method, **scenario(ctx, i))
+        for i in remaining:
+            arguments = scenario(ctx, i)
+            start = time.perf_counter()
+            response = await http.request(method, **arguments)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors.append(f"{response.status_code} {response.text[:200]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def run(users: int, books: int, borrowings: int, requests: int, concurrency: int,
+              warmup: int = 0, routes: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Seed the configured database and benchmark the selected routes (all by default)."""
+    import httpx
+
+    from app.database import async_engine
+    from app.security import create_access_token
+    from main import app
+
+    missing = set(api_routes(app)) - set(SCENARIOS)
+    if missing:
+        raise RuntimeError(f"No benchmark scenario for {sorted(missing)}")
+    seed_database(users, books, borrowings)
+    headers = {
+        role: {"Authorization": f"Bearer {create_access_token(user_id, role, 0)}"}
+        for role, user_id in (("admin", ADMIN_ID), ("librarian", LIBRARIAN_ID))
+    }
+    ctx = Context(users, books, borrowings, headers)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    # httpx's transport doesn't send lifespan events: run the startup and shutdown hooks here
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for key, scenario in SCENARIOS.items():
+            if routes and not any(selected in key for selected in routes):
+                continue
+            method = key.split(" ", 1)[0]
+            results[key] = await drive(http, method, scenario, ctx, requests, concurrency, warmup)
+    if async_engine is not None:
+        await async_engine.dispose()
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float, min_delta_ms: float) -> List[str]:
+    """
+    Routes slower than the baseline by more than `threshold` (a fraction).
+
+    Latencies regress when p50 or p95 grew by more than the threshold and by more than
+    `min_delta_ms` (so sub-millisecond jitter doesn't fail a run); throughput when req/s fell.
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if result[metric] > base[metric] * (1 + threshold) and result[metric] - base[metric] > min_delta_ms:
+                regressions.append(f"{key}: {metric} {base[metric]:.2f} -> {result[metric]:.2f}")
+        if result["rps"] < base["rps"] / (1 + threshold):
+            regressions.append(f"{key}: req/s {base['rps']:.0f} -> {result['rps']:.0f}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--borrowings", type=int, default=5000, help="active loans to seed")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per route")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--routes", nargs="+", help="only routes whose 'METHOD path' contains one of these")
+    parser.add_argument("--database-url", help="database to seed and use (its tables are dropped); a temporary SQLite file by default")
+    parser.add_argument("--no-response-cache", action="store_true")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown per route, as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    per_route = args.requests + args.warmup
+    customers = args.users - FIRST_CUSTOMER + 1
+    if customers < per_route:
+        parser.error(f"--users must be at least {per_route + FIRST_CUSTOMER - 1} (one role change per request)")
+    if args.borrowings < per_route * (1 + BATCH_SIZE):
+        parser.error(f"--borrowings must be at least {per_route * (1 + BATCH_SIZE)} (loans returned by the run)")
+    if customers * args.books < args.borrowings + per_route * (1 + BATCH_SIZE):
+        parser.error("--users x --books too small for the seeded and new loans")
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        parser.error(f"no baseline at {args.baseline}: record one with --save-baseline first")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/routes.db"
+        if args.no_response_cache:
+            os.environ["RESPONSE_CACHE_MAX_BYTES"] = "0"
+        results = asyncio.run(run(args.users, args.books, args.borrowings, args.requests,
+                                  args.concurrency, args.warmup, args.routes))
+
+    print(f"{args.requests} requests per route, {args.concurrency} concurrent clients")
+    print(f"{'route':<44} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for key, result in results.items():
+        print(f"{key:<44} {result['rps']:>8.0f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['errors']:>7}")
+    failed = {key: result["first_error"] for key, result in results.items() if result["errors"]}
+    for key, error in failed.items():
+        print(f"errors in {key}, first: {error}", file=sys.stderr)
+
+    config = {name: getattr(args, name) for name in ("users", "books", "borrowings", "requests", "concurrency", "no_response_cache")}
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"config": config, "routes": results}, f, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            print(f"warning: baseline was recorded with {baseline['config']}", file=sys.stderr)
+        regressions = compare(results, baseline["routes"], args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"no route regressed by more than {args.threshold:.0%} against {args.baseline}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/serialization.py
+"""
+Compare the per-row cost of the two list response pipelines.
+
+before: ORM entities -> FastAPI response_model validation (pydantic orm_mode) ->
+        jsonable_encoder -> stdlib json (JSONResponse)
+after:  column-only select -> plain dicts -> orjson (ORJSONResponse)
+
+Times serialization alone and query + serialization for pages of books, users and
+one user's borrowings (with embedded book and user) from a throwaway SQLite database.
+
+    python -m benchmarks.serialization --page-size 100 --repeat 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import joinedload, selectinload, sessionmaker
+
+from app.crud import book as book_crud, book_borrowing as borrowing_crud, user as user_crud
+from app.database import Base
+from app.models import Book, BookBorrowing, User
+from app.schemas.book import Book as BookSchema
+from app.schemas.book_borrowing import BookBorrowingDetail
+from app.schemas.user import User as UserSchema
+
+
+def seed(engine, rows: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"email": f"reader{i}@example.com", "first_name": "Avid", "last_name": f"Reader {i}", "password": "x"}
+            for i in range(rows)
+        ])
+        conn.execute(insert(Book), [
+            {"title": f"Book {i}", "author": f"Author {i % 50}", "quantity": 3, "available_quantity": 2} for i in range(rows)
+        ])
+        conn.execute(insert(BookBorrowing), [{"book_id": i + 1, "user_id": 1, "is_returned": False} for i in range(rows)])
+
+
+def per_row_us(fn, rows: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best / rows * 1e6
+
+
+def user_borrowing_entities(db, user_id: int, limit: int) -> List[BookBorrowing]:
+    """The ORM page the user borrowings route served before: loans with their book joined and user selectin-loaded."""
+    return (
+        db.query(BookBorrowing)
+        .filter(BookBorrowing.user_id == user_id, BookBorrowing.is_returned == False)
+        .options(joinedload(BookBorrowing.book), selectinload(BookBorrowing.user))
+        .order_by(BookBorrowing.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    size = args.page_size
+    loop = asyncio.new_event_loop()
+
+    def before(schema, rows) -> bytes:
+        field = create_response_field(name="response", type_=List[schema])
+        content = loop.run_until_complete(serialize_response(field=field, response_content=rows))
+        return JSONResponse(content).body
+
+    def after(rows) -> bytes:
+        return ORJSONResponse(rows).body
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/serialization.db")
+        seed(engine, size)
+        db = sessionmaker(bind=engine)()
+
+        cases = [
+            ("books", BookSchema,
+             lambda: book_crud.get_books(db, limit=size), lambda: book_crud.get_book_rows(db, limit=size)),
+            ("users", UserSchema,
+             lambda: user_crud.get_users(db, limit=size), lambda: user_crud.get_user_rows(db, limit=size)),
+            ("user borrowings", BookBorrowingDetail,
+             lambda: user_borrowing_entities(db, 1, size),
+             lambda: borrowing_crud.get_user_borrowing_rows(db, 1, limit=size)),
+        ]
+        print(f"{size}-row pages, best of {args.repeat}, microseconds per row")
+        print(f"{'endpoint':<16} {'serialize before':>17} {'after':>8} {'query+serialize before':>23} {'after':>8}")
+        for name, schema, orm_page, row_page in cases:
+            entities, rows = orm_page(), row_page()
+            assert before(schema, entities) == JSONResponse(jsonable_encoder([schema(**row) for row in rows])).body
+            serialize_before = per_row_us(lambda: before(schema, entities), size, args.repeat)
+            serialize_after = per_row_us(lambda: after(rows), size, args.repeat)
+
+            def full_before():
+                db.expunge_all()
+                before(schema, orm_page())
+
+            total_before = per_row_us(full_before, size, args.repeat)
+            total_after = per_row_us(lambda: after(row_page()), size, args.repeat)
+            print(f"{name:<16} {serialize_before:>17.2f} {serialize_after:>8.2f} {total_before:>23.2f} {total_after:>8.2f}")
+        db.close()
+        engine.dispose()
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
-from app.database import Base, engine
+from app.database import Base, SessionLocal, engine
 from app.models.user import User
-from app.models.book import Book
+from app.models.book import Book, create_search_index
+from app.models.book_borrowing import BookBorrowing
+from app.migrations import run_migrations
+from app.crud import circulation
+from app.models.circulation import BookCirculation
 from sqlalchemy import inspect
 
 def main():
@@ -14,8 +18,22 @@ def main():
     else:
         print("No existing tables found in database")
     
+    print("Applying schema migrations to existing tables...")
+    run_migrations()
+
     print("Creating any missing database tables...")
     Base.metadata.create_all(bind=engine)
+
+    # Tables that already existed don't get their after_create hooks, so (re)install the search index
+    if "books" in existing_tables:
+        print("Building the book search index...")
+        with engine.begin() as connection:
+            create_search_index(connection)
+    # Rollups created next to an existing loan history start empty: count it once
+    if "book_borrowings" in existing_tables and BookCirculation.__tablename__ not in existing_tables:
+        print("Building circulation statistics...")
+        with SessionLocal() as db:
+            circulation.rebuild(db)
     print("Database tables are now up to date!")
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+import argparse
+import sys
+import time
+
+from app.book_import import FORMATS, InvalidImport, import_books
+from app.config import IMPORT_CHUNK_SIZE
+from app.database import SessionLocal
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import a CSV or NDJSON book catalog")
+    parser.add_argument("path", help="catalog file, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension (.csv, .ndjson/.jsonl)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="rows written per transaction")
+    args = parser.parse_args()
+
+    format = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    started = time.perf_counter()
+
+    def progress(report):
+        elapsed = time.perf_counter() - started
+        print(f"{report.rows} rows read, {report.inserted} inserted, {report.updated} updated, "
+              f"{report.failed} failed ({report.rows / elapsed:.0f} rows/s)", flush=True)
+
+    source = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    db = SessionLocal()
+    try:
+        report = import_books(db, iter(lambda: source.read(1 << 16), b""), format, args.chunk_size, progress)
+    except InvalidImport as e:
+        sys.exit(f"Import failed: {e}")
+    finally:
+        db.close()
+        source.close()
+
+    for error in report.errors:
+        print(f"line {error.line}: {error.error}")
+    if report.failed > len(report.errors):
+        print(f"... and {report.failed - len(report.errors)} more rejected rows")
+    print(f"Imported {report.rows - report.failed} of {report.rows} rows in {time.perf_counter() - started:.1f}s "
+          f"({report.inserted} new books, {report.updated} merged)")
+
+if __name__ == "__main__":
+    main()
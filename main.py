@@ -1,22 +1,42 @@
+# Imported first: its clock measures this worker's cold start
+from app.lifecycle import lifecycle
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import engine, Base
-from app.api.routes import borrowings, users, books
-
+from app.admission import AdmissionMiddleware
+from app.cache import invalidation_backend
+from app.database import async_engine, SessionLocal
+from app.api.routes import borrowings, users, books, health, internal, metrics, stats
+from app.idempotency import REPLAYED_HEADER, IdempotencyMiddleware
+from app.instrumentation import TimingMiddleware
+from app.loan_archive import loan_archiver
+from app.reconciliation import reconciler
+from app.replicas import replicas
+from app.crud.user import load_token_versions
 
-Base.metadata.create_all(bind=engine)
+# The schema is created and migrated by create_tables.py (or run.py --create-tables), once,
+# not by every worker on import
 
 app = FastAPI(title="Bookstore API")
 
 origins = ["*"]
 
+# Inside TimingMiddleware, so replayed responses are timed too
+app.add_middleware(IdempotencyMiddleware)
+# Outside IdempotencyMiddleware, so shed requests cost no key lookup; inside TimingMiddleware,
+# so they are counted in the request metrics
+app.add_middleware(AdmissionMiddleware, router=app.router)
+app.add_middleware(TimingMiddleware)
+# Added last, so it is the outermost layer: refusals from the middleware above (503/429 from
+# admission control, 409/413/422 from idempotency) carry CORS headers like routed responses
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After", REPLAYED_HEADER],
 )
 
 
@@ -24,3 +44,69 @@ app.add_middleware(
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(books.router, prefix="/api/books", tags=["books"])
 app.include_router(borrowings.router, prefix="/api/borrowings", tags=["borrowings"])
+app.include_router(stats.router, prefix="/api/stats", tags=["stats"])
+app.include_router(internal.router, prefix="/internal", tags=["internal"])
+app.include_router(metrics.router, tags=["internal"])
+app.include_router(health.router, prefix="/health", tags=["internal"])
+
+lifecycle.mark_imported()
+
+
+@app.on_event("startup")
+def start_cache_invalidation():
+    # Before seeding anything from the database, so no invalidation published meanwhile is missed
+    invalidation_backend.start()
+
+
+@app.on_event("startup")
+def load_revoked_tokens():
+    # Tokens issued before a user's last role change stay rejected across restarts
+    with SessionLocal() as db:
+        load_token_versions(db)
+
+
+@app.on_event("startup")
+def check_replicas():
+    # Probe the read replicas before taking traffic, then keep checking in the background
+    replicas.start()
+
+
+@app.on_event("startup")
+def start_loan_archive():
+    # Moves old returned loans out of book_borrowings every ARCHIVE_INTERVAL seconds
+    loan_archiver.start()
+
+
+@app.on_event("startup")
+def start_availability_reconciliation():
+    # Fixes drifted available_quantity every RECONCILE_INTERVAL seconds
+    reconciler.start()
+
+
+@app.on_event("startup")
+def mark_ready():
+    # Registered last, so the worker reports ready only after every other startup hook ran
+    lifecycle.mark_ready()
+
+
+@app.on_event("shutdown")
+def stop_loan_archive():
+    loan_archiver.stop()
+
+
+@app.on_event("shutdown")
+def stop_availability_reconciliation():
+    reconciler.stop()
+
+
+@app.on_event("shutdown")
+def stop_cache_invalidation():
+    invalidation_backend.stop()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    # aiosqlite/asyncpg connections must be closed on the event loop that opened them
+    if async_engine is not None:
+        await async_engine.dispose()
+    await replicas.aclose()
@@ -0,0 +1,26 @@
+import argparse
+import time
+
+from app.config import STATS_REBUILD_CHUNK_DAYS, STATS_REBUILD_CHUNK_SIZE
+from app.crud import circulation
+from app.database import SessionLocal
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the circulation statistics rollups from the loan history")
+    parser.add_argument("--chunk-size", type=int, default=STATS_REBUILD_CHUNK_SIZE, help="book or user ids recomputed per transaction")
+    parser.add_argument("--chunk-days", type=int, default=STATS_REBUILD_CHUNK_DAYS, help="days of daily counts recomputed per transaction")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def progress(table, rows):
+        if rows:
+            print(f"{table}: {rows} rows ({time.perf_counter() - started:.1f}s)", flush=True)
+
+    with SessionLocal() as db:
+        written = circulation.rebuild(db, chunk_size=args.chunk_size, chunk_days=args.chunk_days, progress=progress)
+    print(f"Rebuilt {', '.join(f'{table} ({rows} rows)' for table, rows in written.items())} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import argparse
+import time
+
+from app.config import RECONCILE_BATCH_PAUSE, RECONCILE_BATCH_SIZE
+from app.reconciliation import AvailabilityReconciler
+
+def main():
+    parser = argparse.ArgumentParser(description="Fix books whose available_quantity drifted from quantity minus active loans")
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE, help="books checked per transaction")
+    parser.add_argument("--pause", type=float, default=RECONCILE_BATCH_PAUSE, help="seconds to wait between batches")
+    parser.add_argument("--dry-run", action="store_true", help="only report the drifted books")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def progress(checked, mismatches):
+        for mismatch in mismatches:
+            print(f"book {mismatch['book_id']}: available_quantity {mismatch['available_quantity']}, "
+                  f"expected {mismatch['expected']}", flush=True)
+
+    reconciler = AvailabilityReconciler(batch_size=args.batch_size, pause=args.pause, fix=not args.dry_run)
+    report = reconciler.run(progress=progress)
+    outcome = "reported" if args.dry_run else f"{report['fixed']} fixed"
+    print(f"Checked {report['checked']} books in {time.perf_counter() - started:.1f}s: "
+          f"{report['mismatched']} drifted, {outcome}")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,29 @@
+import argparse
+
 import uvicorn
 
+from app.config import DRAIN_SECONDS, GRACEFUL_TIMEOUT, SERVER_HOST, SERVER_PORT, WEB_CONCURRENCY
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Bookstore API (development server with reload by default).")
+    parser.add_argument("--prod", action="store_true", help="multi-worker production mode, no reload")
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY, help="worker processes in --prod mode")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--create-tables", action="store_true",
+                        help="create and migrate the schema once (create_tables.py) before the workers start")
+    args = parser.parse_args()
+
+    if args.create_tables:
+        import create_tables
+        create_tables.main()
+
+    if not args.prod:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    from app.server import serve
+    serve("main:app", args.host, args.port, args.workers, DRAIN_SECONDS, GRACEFUL_TIMEOUT)
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=5000, reload=True)
\ No newline at end of file
+    main()
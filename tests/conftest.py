@@ -0,0 +1,51 @@
+# tests/conftest.py
+import os
+import sys
+
+# Point the application engine at the same SQLite file the tests use
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.crud.user import user_cache
+from app.database import Base, SessionLocal, engine, get_db
+from app.response_cache import response_cache
+from app.security import create_access_token, token_versions
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+from main import app
+
+
+@pytest.fixture(scope="function")
+def db_session():
+    Base.metadata.create_all(bind=engine)
+    user_cache.clear()
+    response_cache.clear()
+    token_versions.clear()
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        user_cache.clear()
+        response_cache.clear()
+        token_versions.clear()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="function")
+def client(db_session):
+    app.dependency_overrides[get_db] = lambda: db_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture(scope="function")
+def auth_headers():
+    """Build the Authorization header of a freshly issued token for a user row."""
+    def make(user):
+        token = create_access_token(user.id, user.role, user.token_version or 0)
+        return {"Authorization": f"Bearer {token}"}
+    return make
@@ -0,0 +1,84 @@
+# tests/test_active_loans.py
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app.crud import book_borrowing as borrowing_crud
+from app.migrations import run_migrations
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User
+from app.schemas.book_borrowing import BookBorrowingCreate
+
+from tests.test_borrowing_queries import count_statements
+
+
+@pytest.fixture(scope="function")
+def loan(db_session):
+    reader = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    book = Book(title="Dune", author="Frank Herbert", quantity=3, available_quantity=3)
+    db_session.add_all([reader, book])
+    db_session.commit()
+    return reader.id, book.id
+
+
+def test_second_active_loan_is_rejected_by_the_index(db_session, loan):
+    user_id, book_id = loan
+    db_session.add_all([BookBorrowing(user_id=user_id, book_id=book_id, is_returned=True) for _ in range(2)])
+    db_session.add(BookBorrowing(user_id=user_id, book_id=book_id))
+    db_session.commit()
+
+    db_session.add(BookBorrowing(user_id=user_id, book_id=book_id))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+
+
+def test_borrow_does_not_scan_loan_history(db_session, loan):
+    user_id, book_id = loan
+    borrowing_crud.borrow_book(db_session, BookBorrowingCreate(user_id=user_id, book_id=book_id))
+    with count_statements() as statements:
+        with pytest.raises(borrowing_crud.BorrowingError) as error:
+            borrowing_crud.borrow_book(db_session, BookBorrowingCreate(user_id=user_id, book_id=book_id))
+    assert error.value.status_code == 400
+    # The user is cached: only the conditional UPDATE and the INSERT reach the database
+    assert [statement.split()[0] for statement in statements] == ["UPDATE", "INSERT"]
+    db_session.expire_all()
+    assert db_session.get(Book, book_id).available_quantity == 2
+
+
+def test_loan_listings_use_the_composite_indexes(db_session, loan):
+    with db_session.get_bind().connect() as connection:
+        plans = [
+            " ".join(row[-1] for row in connection.execute(text("EXPLAIN QUERY PLAN " + sql)))
+            for sql in (
+                "SELECT id FROM book_borrowings WHERE user_id = 1 AND is_returned = 0 AND id > 5 ORDER BY id",
+                "SELECT id FROM book_borrowings WHERE is_returned = 0 AND id > 5 ORDER BY id",
+            )
+        ]
+    assert "ix_book_borrowings_user_id_is_returned" in plans[0]
+    assert "ix_book_borrowings_is_returned" in plans[1]
+    assert "TEMP B-TREE" not in " ".join(plans)
+
+
+def test_migration_closes_duplicate_loans_before_adding_the_index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR, author VARCHAR, "
+                                "quantity INTEGER, available_quantity INTEGER)"))
+        connection.execute(text("CREATE TABLE book_borrowings (id INTEGER PRIMARY KEY, book_id INTEGER, "
+                                "user_id INTEGER, is_returned BOOLEAN)"))
+        connection.execute(text("INSERT INTO books VALUES (1, 'Dune', 'Frank Herbert', 5, 1)"))
+        connection.execute(text("INSERT INTO book_borrowings (book_id, user_id, is_returned) VALUES "
+                                "(1, 7, 0), (1, 7, 0), (1, 7, 1), (1, 7, 0), (1, 8, 0)"))
+
+    run_migrations(engine)
+    run_migrations(engine)
+
+    with engine.connect() as connection:
+        active = connection.execute(text("SELECT id FROM book_borrowings WHERE is_returned = 0 ORDER BY id")).scalars().all()
+        available = connection.execute(text("SELECT available_quantity FROM books")).scalar()
+    assert active == [1, 5]
+    assert available == 3
+    assert "uq_book_borrowings_active_loan" in {index["name"] for index in inspect(engine).get_indexes("book_borrowings")}
+    engine.dispose()
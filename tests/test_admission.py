@@ -0,0 +1,111 @@
+# tests/test_admission.py
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.admission import (
+    CHEAP, EXPENSIVE, EXPENSIVE_ROUTES, REQUESTS_SHED, STANDARD, AdmissionMiddleware, RateLimiter, route_priority
+)
+from app.db_pool import ENGINES, InstrumentedQueuePool, instrument, pool_pressure
+from app.security import create_access_token
+from main import app as main_app
+
+
+def _app(**options):
+    async def handler(request):
+        await asyncio.sleep(0.1)
+        return JSONResponse({"ok": True})
+
+    app = Starlette(routes=[
+        Route("/api/books/", handler),
+        Route("/api/borrowings/", handler, methods=["POST"]),
+        Route("/api/books/export", handler),
+        Route("/health/live", handler),
+    ])
+    return AdmissionMiddleware(app, router=app.router, **options)
+
+
+def _send(app, *requests):
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            return await asyncio.gather(*(http.request(method, url, **kw) for method, url, kw in requests))
+    return asyncio.run(send())
+
+
+def test_routes_are_prioritised():
+    routes = {f"{method} {route.path}" for route in main_app.routes for method in getattr(route, "methods", ())}
+    assert EXPENSIVE_ROUTES <= routes
+    assert route_priority("GET", "/api/books/") == route_priority("GET", "/api/books/search") == CHEAP
+    assert route_priority("POST", "/api/borrowings/") == route_priority("GET", "/api/stats/daily") == STANDARD
+    assert route_priority("GET", "/api/books/export") == EXPENSIVE
+
+
+def test_saturated_pool_sheds_expensive_routes_first():
+    waiting = {"primary": (0, 0.0)}
+    app = _app(max_pool_waiting=10, max_pool_wait=0.2, pools=lambda: waiting)
+    requests = [("GET", "/api/books/export", {}), ("POST", "/api/borrowings/", {}), ("GET", "/api/books/", {}),
+                ("GET", "/health/live", {})]
+    statuses = lambda: [r.status_code for r in _send(app, *requests)]  # noqa: E731
+    before = REQUESTS_SHED.value(method="POST", route="/api/borrowings/", priority=STANDARD, reason="pool_saturated")
+
+    assert statuses() == [200, 200, 200, 200]
+    waiting["primary"] = (5, 0.0)
+    assert statuses() == [503, 200, 200, 200]
+    waiting["primary"] = (2, 0.25)  # few waiters, but each waited long
+    assert statuses() == [503, 503, 200, 200]
+    waiting["primary"] = (20, 0.0)
+    shed = _send(app, *requests)
+    assert [r.status_code for r in shed] == [503, 503, 503, 200]
+    assert shed[0].headers["Retry-After"] == "1" and shed[0].json() == {"detail": "Service is overloaded"}
+    assert REQUESTS_SHED.value(method="POST", route="/api/borrowings/", priority=STANDARD, reason="pool_saturated") == before + 2
+
+
+def test_expensive_routes_run_a_bounded_number_at_a_time():
+    app = _app(expensive_concurrency=1, route_concurrency=2)
+    export = ("GET", "/api/books/export", {})
+    assert sorted(r.status_code for r in _send(app, export, export)) == [200, 503]
+    assert [r.status_code for r in _send(app, export)] == [200]
+    books = ("GET", "/api/books/", {})
+    assert sorted(r.status_code for r in _send(app, books, books, books)) == [200, 200, 503]
+
+
+def test_clients_are_rate_limited():
+    app = _app(rate=1, burst=2)
+    tokens = [{"headers": {"Authorization": f"Bearer {create_access_token(user_id, 'user', 0)}"}} for user_id in (1, 2)]
+    responses = _send(app, *[("GET", "/api/books/", tokens[0])] * 3, ("GET", "/api/books/", tokens[1]))
+    assert [r.status_code for r in responses] == [200, 200, 429, 200]
+    assert responses[2].headers["Retry-After"] == "1"
+
+    limiter = RateLimiter(rate=2, burst=1, max_clients=1)
+    assert limiter.take("a", now=0) == 0 and limiter.take("a", now=0.25) == pytest.approx(0.25)
+    assert limiter.take("a", now=0.5) == 0
+    limiter.take("b", now=0.5)  # a is forgotten
+    assert limiter.take("a", now=0.5) == 0
+
+
+def test_pool_pressure_reports_queued_checkouts():
+    probe = create_engine("sqlite:///./test.db", poolclass=InstrumentedQueuePool, pool_size=1,
+                          max_overflow=0, pool_timeout=1, pool_logging_name="queued")
+    instrument(probe, "queued")
+
+    async def queue_behind_held_connection():
+        held = probe.connect()
+        waiter = asyncio.get_running_loop().run_in_executor(None, probe.connect)
+        await asyncio.sleep(0.1)
+        queued = pool_pressure()["queued"]
+        held.close()
+        (await waiter).close()
+        return queued
+
+    try:
+        assert asyncio.run(queue_behind_held_connection())[0] == 1
+        waiting, recent_wait = pool_pressure()["queued"]
+        assert waiting == 0 and recent_wait >= 0.1 * 0.2
+    finally:
+        probe.dispose()
+        ENGINES.pop("queued")
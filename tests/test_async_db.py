@@ -0,0 +1,56 @@
+# tests/test_async_db.py
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.database import engine, get_db, to_async_url
+from app.models.book import Book
+from app.models.user import User, UserRole
+from main import app
+
+
+@pytest.fixture(scope="function")
+def async_client(db_session):
+    """Serve the app from AsyncSessions on aiosqlite, as with DATABASE_ASYNC=true"""
+    async_engine = create_async_engine(to_async_url(str(engine.url)), poolclass=NullPool)
+    AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    sessions = []
+
+    async def override_get_db():
+        async with AsyncTestingSessionLocal() as db:
+            sessions.append(db)
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as client:
+        yield client
+    app.dependency_overrides.clear()
+    assert sessions and all(isinstance(db, AsyncSession) for db in sessions)
+
+
+def test_async_session_routes(async_client, db_session):
+    librarian = User(email="lib@example.com", first_name="Lib", last_name="Rarian",
+                     password="password123", role=UserRole.LIBRARIAN)
+    book = Book(title="Middlemarch", author="George Eliot", quantity=2, available_quantity=2)
+    db_session.add_all([librarian, book])
+    db_session.commit()
+
+    patron = async_client.post("/api/users/register", json={
+        "email": "reader@example.com", "first_name": "Avid", "last_name": "Reader", "password": "password123"
+    }).json()
+    assert async_client.post("/api/users/login", json={"email": "reader@example.com", "password": "password123"}).status_code == 200
+    token = async_client.post("/api/users/login", json={"email": "lib@example.com", "password": "password123"}).json()["access_token"]
+
+    response = async_client.post("/api/borrowings/", headers={"Authorization": f"Bearer {token}"}, json={
+        "book_id": book.id, "user_id": patron["id"]
+    })
+    assert response.status_code == 200
+
+    loans = async_client.get(f"/api/borrowings/user/{patron['id']}").json()
+    assert [(loan["book"]["title"], loan["user"]["email"]) for loan in loans] == [("Middlemarch", "reader@example.com")]
+    assert async_client.get("/api/books/search", params={"q": "middlemarch"}).json()[0]["available_quantity"] == 1
+
+    assert async_client.put(f"/api/borrowings/{loans[0]['id']}/return").status_code == 200
+    assert async_client.get("/api/books/").json()[0]["available_quantity"] == 2
+    assert len(async_client.get("/api/users/").json()) == 2
@@ -0,0 +1,92 @@
+# tests/test_auth_tokens.py
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.migrations import run_migrations
+from app.models.user import User, UserRole
+from app.security import InvalidToken, create_access_token, decode_access_token
+
+from tests.test_borrowing_queries import count_statements
+
+
+@pytest.fixture(scope="function")
+def staff(db_session):
+    admin = User(email="admin@example.com", first_name="Ada", last_name="Admin", password="password123", role=UserRole.ADMIN)
+    clerk = User(email="clerk@example.com", first_name="Cle", last_name="Rk", password="password123", role=UserRole.LIBRARIAN)
+    db_session.add_all([admin, clerk])
+    db_session.commit()
+    return admin, clerk
+
+
+def _login(client, email):
+    response = client.post("/api/users/login", json={"email": email, "password": "password123"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_login_issues_verifiable_token(client, staff):
+    admin, _ = staff
+    data = _login(client, "admin@example.com")
+    assert data["email"] == "admin@example.com" and data["token_type"] == "bearer"
+
+    with count_statements() as statements:
+        payload = decode_access_token(data["access_token"])
+    assert statements == []
+    assert (payload.sub, payload.role, payload.ver) == (admin.id, UserRole.ADMIN, 0)
+
+
+def test_tampered_and_expired_tokens_are_rejected():
+    token = create_access_token(1, UserRole.CUSTOMER, 0)
+    header, payload, signature = token.split(".")
+    forged = create_access_token(1, UserRole.ADMIN, 0).split(".")[1]
+    for bad in (f"{header}.{forged}.{signature}", "garbage", create_access_token(1, UserRole.ADMIN, 0, ttl=-1)):
+        with pytest.raises(InvalidToken):
+            decode_access_token(bad)
+
+
+def test_role_change_revokes_existing_tokens(client, staff):
+    _, clerk = staff
+    admin_token = _login(client, "admin@example.com")["access_token"]
+    clerk_token = _login(client, "clerk@example.com")["access_token"]
+
+    response = client.put(f"/api/users/{clerk.id}/role", json={"role": "customer"},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+
+    response = client.post("/api/borrowings/batch", json={"items": []}, headers={"Authorization": f"Bearer {clerk_token}"})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked"
+    assert decode_access_token(_login(client, "clerk@example.com")["access_token"]).ver == 1
+
+
+def test_role_update_requires_admin_token(client, staff):
+    admin, clerk = staff
+    clerk_token = _login(client, "clerk@example.com")["access_token"]
+    admin_token = _login(client, "admin@example.com")["access_token"]
+
+    assert client.put(f"/api/users/{clerk.id}/role", json={"role": "admin"}).status_code == 401
+    response = client.put(f"/api/users/{admin.id}/role", json={"role": "customer"},
+                          headers={"Authorization": f"Bearer {clerk_token}"})
+    assert response.status_code == 403
+    # The deprecated admin_id is still accepted, but only if it names the token's user
+    response = client.put(f"/api/users/{clerk.id}/role", json={"role": "admin", "admin_id": clerk.id},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 403
+    response = client.put(f"/api/users/{clerk.id}/role", json={"role": "admin", "admin_id": admin.id},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+
+
+def test_migration_adds_token_version_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, role VARCHAR)"))
+        connection.execute(text("INSERT INTO users (email, role) VALUES ('old@example.com', 'admin')"))
+
+    run_migrations(engine)
+    run_migrations(engine)
+
+    assert "token_version" in {column["name"] for column in inspect(engine).get_columns("users")}
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT token_version FROM users")).scalar() == 0
+    engine.dispose()
@@ -0,0 +1,28 @@
+# tests/test_benchmarks.py
+import asyncio
+
+from benchmarks.routes import SCENARIOS, api_routes, compare, run
+from main import app
+
+
+def test_every_route_has_a_scenario():
+    assert set(api_routes(app)) == set(SCENARIOS)
+
+
+def test_smoke_run_has_no_errors(db_session):
+    results = asyncio.run(run(users=20, books=20, borrowings=40, requests=3, concurrency=2, warmup=1))
+    assert set(results) == set(SCENARIOS)
+    assert {key: result["first_error"] for key, result in results.items() if result["errors"]} == {}
+    assert all(result["requests"] == 3 and result["p50_ms"] <= result["p99_ms"] for result in results.values())
+
+
+def test_compare_flags_slower_routes_only():
+    baseline = {"GET /a": {"p50_ms": 10.0, "p95_ms": 20.0, "rps": 100.0},
+                "GET /b": {"p50_ms": 0.2, "p95_ms": 0.3, "rps": 1000.0}}
+    results = {"GET /a": {"p50_ms": 11.0, "p95_ms": 30.0, "rps": 70.0},
+               "GET /b": {"p50_ms": 0.5, "p95_ms": 0.9, "rps": 950.0},  # slower, but by less than 1 ms
+               "GET /new": {"p50_ms": 1.0, "p95_ms": 1.0, "rps": 1.0}}
+    assert compare(results, baseline, threshold=0.2, min_delta_ms=1.0) == [
+        "GET /a: p95_ms 20.00 -> 30.00",
+        "GET /a: req/s 100 -> 70",
+    ]
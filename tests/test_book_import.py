@@ -0,0 +1,88 @@
+# tests/test_book_import.py
+import json
+
+import pytest
+
+from app.book_import import InvalidImport, import_books
+from app.models.book import Book
+from app.models.user import User, UserRole
+
+
+@pytest.fixture(scope="function")
+def librarian(db_session):
+    user = User(email="lib@example.com", first_name="Lib", last_name="Rarian", password="password123", role=UserRole.LIBRARIAN)
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+def _catalog(db):
+    db.expire_all()
+    return sorted(((b.title, b.author, b.quantity, b.available_quantity) for b in db.query(Book)),
+                  key=lambda book: (book[0], book[1] or ""))
+
+
+def test_csv_import_merges_by_title_and_author(db_session):
+    db_session.add(Book(title="Dune", author="Frank Herbert", quantity=2, available_quantity=1))
+    db_session.commit()
+    data = (
+        "﻿title,author,quantity,available_quantity\r\n"
+        "Dune,Frank Herbert,3,3\r\n"
+        '"Dune, Messiah",Frank Herbert,1,\r\n'
+        "Dune,,2,2\r\n"
+        '"Multi\nline",Anon,1,1\r\n'
+        ",Nobody,1,1\r\n"
+        "Emma,Jane Austen,2,5\r\n"
+        "Dune,Frank Herbert,1,0\r\n"
+    ).encode()
+    # Feed the bytes in tiny pieces so records and multi-byte characters straddle chunks
+    pieces = [data[i:i + 7] for i in range(0, len(data), 7)]
+    progress = []
+    report = import_books(db_session, pieces, "csv", chunk_size=2, progress=lambda r: progress.append(r.rows))
+
+    assert (report.rows, report.failed) == (7, 2)
+    assert [(e.line, e.error) for e in report.errors] == [
+        (7, "title is required"),
+        (8, "quantities must satisfy 0 <= available_quantity <= quantity"),
+    ]
+    assert progress == sorted(progress) and len(progress) == 3
+    assert _catalog(db_session) == [
+        ("Dune", None, 2, 2),
+        ("Dune", "Frank Herbert", 6, 4),
+        ("Dune, Messiah", "Frank Herbert", 1, 1),
+        ("Multi\nline", "Anon", 1, 1),
+    ]
+
+
+def test_csv_without_title_column_is_rejected(db_session):
+    with pytest.raises(InvalidImport):
+        import_books(db_session, [b"name,author\nDune,Frank Herbert\n"], "csv")
+
+
+def test_import_endpoint_streams_ndjson(client, db_session, librarian, auth_headers):
+    lines = [json.dumps({"title": f"Book {i:05d}", "author": "Author", "quantity": 2}) for i in range(25)]
+    body = "\n".join(lines + ["not json", json.dumps(["a", "list"])]).encode()
+
+    response = client.post("/api/books/import", params={"chunk_size": 10}, content=body,
+                           headers={**auth_headers(librarian), "Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["rows"], report["inserted"], report["updated"], report["failed"]) == (27, 25, 0, 2)
+    assert [e["line"] for e in report["errors"]] == [26, 27]
+
+    response = client.post("/api/books/import", params={"format": "ndjson"}, content=body, headers=auth_headers(librarian))
+    assert (response.json()["inserted"], response.json()["updated"]) == (0, 25)
+    assert db_session.query(Book).filter(Book.quantity == 4, Book.available_quantity == 4).count() == 25
+    # The imported titles are searchable straight away
+    assert client.get("/api/books/search", params={"q": "00024"}).json()[0]["title"] == "Book 00024"
+
+
+def test_import_endpoint_requires_staff_and_a_format(client, db_session, librarian, auth_headers):
+    patron = User(email="patron@example.com", first_name="Pat", last_name="Ron", password="password123")
+    db_session.add(patron)
+    db_session.commit()
+
+    assert client.post("/api/books/import", content=b"title\nDune\n").status_code == 401
+    assert client.post("/api/books/import", content=b"title\nDune\n", headers=auth_headers(patron)).status_code == 403
+    response = client.post("/api/books/import", content=b"title\nDune\n", headers=auth_headers(librarian))
+    assert response.status_code == 400
@@ -0,0 +1,36 @@
+# tests/test_book_search.py
+from app.crud import book as book_crud
+from app.models.book import Book
+from app.schemas.book import BookUpdate
+
+
+def _seed(db):
+    books = [
+        Book(title="Harry Potter and the Philosopher's Stone", author="J. K. Rowling", quantity=1, available_quantity=1),
+        Book(title="The Hobbit", author="J. R. R. Tolkien", quantity=1, available_quantity=1),
+        Book(title="Pride and Prejudice", author="Jane Austen", quantity=1, available_quantity=1),
+    ]
+    db.add_all(books)
+    db.commit()
+    return books
+
+
+def test_search_ranks_and_tolerates_typos(client, db_session):
+    potter, hobbit, _ = _seed(db_session)
+
+    assert [b["id"] for b in client.get("/api/books/search", params={"q": "hobbit"}).json()] == [hobbit.id]
+    assert client.get("/api/books/search", params={"q": "tolkien"}).json()[0]["id"] == hobbit.id
+    # Misspelled words still find the book, best match first
+    assert client.get("/api/books/search", params={"q": "hary poter"}).json()[0]["id"] == potter.id
+    assert client.get("/api/books/search", params={"q": "zz"}).json() == []
+
+
+def test_search_index_follows_crud_writes(db_session):
+    potter, hobbit, _ = _seed(db_session)
+
+    book_crud.update_book(db_session, hobbit.id, BookUpdate(title="The Silmarillion"))
+    assert book_crud.search_books(db_session, "hobbit") == []
+    assert [b.id for b in book_crud.search_books(db_session, "silmarillion")] == [hobbit.id]
+
+    book_crud.delete_book(db_session, potter.id)
+    assert book_crud.search_books(db_session, "potter") == []
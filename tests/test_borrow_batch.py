@@ -0,0 +1,68 @@
+# tests/test_borrow_batch.py
+import pytest
+
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User, UserRole
+
+
+@pytest.fixture(scope="function")
+def desk(db_session):
+    librarian = User(email="desk@example.com", first_name="Desk", last_name="Clerk",
+                     password="password123", role=UserRole.LIBRARIAN)
+    patron = User(email="patron@example.com", first_name="Pat", last_name="Ron",
+                  password="password123", role=UserRole.CUSTOMER)
+    books = [Book(title=f"Book {i}", author="Author", quantity=1, available_quantity=1) for i in range(3)]
+    db_session.add_all([librarian, patron, *books])
+    db_session.commit()
+    return librarian, patron, books
+
+
+def test_borrow_batch_reports_each_item(client, db_session, desk, auth_headers):
+    librarian, patron, books = desk
+    response = client.post("/api/borrowings/batch", headers=auth_headers(librarian), json={
+        "items": [
+            {"book_id": books[0].id, "user_id": patron.id},
+            {"book_id": books[1].id, "user_id": patron.id},
+            {"book_id": books[1].id, "user_id": librarian.id},  # last copy already taken in this batch
+            {"book_id": 999, "user_id": patron.id},
+            {"book_id": books[2].id, "user_id": 999},
+        ],
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["succeeded"], data["failed"]) == (2, 3)
+    assert [r["status_code"] for r in data["results"]] == [200, 200, 400, 404, 404]
+    assert all(r["borrowing_id"] for r in data["results"][:2])
+
+    db_session.expire_all()
+    assert [db_session.get(Book, b.id).available_quantity for b in books] == [0, 0, 1]
+    assert db_session.query(BookBorrowing).count() == 2
+
+
+def test_borrow_batch_requires_staff(client, desk, auth_headers):
+    librarian, patron, books = desk
+    batch = {"items": [{"book_id": books[0].id, "user_id": patron.id}]}
+    assert client.post("/api/borrowings/batch", json=batch).status_code == 401
+    assert client.post("/api/borrowings/batch", headers=auth_headers(patron), json=batch).status_code == 403
+    response = client.post("/api/borrowings/batch", headers=auth_headers(librarian),
+                           json={**batch, "current_user_id": patron.id})
+    assert response.status_code == 403
+
+
+def test_return_batch(client, db_session, desk, auth_headers):
+    librarian, patron, books = desk
+    borrowed = client.post("/api/borrowings/batch", headers=auth_headers(librarian), json={
+        "current_user_id": librarian.id,
+        "items": [{"book_id": b.id, "user_id": patron.id} for b in books],
+    }).json()
+    ids = [r["borrowing_id"] for r in borrowed["results"]]
+
+    response = client.put("/api/borrowings/return-batch", json={"borrowing_ids": [ids[0], ids[1], ids[0], 999]})
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["status_code"] for r in data["results"]] == [200, 200, 400, 404]
+
+    db_session.expire_all()
+    assert [db_session.get(Book, b.id).available_quantity for b in books] == [1, 1, 0]
+    assert db_session.query(BookBorrowing).filter(BookBorrowing.is_returned == False).count() == 1
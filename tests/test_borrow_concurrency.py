@@ -0,0 +1,93 @@
+# tests/test_borrow_concurrency.py
+import threading
+
+from fastapi.testclient import TestClient
+
+from app.crud import book_borrowing as borrowing_crud
+from app.database import SessionLocal, get_db
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User, UserRole
+from app.schemas.book_borrowing import BookBorrowingCreate
+from app.security import create_access_token
+from main import app
+
+
+def _seed(db, customers=1, quantity=1):
+    librarian = User(email="librarian@example.com", first_name="Lib", last_name="Rarian",
+                     password="password123", role=UserRole.LIBRARIAN)
+    patrons = [
+        User(email=f"patron{i}@example.com", first_name="Pat", last_name=str(i),
+             password="password123", role=UserRole.CUSTOMER)
+        for i in range(customers)
+    ]
+    book = Book(title="Dune", author="Frank Herbert", quantity=quantity, available_quantity=quantity)
+    db.add_all([librarian, book, *patrons])
+    db.commit()
+    return librarian.id, book.id, [p.id for p in patrons]
+
+
+def test_concurrent_borrows_do_not_oversell(db_session):
+    """Many threads borrowing the last copies of one book never drive availability below zero"""
+    librarian_id, book_id, patron_ids = _seed(db_session, customers=24, quantity=5)
+    barrier = threading.Barrier(len(patron_ids))
+    outcomes = []
+    lock = threading.Lock()
+
+    def borrow(patron_id):
+        db = SessionLocal()
+        try:
+            barrier.wait()
+            borrowing_crud.borrow_book(db, BookBorrowingCreate(book_id=book_id, user_id=patron_id))
+            result = 200
+        except borrowing_crud.BorrowingError as e:
+            result = e.status_code
+        finally:
+            db.close()
+        with lock:
+            outcomes.append(result)
+
+    threads = [threading.Thread(target=borrow, args=(patron_id,)) for patron_id in patron_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db_session.expire_all()
+    book = db_session.get(Book, book_id)
+    assert outcomes.count(200) == 5
+    assert outcomes.count(400) == len(patron_ids) - 5
+    assert book.available_quantity == 0
+    assert db_session.query(BookBorrowing).filter(BookBorrowing.book_id == book_id).count() == 5
+
+
+def test_borrow_outcomes(db_session):
+    """The borrow route reports 401/403/404/400 outcomes without changing availability"""
+    librarian_id, book_id, (patron_id,) = _seed(db_session, customers=1, quantity=1)
+    app.dependency_overrides[get_db] = lambda: db_session
+    client = TestClient(app)
+    try:
+        def borrow(token=create_access_token(librarian_id, UserRole.LIBRARIAN, 0), **overrides):
+            payload = {"book_id": book_id, "user_id": patron_id}
+            payload.update(overrides)
+            return client.post("/api/borrowings/", json=payload, headers={"Authorization": f"Bearer {token}"})
+
+        assert borrow(token="not-a-token").status_code == 401
+        assert borrow(token=create_access_token(librarian_id, UserRole.LIBRARIAN, 0, ttl=-1)).status_code == 401
+        assert borrow(token=create_access_token(patron_id, UserRole.CUSTOMER, 0)).status_code == 403
+        assert borrow(current_user_id=patron_id).status_code == 403
+        assert borrow(user_id=999).status_code == 404
+        assert borrow(book_id=999).status_code == 404
+        assert borrow().status_code == 200
+        response = borrow()
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Book is not available for borrowing (quantity is 0)"
+
+        db_session.get(Book, book_id).available_quantity = 1
+        db_session.commit()
+        response = borrow()
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Book is already borrowed and not yet returned"
+        assert db_session.get(Book, book_id).available_quantity == 1
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,54 @@
+# tests/test_borrowing_queries.py
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.crud.user import user_cache
+from app.database import engine
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def _seed_loans(db, count):
+    user = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    books = [Book(title=f"Book {i}", author="Author", quantity=1, available_quantity=0) for i in range(count)]
+    db.add_all([user, *books])
+    db.flush()
+    db.add_all([BookBorrowing(book_id=book.id, user_id=user.id) for book in books])
+    db.commit()
+    user_id = user.id
+    db.expunge_all()
+    return user_id
+
+
+def test_user_borrowings_statement_count_is_independent_of_page_size(client, db_session):
+    user_id = _seed_loans(db_session, 60)
+
+    counts = {}
+    for limit in (5, 50):
+        db_session.expunge_all()
+        user_cache.clear()
+        with count_statements() as statements:
+            response = client.get(f"/api/borrowings/user/{user_id}", params={"limit": limit})
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) == limit
+        assert all(row["book"]["title"] and row["user"]["id"] == user_id for row in page)
+        counts[limit] = len(statements)
+
+    assert counts[5] == counts[50] <= 3
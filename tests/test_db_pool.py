@@ -0,0 +1,34 @@
+# tests/test_db_pool.py
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from app.db_pool import ENGINES, InstrumentedQueuePool, instrument, pool_stats
+
+
+def test_db_pool_endpoint_reports_primary_pool(client, db_session):
+    db_session.execute(text("SELECT 1"))
+    response = client.get("/internal/db-pool")
+    assert response.status_code == 200
+    primary = response.json()["primary"]
+    assert primary["checked_out"] >= 1
+    assert primary["checkouts"] >= 1
+    assert primary["wait_seconds"]["count"] >= 1
+
+
+def test_checkout_timeouts_are_counted():
+    probe = create_engine("sqlite:///./test.db", poolclass=InstrumentedQueuePool, pool_size=1,
+                          max_overflow=0, pool_timeout=0.05, pool_logging_name="probe")
+    instrument(probe, "probe")
+    try:
+        held = probe.connect()
+        with pytest.raises(exc.TimeoutError):
+            probe.connect()
+        stats = pool_stats()["probe"]
+        assert (stats["checked_out"], stats["checkout_failures"], stats["waiting"]) == (1, 1, 0)
+        assert stats["wait_seconds"]["count"] == 2
+        assert stats["wait_seconds"]["sum"] >= 0.05
+        held.close()
+        assert pool_stats()["probe"]["hold_seconds"]["count"] == 1
+    finally:
+        probe.dispose()
+        ENGINES.pop("probe")
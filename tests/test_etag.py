@@ -0,0 +1,87 @@
+# tests/test_etag.py
+import pytest
+
+from app.crud import book as book_crud, book_borrowing as borrowing_crud
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User
+from app.schemas.book import BookUpdate
+from app.schemas.book_borrowing import BookBorrowingCreate
+from app.versioning import versions
+
+from tests.test_borrowing_queries import count_statements
+
+
+@pytest.fixture(scope="function")
+def readers(db_session):
+    readers = [
+        User(email=f"reader{i}@example.com", first_name="Avid", last_name=f"Reader {i}", password="password123")
+        for i in range(2)
+    ]
+    books = [Book(title=f"Book {i}", author="Author", quantity=2, available_quantity=2) for i in range(2)]
+    db_session.add_all([*readers, *books])
+    db_session.commit()
+    return [reader.id for reader in readers], [book.id for book in books]
+
+
+def _etag(client, url, **params):
+    response = client.get(url, params=params)
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+
+def test_matching_etag_is_answered_without_the_database(client, readers):
+    etag = _etag(client, "/api/books/", limit=1)
+    assert etag.startswith('W/"')
+    assert _etag(client, "/api/books/", limit=2) != etag  # query params are part of the tag
+
+    with count_statements() as statements:
+        response = client.get("/api/books/", params={"limit": 1}, headers={"If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+    assert statements == []
+
+    search = _etag(client, "/api/books/search", q="Book")
+    assert client.get("/api/books/search", params={"q": "Book"}, headers={"If-None-Match": search}).status_code == 304
+
+
+def test_catalog_writes_change_the_etag(client, db_session, readers):
+    (reader, other), (book, _) = readers
+    seen = [_etag(client, "/api/books/")]
+
+    borrowing_crud.borrow_book(db_session, BookBorrowingCreate(user_id=reader, book_id=book))
+    seen.append(_etag(client, "/api/books/"))
+    loan = db_session.query(BookBorrowing.id).scalar()
+    untouched, borrower = versions.user(other), versions.user(reader)
+    borrowing_crud.return_books(db_session, [loan])
+    seen.append(_etag(client, "/api/books/"))
+    assert versions.user(other) == untouched and versions.user(reader) > borrower
+    book_crud.update_book(db_session, book, BookUpdate(title="Dune", author="Frank Herbert", quantity=3))
+    seen.append(_etag(client, "/api/books/"))
+    book_crud.upsert_books(db_session, [{"title": "Emma", "author": "Jane Austen", "quantity": 1, "available_quantity": 1}])
+    seen.append(_etag(client, "/api/books/"))
+
+    assert len(set(seen)) == len(seen)
+    # A rolled back write doesn't move the version
+    db_session.add(Book(title="Draft", author="Nobody", quantity=1, available_quantity=1))
+    db_session.flush()
+    db_session.rollback()
+    assert _etag(client, "/api/books/") == seen[-1]
+
+
+def test_borrowing_list_etag_follows_its_user(client, db_session, readers):
+    (reader, other), _ = readers
+    mine, theirs = f"/api/borrowings/user/{reader}", f"/api/borrowings/user/{other}"
+    before = _etag(client, mine), _etag(client, theirs)
+
+    versions.bump(user_ids=[other])
+    assert _etag(client, mine) == before[0]
+    assert _etag(client, theirs) != before[1]
+
+    catalog = versions.catalog
+    db_session.query(BookBorrowing).filter(BookBorrowing.id == 0).update({BookBorrowing.is_returned: True})
+    db_session.commit()
+    # An ORM bulk update without user ids can't tell whose loans it touched: every list moves
+    assert _etag(client, mine) != before[0]
+    assert versions.catalog == catalog
@@ -0,0 +1,73 @@
+# tests/test_export.py
+import csv
+import io
+import json
+import zlib
+
+import pytest
+
+from app.crud import book as book_crud
+from app.export import ExportEncoder, accepts_gzip, iter_export
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User
+
+from tests.test_async_db import async_client  # noqa: F401  (fixture)
+
+
+@pytest.fixture(scope="function")
+def history(db_session):
+    reader = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    books = [Book(title=f"Book {i}", author="Author, Jr." if i % 2 else None, quantity=1, available_quantity=1) for i in range(30)]
+    db_session.add_all([reader, *books])
+    db_session.flush()
+    db_session.add_all([BookBorrowing(book_id=book.id, user_id=reader.id, is_returned=i < 10) for i, book in enumerate(books)])
+    db_session.commit()
+    return reader
+
+
+def test_export_books_ndjson(client, history):
+    response = client.get("/api/books/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 30
+    assert rows[1] == {"id": 2, "title": "Book 1", "author": "Author, Jr.", "quantity": 1, "available_quantity": 1}
+
+
+def test_export_borrowings_csv_with_filters(client, history):
+    response = client.get("/api/borrowings/export", params={"format": "csv", "user_id": history.id, "active": True})
+    assert response.status_code == 200
+    assert 'filename="borrowings.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 20
+    assert rows[0].pop("borrowed_at")
+    assert rows[0] == {"id": "11", "book_id": "11", "book_title": "Book 10", "user_id": str(history.id),
+                       "user_email": "reader@example.com", "is_returned": "False", "returned_at": ""}
+
+
+def test_export_is_gzipped_on_request(client, history):
+    response = client.get("/api/books/export", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.text.splitlines()) == 30  # httpx decodes the gzip body transparently
+
+    assert accepts_gzip("br, gzip;q=0.8") and not accepts_gzip("gzip;q=0") and not accepts_gzip("identity")
+
+
+def test_export_streams_in_batches(db_session, history):
+    columns = ["id", "title", "author", "quantity", "available_quantity"]
+    chunks = list(iter_export(db_session, book_crud.export_books_query(), ExportEncoder(columns, "csv"), batch_size=4))
+    # The header, then one chunk per 4-row fetch
+    assert len(chunks) == 1 + 8
+    assert chunks[0] == b"id,title,author,quantity,available_quantity\r\n"
+
+    encoder = ExportEncoder(columns, "csv", compress=True)
+    text = zlib.decompress(b"".join(iter_export(db_session, book_crud.export_books_query(), encoder)), wbits=31).decode()
+    assert text.splitlines()[:2] == ["id,title,author,quantity,available_quantity", "1,Book 0,,1,1"]
+    assert len(text.splitlines()) == 31
+
+
+def test_export_from_async_session(async_client, history):
+    response = async_client.get("/api/borrowings/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert [json.loads(line)["is_returned"] for line in response.text.splitlines()] == [True] * 10 + [False] * 20
@@ -0,0 +1,174 @@
+# tests/test_idempotency.py
+import asyncio
+import time
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.database import SessionLocal
+from app.idempotency import BUSY, CLAIMED, IdempotencyMiddleware, IdempotencyStore
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User, UserRole
+
+
+@pytest.fixture(scope="function")
+def desk(db_session, auth_headers):
+    librarian = User(email="desk@example.com", first_name="Desk", last_name="Clerk",
+                     password="password123", role=UserRole.LIBRARIAN)
+    patron = User(email="patron@example.com", first_name="Pat", last_name="Ron", password="password123")
+    book = Book(title="Dune", author="Frank Herbert", quantity=2, available_quantity=2)
+    db_session.add_all([librarian, patron, book])
+    db_session.commit()
+    return auth_headers(librarian), patron.id, book.id
+
+
+def test_retried_borrow_and_return_replay_the_first_response(client, db_session, desk):
+    headers, patron, book = desk
+    loan = {"book_id": book, "user_id": patron}
+    first = client.post("/api/borrowings/", json=loan, headers={**headers, "Idempotency-Key": "borrow-1"})
+    retry = client.post("/api/borrowings/", json=loan, headers={**headers, "Idempotency-Key": "borrow-1"})
+    assert (first.status_code, retry.status_code) == (200, 200)
+    assert retry.json() == first.json() and retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert db_session.query(BookBorrowing).count() == 1
+
+    # Without a key the retry is a new request
+    assert client.post("/api/borrowings/", json=loan, headers=headers).status_code == 400
+
+    returned = [client.put("/api/borrowings/1/return", headers={"Idempotency-Key": "return-1"}) for _ in range(2)]
+    assert [r.status_code for r in returned] == [200, 200] and returned[1].headers["Idempotent-Replayed"] == "true"
+    db_session.expire_all()
+    assert db_session.get(Book, book).available_quantity == 2
+
+
+def test_key_reused_for_another_request_is_rejected(client, desk):
+    headers, patron, book = desk
+    headers = {**headers, "Idempotency-Key": "k"}
+    assert client.post("/api/borrowings/", json={"book_id": book, "user_id": patron}, headers=headers).status_code == 200
+    response = client.post("/api/borrowings/", json={"book_id": book, "user_id": patron + 1},
+                           headers={**headers, "Origin": "https://desk.example.com"})
+    assert response.status_code == 422
+    # CORS is the outermost middleware: a browser client can read the refusal
+    assert response.headers["Access-Control-Allow-Origin"] == "*"
+    assert client.put("/api/borrowings/1/return", headers={"Idempotency-Key": "x" * 256}).status_code == 400
+
+
+def _app(store, calls, **options):
+    async def handler(request):
+        calls.append(await request.body())
+        await asyncio.sleep(float(request.query_params.get("sleep", 0.1)))
+        status_code = int(request.query_params.get("status", 201))
+        if status_code == 599:
+            raise RuntimeError("handler failed")
+        return JSONResponse({"call": len(calls)}, status_code=status_code)
+
+    app = Starlette(routes=[Route("/write", handler, methods=["POST"])])
+    return IdempotencyMiddleware(app, store=store, **options)
+
+
+def _post(app, *requests):
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            return await asyncio.gather(*(http.post("/write", **request) for request in requests))
+    return asyncio.run(send())
+
+
+def test_concurrent_duplicates_wait_for_the_first(db_session):
+    calls = []
+    app = _app(IdempotencyStore(SessionLocal, cache_size=0), calls)  # no memory front: replay from the table
+    request = {"content": b"payload", "headers": {"Idempotency-Key": "same"}}
+    responses = _post(app, request, request, request)
+    assert calls == [b"payload"]
+    assert [r.json() for r in responses] == [{"call": 1}] * 3
+    assert sorted(r.headers.get("Idempotent-Replayed", "") for r in responses) == ["", "true", "true"]
+
+
+def test_failed_and_conflicting_responses_are_not_kept(db_session):
+    calls = []
+    app = _app(IdempotencyStore(SessionLocal), calls)
+    with pytest.raises(RuntimeError):
+        _post(app, {"params": {"status": 599}, "headers": {"Idempotency-Key": "a"}})
+    assert [r.status_code for r in _post(app, {"params": {"status": 409}, "headers": {"Idempotency-Key": "a"}})] == [409]
+    assert [r.status_code for r in _post(app, {"params": {"status": 409}, "headers": {"Idempotency-Key": "a"}})] == [409]
+    assert len(calls) == 3
+
+
+def test_key_held_by_another_worker(db_session):
+    store = IdempotencyStore(SessionLocal, lock_seconds=0.3)
+    fingerprint_elsewhere = "0" * 64
+    key = store.key(None, "elsewhere")
+    assert store.claim(key, fingerprint_elsewhere)[0] == CLAIMED
+    assert store.claim(key, fingerprint_elsewhere) == (BUSY, fingerprint_elsewhere, None)
+
+    calls = []
+    app = _app(store, calls, wait_seconds=0.1, poll_interval=0.02)
+    response, = _post(app, {"headers": {"Idempotency-Key": "elsewhere"}})
+    assert response.status_code == 422  # the other worker executes a different request
+
+    other = store.key(None, "abandoned")
+    store.claim(other, fingerprint_elsewhere)
+    store.release(other)
+    assert store.claim(other, fingerprint_elsewhere)[0] == CLAIMED
+    time.sleep(0.3)  # the claiming worker died: the key can be taken over
+    response, = _post(app, {"headers": {"Idempotency-Key": "abandoned"}})
+    assert response.status_code == 201 and len(calls) == 1
+
+
+def test_expired_keys_are_purged(db_session):
+    store = IdempotencyStore(SessionLocal, ttl=0.05)
+    store.claim(store.key(None, "old"), "f")
+    time.sleep(0.1)
+    assert store.purge() == 1
+
+
+def test_large_bodies_are_streamed_and_fingerprinted_whole(db_session):
+    calls = []
+    app = _app(IdempotencyStore(SessionLocal), calls, max_body_bytes=10)  # the responses just fit
+
+    def chunked(*chunks):
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+        return stream()
+
+    first, sized = _post(
+        app,
+        {"content": chunked(b"12345", b"12345", b"12345"), "headers": {"Idempotency-Key": "a"}},  # no Content-Length
+        {"content": b"x" * 11, "headers": {"Idempotency-Key": "b"}},
+    )
+    assert (first.status_code, sized.status_code) == (201, 201)
+    assert sorted(calls) == [b"123451234512345", b"x" * 11]
+
+    retry, changed_tail = _post(
+        app,
+        {"content": chunked(b"1234512", b"345", b"12345"), "headers": {"Idempotency-Key": "a"}},
+        {"content": chunked(b"12345", b"12345", b"12346"), "headers": {"Idempotency-Key": "a"}},
+    )
+    assert retry.status_code == 201 and retry.headers["Idempotent-Replayed"] == "true"
+    assert changed_tail.status_code == 422
+    assert len(calls) == 2
+
+
+def test_claims_are_renewed_while_the_request_executes(db_session):
+    calls = []
+    lock_seconds = 0.15
+    first_worker = _app(IdempotencyStore(SessionLocal, lock_seconds=lock_seconds), calls)
+    second_worker = _app(IdempotencyStore(SessionLocal, lock_seconds=lock_seconds), calls,
+                         wait_seconds=2, poll_interval=0.02)
+    request = {"params": {"sleep": 4 * lock_seconds}, "headers": {"Idempotency-Key": "slow"}}
+
+    async def send():
+        async def post(app, delay):
+            await asyncio.sleep(delay)
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+                return await http.post("/write", **request)
+        # The retry arrives long after lock_seconds, while the first request still executes
+        return await asyncio.gather(post(first_worker, 0), post(second_worker, 2 * lock_seconds))
+
+    first, retry = asyncio.run(send())
+    assert (first.status_code, retry.status_code) == (201, 201)
+    assert retry.headers["Idempotent-Replayed"] == "true" and len(calls) == 1
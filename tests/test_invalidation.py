@@ -0,0 +1,72 @@
+# tests/test_invalidation.py
+import threading
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.database import engine
+from app.invalidation import DatabaseInvalidationBackend
+from app.models.invalidation import CacheInvalidation
+from app.server import serve
+
+
+def _worker(**options):
+    backend = DatabaseInvalidationBackend(engine, **options)
+    received = []
+    backend.subscribe("versions", received.append)
+    return backend, received
+
+
+def test_invalidations_reach_other_workers_once(db_session):
+    first, first_received = _worker()
+    second, second_received = _worker()
+    second.poll()  # where the table ends
+    first.publish("versions", ("catalog", 1))
+    first.publish("versions", (("writer", 7), 2))
+    assert first_received == [("catalog", 1), (("writer", 7), 2)]  # at once, in the publisher
+    assert second_received == []
+
+    assert second.poll() == 2
+    assert second_received == [("catalog", 1), (("writer", 7), 2)]
+    assert second.poll() == 0
+    first.poll()
+    assert first.poll() == 0 and len(first_received) == 2
+
+
+def test_late_commits_behind_the_last_seen_id_are_picked_up(db_session):
+    backend, received = _worker()
+    backend.poll()
+    row = {"channel": "versions", "key": '["catalog", 1]', "origin": "elsewhere", "created_at": 0}
+    with engine.begin() as connection:
+        connection.execute(insert(CacheInvalidation.__table__), [{**row, "id": 3}])
+    backend.poll()
+    with engine.begin() as connection:  # id 1 was handed out first but committed last
+        connection.execute(insert(CacheInvalidation.__table__), [{**row, "id": 1, "key": '["users", 2]'}])
+    backend.poll()
+    assert received == [("catalog", 1), ("users", 2)]
+
+
+def test_background_thread_writes_polls_and_purges(db_session):
+    first, _ = _worker(poll_interval=0.02)
+    second, second_received = _worker(poll_interval=0.02)
+    delivered = threading.Event()
+    second.subscribe("versions", lambda key: delivered.set())
+    first.start()
+    second.start()
+    try:
+        first.publish("versions", ("catalog", 1))
+        assert delivered.wait(2)
+        assert second_received == [("catalog", 1)]
+    finally:
+        first.stop()
+        second.stop()
+    first.retention = 0
+    assert first.purge() == 1
+    with engine.connect() as connection:
+        assert connection.execute(select(CacheInvalidation.id)).all() == []
+
+
+def test_multiple_workers_need_a_shared_secret_key(monkeypatch):
+    monkeypatch.delenv("SECRET_KEY", raising=False)
+    with pytest.raises(SystemExit, match="SECRET_KEY"):
+        serve("main:app", "127.0.0.1", 0, workers=2, drain_seconds=0, graceful_timeout=1)
@@ -0,0 +1,72 @@
+# tests/test_lifecycle.py
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+import uvicorn
+from sqlalchemy import create_engine, inspect
+
+from app.database import engine
+from app.lifecycle import lifecycle
+from app.server import DrainingServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="function")
+def not_draining():
+    yield
+    lifecycle.draining = False
+
+
+def test_importing_the_app_runs_no_ddl(tmp_path):
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, env=dict(os.environ, DATABASE_URL=url), check=True)
+    fresh = create_engine(url)
+    assert inspect(fresh).get_table_names() == []
+    fresh.dispose()
+
+
+def test_readiness_follows_startup_and_draining(client, not_draining):
+    with client:  # runs the startup hooks
+        response = client.get("/health/ready")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "ready" and body["pid"] == os.getpid()
+        assert set(body["cold_start_seconds"]) == {"import", "startup", "total"}
+        assert client.get("/health/live").json() == {"status": "ok"}
+
+        lifecycle.draining = True
+        response = client.get("/health/ready")
+        assert (response.status_code, response.json()) == (503, {"status": "draining"})
+
+
+def test_first_signal_drains_before_exiting(not_draining):
+    server = DrainingServer(uvicorn.Config("main:app"), drain_seconds=0.05)
+    server.handle_exit(signal.SIGTERM, None)
+    assert lifecycle.draining and not server.should_exit
+    time.sleep(0.3)
+    assert server.should_exit
+
+    # A second signal while draining stops at once
+    lifecycle.draining = True
+    server = DrainingServer(uvicorn.Config("main:app"), drain_seconds=60)
+    server.handle_exit(signal.SIGTERM, None)
+    assert server.should_exit
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_gets_fresh_pools():
+    parent_pool = engine.pool
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write, b"1" if engine.pool is not parent_pool else b"0")
+        os._exit(0)
+    os.close(write)
+    assert os.read(read, 1) == b"1"
+    os.close(read)
+    os.waitpid(pid, 0)
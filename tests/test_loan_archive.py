@@ -0,0 +1,151 @@
+# tests/test_loan_archive.py
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, delete, inspect, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+
+from app.crud import book_borrowing as borrowing_crud
+from app.database import SessionLocal
+from app.loan_archive import LoanArchiver
+from app.migrations import run_migrations
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing, BookBorrowingArchive
+from app.models.user import User
+from app.schemas.book_borrowing import BookBorrowingCreate
+
+
+@pytest.fixture(scope="function")
+def history(db_session):
+    """A reader with 4 loans returned 100 days ago, 2 returned yesterday and 2 still out."""
+    reader = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    books = [Book(title=f"Book {i}", author="Author", quantity=1, available_quantity=1) for i in range(8)]
+    db_session.add_all([reader, *books])
+    db_session.flush()
+    db_session.add_all([BookBorrowing(book_id=book.id, user_id=reader.id) for book in books])
+    db_session.commit()
+    assert borrowing_crud.return_books(db_session, list(range(1, 7)))[0]["success"]
+
+    loans = BookBorrowing.__table__
+    now = datetime.utcnow()
+    db_session.execute(update(loans).where(loans.c.id <= 4).values(returned_at=now - timedelta(days=100)))
+    db_session.execute(update(loans).where(loans.c.id.in_([5, 6])).values(returned_at=now - timedelta(days=1)))
+    db_session.commit()
+    return reader.id
+
+
+def _ids(db, model):
+    return db.scalars(select(model.id).order_by(model.id)).all()
+
+
+def test_loans_record_when_they_were_borrowed_and_returned(db_session, history):
+    loan = db_session.get(BookBorrowing, 7)
+    assert loan.borrowed_at is not None and loan.returned_at is None
+    borrowing_crud.return_book(db_session, 7)
+    db_session.refresh(loan)
+    assert loan.is_returned and loan.returned_at >= loan.borrowed_at
+
+
+def test_archival_moves_old_returned_loans_in_batches(db_session, history):
+    batches = []
+    moved = LoanArchiver(SessionLocal, after_days=30, batch_size=3, pause=0, interval=0).run(progress=batches.append)
+    assert moved == 4
+    assert batches == [3, 4]  # running totals: a full batch, then the short last one
+
+    db_session.expire_all()
+    assert _ids(db_session, BookBorrowing) == [5, 6, 7, 8]
+    assert _ids(db_session, BookBorrowingArchive) == [1, 2, 3, 4]
+    archived = db_session.get(BookBorrowingArchive, 1)
+    assert (archived.user_id, archived.is_returned, archived.archived_at is not None) == (history, True, True)
+    assert LoanArchiver(SessionLocal, after_days=30, batch_size=3, pause=0, interval=0).run() == 0
+
+
+def test_archived_ids_are_never_reused(db_session, history):
+    LoanArchiver(SessionLocal, after_days=-1, batch_size=100, pause=0, interval=0).run()
+    db_session.execute(delete(BookBorrowing.__table__))  # even the highest id is archived
+    db_session.commit()
+    loan = borrowing_crud.borrow_book(db_session, BookBorrowingCreate(book_id=1, user_id=history))
+    assert loan.id == 9
+
+
+def test_archive_collisions_fail_without_deleting(db_session, history):
+    loans = BookBorrowing.__table__
+    row = db_session.execute(select(*(loans.c[name] for name in borrowing_crud.LOAN_COLUMNS)).where(loans.c.id == 1)).one()
+    db_session.execute(insert(BookBorrowingArchive.__table__).values(**row._mapping))
+    db_session.commit()
+
+    with pytest.raises(IntegrityError):
+        borrowing_crud.archive_returned_loans(db_session, datetime.utcnow() - timedelta(days=30))
+    db_session.rollback()
+    assert _ids(db_session, BookBorrowing) == list(range(1, 9))
+
+
+def test_history_reads_both_tables(client, db_session, history):
+    LoanArchiver(SessionLocal, after_days=30, batch_size=100, pause=0, interval=0).run()
+
+    first = client.get(f"/api/borrowings/user/{history}/history", params={"limit": 5})
+    assert [loan["id"] for loan in first.json()] == [1, 2, 3, 4, 5]
+    assert first.json()[0]["book"]["title"] == "Book 0" and first.json()[0]["returned_at"]
+    rest = client.get(f"/api/borrowings/user/{history}/history", params={"cursor": first.headers["X-Next-Cursor"]})
+    assert [loan["id"] for loan in rest.json()] == [6, 7, 8]
+    # skip is ignored with a cursor
+    cursor = first.headers["X-Next-Cursor"]
+    rest = client.get(f"/api/borrowings/user/{history}/history", params={"cursor": cursor, "skip": 2})
+    assert [loan["id"] for loan in rest.json()] == [6, 7, 8]
+    page = client.get("/api/borrowings/", params={"limit": 3})
+    rest = client.get("/api/borrowings/", params={"cursor": page.headers["X-Next-Cursor"], "skip": 2, "limit": 3})
+    assert [loan["id"] for loan in rest.json()] == [4, 5, 6]
+
+    assert [loan["id"] for loan in client.get(f"/api/borrowings/user/{history}").json()] == [7, 8]
+    assert [loan["id"] for loan in client.get("/api/borrowings/", params={"skip": 2, "limit": 4}).json()] == [3, 4, 5, 6]
+    rows = list(csv.DictReader(io.StringIO(client.get("/api/borrowings/export", params={"format": "csv"}).text)))
+    assert [row["id"] for row in rows] == [str(i) for i in range(1, 9)]
+    assert client.get(f"/api/borrowings/user/{history + 1}/history").status_code == 404
+
+    # Archived loans are already returned, not unknown
+    result = client.put("/api/borrowings/return-batch", json={"borrowing_ids": [1, 99]}).json()["results"]
+    assert [(item["status_code"], item["detail"]) for item in result] == [
+        (400, "Book has already been returned"), (404, "Borrowing record not found")
+    ]
+
+
+def test_migration_adds_loan_timestamps(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE book_borrowings (id INTEGER PRIMARY KEY, book_id INTEGER, "
+                                "user_id INTEGER, is_returned BOOLEAN)"))
+        connection.execute(text("INSERT INTO book_borrowings (book_id, user_id, is_returned) VALUES (1, 7, 1), (2, 7, 0)"))
+
+    run_migrations(engine)
+    run_migrations(engine)
+
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT borrowed_at, returned_at IS NOT NULL FROM book_borrowings ORDER BY id")).all()
+    assert rows == [(None, 1), (None, 0)]
+    assert "ix_book_borrowings_returned_at" in {index["name"] for index in inspect(engine).get_indexes("book_borrowings")}
+    engine.dispose()
+
+
+def test_migration_stops_sqlite_reusing_archived_ids(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE book_borrowings (id INTEGER PRIMARY KEY, book_id INTEGER, "
+                                "user_id INTEGER, is_returned BOOLEAN)"))
+        connection.execute(text("CREATE INDEX ix_book_borrowings_book_id ON book_borrowings (book_id)"))
+        connection.execute(text("INSERT INTO book_borrowings (id, book_id, user_id, is_returned) VALUES (1, 1, 7, 0)"))
+    BookBorrowingArchive.__table__.create(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(BookBorrowingArchive.__table__).values(id=5, book_id=2, user_id=7))
+
+    run_migrations(engine)
+    run_migrations(engine)
+
+    with engine.begin() as connection:
+        connection.execute(insert(BookBorrowing.__table__).values(book_id=3, user_id=7))
+        assert connection.execute(text("SELECT id, book_id FROM book_borrowings ORDER BY id")).all() == [(1, 1), (6, 3)]
+        assert "AUTOINCREMENT" in connection.execute(
+            text("SELECT sql FROM sqlite_master WHERE name = 'book_borrowings'")
+        ).scalar()
+    engine.dispose()
@@ -0,0 +1,64 @@
+# tests/test_pagination.py
+from app.pagination import encode_cursor
+from app.models.book import Book
+from app.models.user import User
+
+
+def _walk(client, url, **params):
+    pages, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        response = client.get(url, params=query)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+
+def test_books_cursor_pagination_by_title(client, db_session):
+    titles = ["Emma", "Beloved", "Dracula", "Atonement", "Carrie", "Beloved", "Frankenstein"]
+    db_session.add_all([Book(title=t, author="A", quantity=1, available_quantity=1) for t in titles])
+    db_session.commit()
+
+    pages = _walk(client, "/api/books/", limit=3, sort="title")
+    rows = [book for page in pages for book in page]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [b["title"] for b in rows] == sorted(titles)
+    assert len({b["id"] for b in rows}) == len(titles)
+
+
+def test_cursor_is_stable_under_inserts(client, db_session):
+    db_session.add_all([User(email=f"u{i}@example.com", first_name="U", last_name=str(i), password="x") for i in range(4)])
+    db_session.commit()
+
+    first = client.get("/api/users/", params={"limit": 2})
+    # A row inserted ahead of the cursor must not shift the next page
+    db_session.add(User(email="a@example.com", first_name="A", last_name="A", password="x"))
+    db_session.commit()
+    second = client.get("/api/users/", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    assert [u["email"] for u in second.json()] == ["u2@example.com", "u3@example.com"]
+
+
+def test_skip_limit_still_supported(client, db_session):
+    db_session.add_all([Book(title=f"T{i}", author="A", quantity=1, available_quantity=1) for i in range(5)])
+    db_session.commit()
+    response = client.get("/api/books/", params={"skip": 3, "limit": 10})
+    assert [b["title"] for b in response.json()] == ["T3", "T4"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_invalid_cursor(client, db_session):
+    db_session.add_all([Book(title=f"T{i}", author="A", quantity=1, available_quantity=1) for i in range(2)])
+    db_session.commit()
+    cursor = client.get("/api/books/", params={"limit": 1}).headers["X-Next-Cursor"]
+    assert client.get("/api/books/", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/api/books/", params={"cursor": cursor, "sort": "title"}).status_code == 400
+
+
+def test_cursor_values_are_checked(client, db_session):
+    bad = [("id", [1, 2]), ("title", ["a"]), ("id", [{"a": 1}]), ("id", [[1]]), ("id", [True]), ("id", [])]
+    for url in ("/api/books/", "/api/users/", "/api/borrowings/"):
+        for sort, values in bad:
+            params = {"cursor": encode_cursor(sort, values), **({"sort": sort} if url == "/api/books/" else {})}
+            assert client.get(url, params=params).status_code == 400, (url, sort, values)
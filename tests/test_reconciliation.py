@@ -0,0 +1,61 @@
+# tests/test_reconciliation.py
+import pytest
+from sqlalchemy import update
+
+from app.crud import book as book_crud, circulation
+from app.database import SessionLocal
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User
+from app.reconciliation import AVAILABILITY_MISMATCHES, AvailabilityReconciler
+
+
+@pytest.fixture(scope="function")
+def drifted(db_session):
+    """Five books of 3 copies, each lent once; books 2 and 4 have drifted, book 5 lost copies below its loans."""
+    reader = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    books = [Book(title=f"Book {i}", author="Author", quantity=3, available_quantity=2) for i in range(5)]
+    db_session.add_all([reader, *books])
+    db_session.flush()
+    db_session.add_all([BookBorrowing(book_id=book.id, user_id=reader.id) for book in books])
+    db_session.commit()
+    table = Book.__table__
+    db_session.execute(update(table).where(table.c.id == 2).values(available_quantity=3))  # a lost return
+    db_session.execute(update(table).where(table.c.id == 4).values(available_quantity=0))
+    db_session.execute(update(table).where(table.c.id == 5).values(quantity=0))
+    db_session.commit()
+    return books
+
+
+def _available(db):
+    db.expire_all()
+    return [book.available_quantity for book in db.query(Book).order_by(Book.id)]
+
+
+def test_dry_run_only_reports(db_session, drifted):
+    before = AVAILABILITY_MISMATCHES.value(outcome="reported")
+    batches = []
+    report = AvailabilityReconciler(SessionLocal, batch_size=2, pause=0, interval=0, fix=False).run(
+        progress=lambda checked, mismatches: batches.append((checked, [m["book_id"] for m in mismatches]))
+    )
+    assert report == {"checked": 5, "mismatched": 3, "fixed": 0}
+    assert batches == [(2, [2]), (4, [4]), (5, [5])]
+    assert _available(db_session) == [2, 3, 2, 0, 2]
+    assert AVAILABILITY_MISMATCHES.value(outcome="reported") == before + 3
+
+
+def test_reconciliation_fixes_drifted_books(db_session, drifted):
+    totals = circulation.utilization(db_session)["available"]
+    report = AvailabilityReconciler(SessionLocal, batch_size=2, pause=0, interval=0).run()
+    assert report == {"checked": 5, "mismatched": 3, "fixed": 3}
+    # True availability is quantity minus active loans, never below zero
+    assert _available(db_session) == [2, 2, 2, 2, 0]
+    assert circulation.utilization(db_session)["available"] == totals - 1 + 2 - 2
+    assert AvailabilityReconciler(SessionLocal, batch_size=2, pause=0, interval=0).run()["mismatched"] == 0
+
+
+def test_books_are_checked_in_keyset_chunks(db_session, drifted):
+    after, checked, mismatches = book_crud.reconcile_availability(db_session, after=1, batch_size=2)
+    assert (after, checked) == (3, 2)
+    assert mismatches == [{"book_id": 2, "quantity": 3, "available_quantity": 3, "expected": 2}]
+    assert book_crud.reconcile_availability(db_session, after=5) == (None, 0, [])
@@ -0,0 +1,102 @@
+# tests/test_replicas.py
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import exc, text
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.db_pool import ENGINES
+from app.models.book import Book
+from app.models.user import User, UserRole
+from app.replicas import ReplicaSet, replicas
+from main import app
+
+
+@pytest.fixture(scope="function")
+def replica_set(tmp_path, db_session, monkeypatch):
+    """Two SQLite files standing in for read replicas of test.db, each with a book of its own."""
+    replica_set = ReplicaSet([f"sqlite:///{tmp_path / 'replica1.db'}", f"sqlite:///{tmp_path / 'missing' / 'replica2.db'}"],
+                             max_lag=0.3, check_interval=60)
+    db_session.add(Book(title="Primary copy", author="Author", quantity=1, available_quantity=1))
+    db_session.commit()
+    # Routes hold the app's ReplicaSet; give it the test replicas
+    monkeypatch.setattr(replicas, "replicas", replica_set.replicas)
+    monkeypatch.setattr(replicas, "max_lag", replica_set.max_lag)
+    yield replicas
+    replica_set.dispose()
+    for replica in replica_set.replicas:
+        ENGINES.pop(replica.name)
+
+
+def _seed(replica, title):
+    Base.metadata.create_all(bind=replica.engine)
+    with Session(replica.engine) as db:
+        db.add(Book(title=title, author="Author", quantity=1, available_quantity=1))
+        db.commit()
+
+
+def _titles(client, headers=None, limit=10):
+    response = client.get("/api/books/", params={"limit": limit}, headers=headers)
+    assert response.status_code == 200
+    return [book["title"] for book in response.json()]
+
+
+def test_reads_are_spread_over_healthy_replicas(replica_set, tmp_path):
+    client = TestClient(app)
+    first, second = replica_set.replicas
+    _seed(first, "Replica 1 copy")
+
+    replica_set.check()  # the second replica's directory doesn't exist
+    assert (first.healthy, second.healthy) == (True, False)
+    assert {_titles(client, limit=limit)[0] for limit in range(10, 14)} == {"Replica 1 copy"}
+    response = client.get("/api/books/", params={"limit": 20})
+    # The catalog just changed and the replica may not have caught up: nothing pins the page to it
+    assert "ETag" not in response.headers
+
+    (tmp_path / "missing").mkdir()
+    _seed(second, "Replica 2 copy")
+    replica_set.check()
+    assert second.healthy
+    assert {_titles(client, limit=limit)[0] for limit in range(30, 34)} == {"Replica 1 copy", "Replica 2 copy"}
+
+    replica_set.mark_down(first, "test")
+    replica_set.mark_down(second, "test")
+    assert _titles(client, limit=40) == ["Primary copy"]
+    assert client.get("/internal/replicas").json()["replicas"]["replica1"]["error"] == "test"
+
+
+def test_connection_failures_take_a_replica_out_of_rotation(replica_set):
+    second = replica_set.replicas[1]
+    with pytest.raises(exc.OperationalError):
+        with second.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    assert not second.healthy and "unable to open database file" in second.error
+
+
+def test_writers_read_their_own_writes_from_the_primary(replica_set, db_session, auth_headers):
+    client = TestClient(app)
+    _seed(replica_set.replicas[0], "Replica copy")
+    replica_set.mark_down(replica_set.replicas[1], "unused")
+    librarian = User(email="lib@example.com", first_name="Lib", last_name="Rarian", password="password123",
+                     role=UserRole.LIBRARIAN)
+    patron = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    db_session.add_all([librarian, patron])
+    db_session.commit()
+    book = db_session.query(Book).filter_by(title="Primary copy").one()
+    time.sleep(replica_set.max_lag)  # let the seeding writes age out of the lag window
+
+    assert _titles(client, auth_headers(librarian)) == ["Replica copy"]
+    response = client.post("/api/borrowings/", headers=auth_headers(librarian),
+                           json={"book_id": book.id, "user_id": patron.id})
+    assert response.status_code == 200
+
+    # The librarian wrote and the patron's loans changed: both read the primary for a while
+    assert _titles(client, auth_headers(librarian), limit=11) == ["Primary copy"]
+    loans = client.get(f"/api/borrowings/user/{patron.id}", headers=auth_headers(patron)).json()
+    assert [loan["book"]["title"] for loan in loans] == ["Primary copy"]
+    assert _titles(client, limit=12) == ["Replica copy"]  # anonymous
+
+    time.sleep(replica_set.max_lag)
+    assert _titles(client, auth_headers(librarian), limit=13) == ["Replica copy"]
@@ -0,0 +1,80 @@
+# tests/test_request_metrics.py
+import re
+
+from app.instrumentation import REQUEST_STATEMENTS
+from app.metrics import REGISTRY, Counter, Histogram, render
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User
+
+from tests.test_async_db import async_client  # noqa: F401  (fixture)
+from tests.test_borrowing_queries import count_statements
+
+TIMING = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries", pool;dur=[\d.]+, app;dur=[\d.]+, total;dur=[\d.]+')
+
+
+def _seed(db):
+    reader = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    book = Book(title="Dune", author="Frank Herbert", quantity=2, available_quantity=1)
+    db.add_all([reader, book])
+    db.flush()
+    db.add(BookBorrowing(book_id=book.id, user_id=reader.id))
+    db.commit()
+    return reader
+
+
+def test_server_timing_counts_the_request_statements(client, db_session):
+    reader_id = _seed(db_session).id
+    with count_statements() as statements:
+        response = client.get(f"/api/borrowings/user/{reader_id}")
+    assert response.status_code == 200
+    assert int(TIMING.fullmatch(response.headers["Server-Timing"]).group(1)) == len(statements) > 0
+
+    # Served from the response cache: no SQL at all
+    client.get("/api/books/")
+    assert TIMING.fullmatch(client.get("/api/books/").headers["Server-Timing"]).group(1) == "0"
+
+
+def test_async_session_queries_are_attributed(async_client, db_session):
+    reader = _seed(db_session)
+    response = async_client.get(f"/api/borrowings/user/{reader.id}")
+    assert int(TIMING.fullmatch(response.headers["Server-Timing"]).group(1)) > 0
+
+
+def test_metrics_are_labelled_by_route_template(client, db_session):
+    reader = _seed(db_session)
+    route = {"method": "GET", "route": "/api/borrowings/user/{user_id}"}
+    before = REQUEST_STATEMENTS.snapshot(**route)["count"]
+    client.get(f"/api/borrowings/user/{reader.id}")
+    client.get(f"/api/borrowings/user/{reader.id + 1}")
+    client.get("/no/such/path")
+    assert REQUEST_STATEMENTS.snapshot(**route)["count"] == before + 2
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    text = response.text
+    assert "# TYPE http_request_db_seconds histogram" in text
+    assert 'http_request_db_statements_count{method="GET",route="/api/borrowings/user/{user_id}"}' in text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in text
+    assert "/api/borrowings/user/1" not in text
+
+
+def test_render_escapes_and_formats():
+    registry = []
+    counter = Counter("test_events_total", "Events\\seen", ["kind"], registry=registry)
+    counter.inc(kind='say "hi"\n')
+    histogram = Histogram("test_seconds", "Latency", buckets=(0.5,), registry=registry)
+    histogram.observe(0.25)
+    histogram.observe(2)
+    assert registry == [counter, histogram] and counter not in REGISTRY
+    assert render(registry).splitlines() == [
+        "# HELP test_events_total Events\\\\seen",
+        "# TYPE test_events_total counter",
+        'test_events_total{kind="say \\"hi\\"\\n"} 1',
+        "# HELP test_seconds Latency",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{le="0.5"} 1',
+        'test_seconds_bucket{le="+Inf"} 2',
+        "test_seconds_count 2",
+        "test_seconds_sum 2.25",
+    ]
@@ -0,0 +1,113 @@
+# tests/test_response_cache.py
+import asyncio
+import time
+
+import pytest
+from fastapi.responses import ORJSONResponse
+
+from app.cache import InMemoryInvalidationBackend
+from app.crud import book as book_crud, user as user_crud
+from app.models.book import Book
+from app.models.user import User
+from app.response_cache import CachedResponse, ResponseCache, response_cache
+from app.schemas.book import BookCreate
+from app.schemas.user import UserUpdate
+
+from tests.test_borrowing_queries import count_statements
+
+
+@pytest.fixture(scope="function")
+def catalog(db_session):
+    reader = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    db_session.add_all([reader, *(Book(title=f"Book {i:05d}", author="Author", quantity=1, available_quantity=1) for i in range(3))])
+    db_session.commit()
+    return reader
+
+
+def test_repeated_reads_are_served_from_the_cache(client, catalog):
+    first = client.get("/api/books/", params={"limit": 2, "sort": "title"})
+    with count_statements() as statements:
+        again = client.get("/api/books/", params={"sort": "title", "limit": 2})  # same query, other order
+    assert statements == []
+    assert again.content == first.content
+    assert again.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert again.headers["content-type"] == "application/json"
+
+    client.get("/api/books/search", params={"q": "00001"})
+    with count_statements() as statements:
+        assert client.get("/api/books/search", params={"q": "00001"}).json()[0]["title"] == "Book 00001"
+    assert statements == []
+    assert response_cache.stats()["hits"] >= 2
+
+
+def test_writes_invalidate_the_cached_pages(client, db_session, catalog):
+    assert len(client.get("/api/books/").json()) == 3
+    users = client.get("/api/users/").json()
+    assert response_cache.stats()["size"] == 2
+
+    book_crud.create_book(db_session, BookCreate(title="Emma", author="Jane Austen", quantity=1))
+    assert response_cache.stats()["size"] == 1  # only the users page is left
+    assert len(client.get("/api/books/").json()) == 4
+
+    user_crud.update_user(db_session, catalog.id, UserUpdate(role="librarian"))
+    assert client.get("/api/users/").json() != users
+
+
+def test_concurrent_misses_share_one_load():
+    cache = ResponseCache("test", max_bytes=1024, backend=InMemoryInvalidationBackend())
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return ORJSONResponse([{"id": 1}])
+
+    async def burst():
+        return await asyncio.gather(*(cache.get_or_load("key", ("catalog",), load) for _ in range(10)))
+
+    responses = asyncio.run(burst())
+    assert len(loads) == 1
+    assert {response.body for response in responses} == {b'[{"id":1}]'}
+    assert cache.stats()["coalesced"] == 9
+
+    # A failed load is not cached: the next request tries again
+    async def fail():
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_load("other", (), fail))
+    assert cache.get("other") is None
+
+
+def test_cache_is_bounded_by_bytes_and_refuses_stale_loads():
+    backend = InMemoryInvalidationBackend()
+    cache = ResponseCache("test", max_bytes=10, backend=backend)
+    entry = lambda body, tag="catalog": CachedResponse(200, body, "application/json", (), (tag,))
+
+    cache.set("a", entry(b"1234"))
+    cache.set("b", entry(b"1234", "users"))
+    cache.get("a")
+    cache.set("c", entry(b"1234"))
+    assert cache.get("b") is None and cache.get("a") and cache.get("c")  # least recently used went first
+    assert cache.stats()["bytes"] == 8
+    cache.set("big", entry(b"x" * 11))
+    assert cache.get("big") is None
+
+    backend.publish("versions", ("catalog", 1))
+    assert cache.stats()["size"] == 0
+
+    async def racing_write():
+        backend.publish("versions", ("catalog", 2))  # the data changes while the page is being built
+        return ORJSONResponse([])
+
+    asyncio.run(cache.get_or_load("d", ("catalog",), racing_write))
+    assert cache.get("d") is None
+
+
+def test_entries_expire_without_an_invalidation():
+    cache = ResponseCache("test", max_bytes=1024, ttl=0.05, backend=InMemoryInvalidationBackend())
+    asyncio.run(cache.get_or_load("key", ("catalog",), lambda: asyncio.sleep(0, ORJSONResponse([]))))
+    assert cache.get("key") is not None
+    time.sleep(0.1)
+    assert cache.get("key") is None and cache.stats()["bytes"] == 0
@@ -0,0 +1,49 @@
+# tests/test_serialization.py
+import json
+
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User
+from app.schemas.book import Book as BookSchema
+from app.schemas.book_borrowing import BookBorrowingDetail
+from app.schemas.user import User as UserSchema
+from main import app
+
+
+def _seed(db):
+    reader = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    books = [Book(title=f"Book {i}", author=None if i == 0 else "Author", quantity=2, available_quantity=1) for i in range(3)]
+    librarian = User(email="lib@example.com", first_name="Lib", last_name="Rarian", password="password123", role="librarian")
+    db.add_all([reader, librarian, *books])
+    db.flush()
+    db.add_all([BookBorrowing(book_id=book.id, user_id=reader.id) for book in books])
+    db.commit()
+    return reader
+
+
+def test_fast_path_matches_response_models(client, db_session):
+    reader = _seed(db_session)
+    cases = [
+        ("/api/books/", BookSchema, db_session.query(Book).order_by(Book.id)),
+        ("/api/users/", UserSchema, db_session.query(User).order_by(User.id)),
+        (f"/api/borrowings/user/{reader.id}", BookBorrowingDetail, db_session.query(BookBorrowing).order_by(BookBorrowing.id)),
+    ]
+    for url, schema, query in cases:
+        response = client.get(url, params={"limit": 2})
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == [json.loads(schema.from_orm(row).json()) for row in query.limit(2)]
+        assert "password" not in response.text
+        assert response.headers["X-Next-Cursor"]
+
+
+def test_openapi_still_documents_response_models(client):
+    paths = client.get("/openapi.json").json()["paths"]
+    schemas = {
+        "/api/books/": "Book",
+        "/api/users/": "User",
+        "/api/borrowings/user/{user_id}": "BookBorrowingDetail",
+    }
+    for path, model in schemas.items():
+        content = paths[path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert content == {"title": content["title"], "type": "array", "items": {"$ref": f"#/components/schemas/{model}"}}
+    assert app.openapi()["components"]["schemas"]["BookBorrowingDetail"]["properties"]["book"] == {"$ref": "#/components/schemas/Book"}
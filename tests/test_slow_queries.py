@@ -0,0 +1,85 @@
+# tests/test_slow_queries.py
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.crud import book_borrowing as borrowing_crud
+from app.database import engine, to_async_url
+from app.models.book import Book
+from app.models.book_borrowing import BookBorrowing
+from app.models.user import User
+from app.slow_queries import explain, normalize_sql, parameter_shape, slow_query_log
+
+
+@pytest.fixture(scope="function")
+def log_everything():
+    settings = slow_query_log.threshold_ms, slow_query_log.explain_sample
+    slow_query_log.threshold_ms, slow_query_log.explain_sample = 1e-6, 1.0
+    slow_query_log.clear()
+    yield slow_query_log
+    slow_query_log.wait_for_explains()
+    slow_query_log.threshold_ms, slow_query_log.explain_sample = settings
+    slow_query_log.clear()
+
+
+@pytest.fixture(scope="function")
+def reader(db_session):
+    reader = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    book = Book(title="Dune", author="Frank Herbert", quantity=2, available_quantity=1)
+    db_session.add_all([reader, book])
+    db_session.flush()
+    db_session.add(BookBorrowing(book_id=book.id, user_id=reader.id))
+    db_session.commit()
+    return reader.id
+
+
+def test_slow_statements_are_logged_with_caller_and_plan(client, reader, log_everything):
+    assert client.get(f"/api/borrowings/user/{reader}").status_code == 200
+    log_everything.wait_for_explains()
+
+    entries = client.get("/internal/slow-queries").json()["entries"]
+    loans = next(entry for entry in entries if entry["sql"].startswith("SELECT book_borrowings.id"))
+    assert loans["caller"] == "app.crud.book_borrowing.get_user_borrowing_rows"
+    assert "WHERE book_borrowings.user_id = ? AND book_borrowings.is_returned = ?" in loans["sql"]
+    assert loans["parameters"] == ["int", "int", "int"]
+    assert "USING INDEX ix_book_borrowings_user_id_is_returned" in loans["plan"]
+    assert not any(entry["sql"].startswith("EXPLAIN") for entry in entries)
+    assert [entry["id"] for entry in entries] == sorted((entry["id"] for entry in entries), reverse=True)
+
+
+def test_each_statement_is_explained_once_per_interval(db_session, reader, log_everything):
+    for user_id in (reader, reader + 1, reader + 2):
+        borrowing_crud.get_user_borrowing_rows(db_session, user_id)
+    log_everything.wait_for_explains()
+    plans = [entry["plan"] for entry in log_everything.entries() if entry["sql"].startswith("SELECT book_borrowings.id")]
+    assert len(plans) == 3
+    assert sum(plan is not None for plan in plans) == 1
+
+
+def test_disabled_log_records_nothing(client, reader):
+    slow_query_log.clear()
+    client.get(f"/api/borrowings/user/{reader}")
+    assert slow_query_log.threshold_ms == 0
+    assert slow_query_log.entries() == []
+
+
+def test_explain_never_applies_writes(db_session, reader):
+    plan = explain(engine, "UPDATE books SET quantity = quantity + 1 WHERE id = ?", (1,))
+    assert "books" in plan
+    db_session.expire_all()
+    assert db_session.get(Book, 1).quantity == 2
+
+
+def test_async_driver_statements_are_explained_through_that_driver(db_session, reader):
+    async_engine = create_async_engine(to_async_url(str(engine.url)), poolclass=NullPool)
+    plan = explain(async_engine, "SELECT * FROM book_borrowings WHERE user_id = ? AND is_returned = ?", (reader, 0))
+    assert "ix_book_borrowings_user_id_is_returned" in plan
+
+
+def test_normalization_hides_values():
+    assert normalize_sql("SELECT *\n  FROM books WHERE id IN (?, ?, ?) AND title = 'Dune' LIMIT 10") == \
+        "SELECT * FROM books WHERE id IN (?, ...) AND title = ? LIMIT ?"
+    assert normalize_sql("SELECT * FROM books WHERE id = %(id_1)s AND x::text = $1 AND y = :y") == \
+        "SELECT * FROM books WHERE id = ? AND x::text = ? AND y = ?"
+    assert parameter_shape({"email": "a@b.c", "id": 3}) == {"email": "str", "id": "int"}
+    assert parameter_shape([(1, "a"), (2, "b")], executemany=True) == {"rows": 2, "each": ["int", "str"]}
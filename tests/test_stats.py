@@ -0,0 +1,123 @@
+# tests/test_stats.py
+import pytest
+from sqlalchemy import select
+
+from app.crud import book as book_crud, circulation
+from app.database import SessionLocal
+from app.loan_archive import LoanArchiver
+from app.models.book import Book
+from app.models.circulation import BookCirculation, CirculationTotals, DailyCirculation, UserCirculation
+from app.models.user import User, UserRole
+from app.schemas.book import BookUpdate
+
+
+@pytest.fixture(scope="function")
+def desk(db_session, auth_headers):
+    librarian = User(email="desk@example.com", first_name="Desk", last_name="Clerk",
+                     password="password123", role=UserRole.LIBRARIAN)
+    patrons = [User(email=f"patron{i}@example.com", first_name="Pat", last_name="Ron", password="password123")
+               for i in range(2)]
+    books = [Book(title=f"Book {i}", author="Author", quantity=2, available_quantity=2) for i in range(3)]
+    db_session.add_all([librarian, *patrons, *books])
+    db_session.commit()
+    return auth_headers(librarian), [p.id for p in patrons], [b.id for b in books]
+
+
+def _rollups(db):
+    db.expire_all()
+    return {
+        model.__tablename__: sorted(tuple(row) for row in db.execute(select(*model.__table__.c)))
+        for model in (BookCirculation, UserCirculation, DailyCirculation, CirculationTotals)
+    }
+
+
+def _circulate(client, headers, patrons, books):
+    """Borrow and return through every route: patron 0 borrows all books, patron 1 borrows book 0 twice."""
+    assert client.post("/api/borrowings/", headers=headers, json={"book_id": books[0], "user_id": patrons[0]}).status_code == 200
+    batch = client.post("/api/borrowings/batch", headers=headers, json={"items": [
+        {"book_id": books[1], "user_id": patrons[0]}, {"book_id": books[2], "user_id": patrons[0]},
+        {"book_id": books[0], "user_id": patrons[1]},
+    ]}).json()
+    assert batch["succeeded"] == 3
+    ids = [result["borrowing_id"] for result in batch["results"]]
+    assert client.put(f"/api/borrowings/{ids[2]}/return").status_code == 200
+    assert client.put("/api/borrowings/return-batch", json={"borrowing_ids": ids[:1]}).json()["succeeded"] == 1
+    assert client.post("/api/borrowings/", headers=headers, json={"book_id": books[0], "user_id": patrons[1]}).status_code == 200
+
+
+def test_borrows_cannot_be_created_returned(client, db_session, desk):
+    headers, patrons, books = desk
+    before = _rollups(db_session)
+    response = client.post("/api/borrowings/", headers=headers,
+                           json={"book_id": books[0], "user_id": patrons[0], "is_returned": True})
+    assert response.status_code == 422
+    assert _rollups(db_session) == before
+    assert db_session.get(Book, books[0]).available_quantity == 2
+
+
+def test_rollups_follow_borrows_and_returns(client, db_session, desk):
+    headers, patrons, books = desk
+    _circulate(client, headers, patrons, books)
+
+    top = client.get("/api/stats/books/most-borrowed", headers=headers, params={"limit": 2}).json()
+    assert [(b["book_id"], b["title"], b["loans"], b["active_loans"]) for b in top] == [
+        (books[0], "Book 0", 3, 2), (books[2], "Book 2", 1, 1)
+    ]
+    users = client.get("/api/stats/users/top", headers=headers).json()
+    assert [(u["user_id"], u["loans"], u["active_loans"]) for u in users] == [(patrons[0], 3, 2), (patrons[1], 2, 1)]
+    assert client.get(f"/api/stats/users/{patrons[1]}", headers=headers).json() == {
+        "user_id": patrons[1], "email": None, "loans": 2, "active_loans": 1
+    }
+    assert client.get("/api/stats/users/999", headers=headers).json()["loans"] == 0
+    assert client.get("/api/stats/utilization", headers=headers).json() == {
+        "copies": 6, "available": 3, "on_loan": 3, "utilization": 0.5
+    }
+    daily = client.get("/api/stats/daily", headers=headers, params={"days": 3}).json()
+    assert [(d["day"], d["borrows"], d["returns"]) for d in daily][-1] == (circulation.today().isoformat(), 5, 2)
+    assert [(d["borrows"], d["returns"]) for d in daily[:2]] == [(0, 0), (0, 0)]
+
+
+def test_rebuild_matches_incremental_rollups(client, db_session, desk):
+    headers, patrons, books = desk
+    _circulate(client, headers, patrons, books)
+    LoanArchiver(SessionLocal, after_days=-1, batch_size=100, pause=0, interval=0).run()  # returned loans move
+    live = _rollups(db_session)
+
+    written = circulation.rebuild(db_session, chunk_size=2, chunk_days=1)
+    assert (written["book_circulation"], written["user_circulation"]) == (3, 2)
+    assert _rollups(db_session) == live
+    assert sum(row[2] for row in live["daily_circulation"]) == 5
+
+
+def test_catalog_changes_move_utilization(client, db_session, desk):
+    headers, patrons, books = desk
+    book_crud.update_book(db_session, books[0], BookUpdate(title="Book 0"))
+    book = db_session.get(Book, books[1])
+    book.quantity, book.available_quantity = 4, 4
+    db_session.commit()
+    book_crud.delete_book(db_session, books[2])
+    book_crud.upsert_books(db_session, [
+        {"title": "Book 0", "author": "Author", "quantity": 1, "available_quantity": 1},
+        {"title": "New", "author": "Author", "quantity": 3, "available_quantity": 3},
+    ])
+    assert circulation.utilization(db_session) == {"copies": 10, "available": 10, "on_loan": 0, "utilization": 0.0}
+    circulation.rebuild_totals(db_session)
+    assert circulation.utilization(db_session)["copies"] == 10
+
+
+def test_single_return_is_one_transaction(client, db_session, desk):
+    headers, patrons, books = desk
+    client.post("/api/borrowings/", headers=headers, json={"book_id": books[0], "user_id": patrons[0]})
+    assert client.put("/api/borrowings/1/return").status_code == 200
+    assert client.put("/api/borrowings/1/return").json() == {"detail": "Book has already been returned"}
+    assert client.put("/api/borrowings/99/return").status_code == 404
+    db_session.expire_all()
+    assert db_session.get(Book, books[0]).available_quantity == 2
+    assert db_session.get(BookCirculation, books[0]).active_loans == 0
+
+
+def test_stats_require_staff(client, db_session, desk, auth_headers):
+    headers, patrons, books = desk
+    assert client.get("/api/stats/utilization").status_code == 401
+    patron = db_session.get(User, patrons[0])
+    assert client.get("/api/stats/utilization", headers=auth_headers(patron)).status_code == 403
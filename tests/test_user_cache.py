@@ -0,0 +1,85 @@
+# tests/test_user_cache.py
+from app.cache import InMemoryInvalidationBackend, LRUTTLCache
+from app.crud import user as user_crud
+from app.models.book import Book
+from app.models.user import User, UserRole
+
+from tests.test_borrowing_queries import count_statements
+
+
+def _seed_users(db):
+    admin = User(email="admin@example.com", first_name="Ada", last_name="Admin", password="password123", role=UserRole.ADMIN)
+    reader = User(email="reader@example.com", first_name="Avid", last_name="Reader", password="password123")
+    db.add_all([admin, reader])
+    db.commit()
+    ids = admin.id, reader.id
+    db.expunge_all()
+    return ids
+
+
+def test_cached_lookups_skip_the_database(db_session):
+    admin_id, reader_id = _seed_users(db_session)
+
+    assert user_crud.get_user(db_session, admin_id).email == "admin@example.com"
+    db_session.expunge_all()
+    hits = user_crud.user_cache.hits
+    with count_statements() as statements:
+        user = user_crud.get_user(db_session, admin_id)
+        by_email = user_crud.get_user_by_email(db_session, "admin@example.com")
+        roles = user_crud.get_user_roles(db_session, [admin_id])
+    assert statements == []
+    assert user is by_email and user.role == UserRole.ADMIN
+    assert roles == {admin_id: UserRole.ADMIN}
+    assert user_crud.user_cache.hits == hits + 3
+
+
+def test_missing_users_are_not_cached(db_session):
+    assert user_crud.get_user(db_session, 999) is None
+    assert user_crud.get_user_roles(db_session, [999]) == {}
+    assert user_crud.user_cache.stats()["size"] == 0
+
+
+def test_role_change_invalidates_cached_user(client, db_session, auth_headers):
+    admin_id, reader_id = _seed_users(db_session)
+    db_session.add(Book(title="Dune", author="Frank Herbert", quantity=2, available_quantity=2))
+    db_session.commit()
+    book_id = db_session.query(Book.id).scalar()
+
+    user_crud.get_user(db_session, reader_id)
+    response = client.put(f"/api/users/{reader_id}/role", headers=auth_headers(db_session.get(User, admin_id)),
+                          json={"role": "librarian"})
+    assert response.status_code == 200
+
+    reader = user_crud.get_user(db_session, reader_id)
+    assert (reader.role, reader.token_version) == (UserRole.LIBRARIAN, 1)
+    response = client.post("/api/borrowings/", headers=auth_headers(reader), json={"user_id": admin_id, "book_id": book_id})
+    assert response.status_code == 200
+
+
+def test_invalidation_reaches_every_cache_on_the_backend():
+    backend = InMemoryInvalidationBackend()
+    first = LRUTTLCache("users", maxsize=10, ttl=60, backend=backend)
+    second = LRUTTLCache("users", maxsize=10, ttl=60, backend=backend)
+    for cache in (first, second):
+        cache.set(("id", 1), {"id": 1})
+
+    generation = second.generation
+    first.invalidate(("id", 1))
+
+    assert first.get(("id", 1)) is None and second.get(("id", 1)) is None
+    # A value read before the invalidation must not be re-cached
+    second.set(("id", 1), {"id": 1}, generation=generation)
+    assert second.get(("id", 1)) is None
+
+
+def test_lru_and_ttl_bounds():
+    cache = LRUTTLCache("bounded", maxsize=2, ttl=60, backend=InMemoryInvalidationBackend())
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+
+    expired = LRUTTLCache("expired", maxsize=2, ttl=-1, backend=InMemoryInvalidationBackend())
+    expired.set("a", 1)
+    assert expired.get("a") is None